@@ -103,6 +103,27 @@ else:
         'default': dj_database_url.config(default=_database_url)
     }
 
+# Con la base caída, fallar rápido en lugar de colgar el worker (ver web/degraded.py)
+if 'postg' in DATABASES['default'].get('ENGINE', ''):
+    DATABASES['default'].setdefault('OPTIONS', {}).setdefault('connect_timeout', config('DB_CONNECT_TIMEOUT', default=3, cast=int))
+
+# PostGIS opcional: columnas geography + índices GiST para consultas espaciales.
+# Sin PostGIS se usan las columnas lat/lon float como fallback (ver web/geo.py).
+USE_POSTGIS = config('USE_POSTGIS', default=False, cast=bool)
+
+# Radio (metros) de la geocerca: mediciones capturadas más lejos del pozo se marcan fuera de rango
+GEOFENCE_RADIUS_M = config('GEOFENCE_RADIUS_M', default=200, cast=float)
+
+
+# Usuario de la sesión y sesiones leídos desde la caché: los pedidos autenticados no
+# dependen de la base para identificarse (ver web/auth_backends.py y web/degraded.py).
+# ModelBackend queda para las sesiones iniciadas antes de este cambio.
+AUTHENTICATION_BACKENDS = [
+    'web.auth_backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -187,18 +208,56 @@ if DEBUG:
         }
     }
 else:
-    # Production: use Redis
+    # Production: LRU local por proceso (L1) delante de Redis (L2), invalidado por pub/sub
+    # (ver web/cache_backends.py)
     CACHES = {
         'default': {
+            'BACKEND': 'web.cache_backends.TwoTierCache',
+            'TIMEOUT': 60,
+            'OPTIONS': {
+                'L2': 'redis',
+                'L1_MAX_ENTRIES': config('CACHE_L1_MAX_ENTRIES', default=2048, cast=int),
+                'L1_TIMEOUT': config('CACHE_L1_TIMEOUT', default=30, cast=int),
+                'CHANNEL': 'cache:invalidate',
+                # Contadores (rate limiting, versiones), locks y usuarios de sesión: siempre en Redis
+                'L1_EXCLUDE': ['rl:', 'auth:user:', 'lock:', 'dashboard:version:', 'well_index_version'],
+            },
+        },
+        'redis': {
             'BACKEND': 'django_redis.cache.RedisCache',
             'LOCATION': config('REDIS_URL', default='redis://127.0.0.1:6379/1'),
             'OPTIONS': {
                 'CLIENT_CLASS': 'django_redis.client.DefaultClient',
             },
             'TIMEOUT': 60,
-        }
+        },
     }
 
+# Lecturas con última copia buena (ver web/degraded.py): si la consulta tarda más que
+# este presupuesto (segundos) o la base falla, se sirve la copia guardada. 0 lo desactiva.
+DB_READ_BUDGET = config('DB_READ_BUDGET', default=2.0, cast=float)
+DB_READ_WORKERS = config('DB_READ_WORKERS', default=4, cast=int)
+
+# Tareas en segundo plano (pool de hilos por worker, ver web/tasks.py)
+BACKGROUND_TASKS_EAGER = config('BACKGROUND_TASKS_EAGER', default=False, cast=bool)
+BACKGROUND_TASK_WORKERS = config('BACKGROUND_TASK_WORKERS', default=2, cast=int)
+
+# Geocodificación inversa (proveedor intercambiable, ver web/geocoding.py)
+# Por defecto: nomenclador offline y Nominatim solo como respaldo
+GEOCODER_BACKEND = config('GEOCODER_BACKEND', default='web.geocoding.ChainGeocoder')
+GEOCODER_CHAIN = config(
+    'GEOCODER_CHAIN',
+    default='web.gazetteer.GazetteerGeocoder,web.geocoding.NominatimGeocoder',
+    cast=Csv(),
+)
+GAZETTEER_PATH = config('GAZETTEER_PATH', default=str(BASE_DIR / 'data' / 'gazetteer' / 'mendoza.gaz'))
+
+# Exportaciones en segundo plano (ver web/exports.py)
+# Un trabajo terminado se reutiliza para los mismos parámetros durante este tiempo
+EXPORT_JOB_REUSE_SECONDS = config('EXPORT_JOB_REUSE_SECONDS', default=900, cast=int)
+# Un trabajo sin avance durante este tiempo se da por abandonado (worker reciclado o caído)
+EXPORT_JOB_STALE_SECONDS = config('EXPORT_JOB_STALE_SECONDS', default=600, cast=int)
+
 # Logging
 LOGGING = {
     'version': 1,
@@ -123,8 +123,15 @@ if [ -f "$APP_DIR/malargue.service" ]; then
     # Reemplazar placeholders
     sed -i "s|/home/malargue/IrrigacionPetroleras|$APP_DIR|g" /etc/systemd/system/malargue.service
     
+    # Precalentado de cachés: al arrancar la app y cada 5 minutos
+    for unit in malargue-warm-caches.service malargue-warm-caches.timer; do
+        cp "$APP_DIR/$unit" /etc/systemd/system/
+        sed -i "s|/home/malargue/IrrigacionPetroleras|$APP_DIR|g" "/etc/systemd/system/$unit"
+    done
+    
     systemctl daemon-reload
     systemctl enable malargue
+    systemctl enable malargue-warm-caches.timer
     echo "✅ Systemd service configurado (no iniciado aún)"
 else
     echo "⚠️  malargue.service no encontrado en $APP_DIR"
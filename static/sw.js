@@ -1,4 +1,4 @@
-const CACHE_VERSION = 'v2';
+const CACHE_VERSION = 'v3';
 const CACHE_NAME = `irrigacion-cache-${CACHE_VERSION}`;
 const ASSETS_TO_CACHE = [
   '/',
@@ -95,6 +95,7 @@ async function syncPendingUploads() {
     
     console.log(`Background sync: Processing ${pending.length} uploads...`);
     
+    let serverUnavailable = false;
     for (const item of pending) {
       try {
         const formData = new FormData();
@@ -109,9 +110,19 @@ async function syncPendingUploads() {
         const response = await fetch('/cargar/', {
           method: 'POST',
           body: formData,
-          credentials: 'same-origin'
+          credentials: 'same-origin',
+          headers: {
+            'X-Requested-With': 'XMLHttpRequest',
+            'Accept': 'application/json'
+          }
         });
         
+        if (response.status === 503) {
+          // Base de datos en mantenimiento: conservar la cola y reintentar más tarde
+          serverUnavailable = true;
+          break;
+        }
+        
         if (response.ok) {
           // Eliminar del storage
           const deleteTx = db.transaction(['pending_photos'], 'readwrite');
@@ -135,6 +146,10 @@ async function syncPendingUploads() {
         console.error(`Failed to sync item ${item.id}:`, error);
       }
     }
+    
+    if (serverUnavailable) {
+      throw new Error('Servidor en mantenimiento');
+    }
   } catch (error) {
     console.error('Background sync failed:', error);
     throw error; // Reintentará automáticamente
@@ -1,9 +1,11 @@
 from django.contrib import admin
+from django.contrib.auth.models import User
 from django.utils.html import mark_safe
 from django.urls import reverse
 from django.db import models
 
-from .models import Medicion, EmpresaPerfil
+from .models import ExportJob, Medicion, EmpresaPerfil
+from .search import search_empresas, search_mediciones
 
 
 @admin.register(EmpresaPerfil)
@@ -21,6 +23,13 @@ class EmpresaPerfilAdmin(admin.ModelAdmin):
 	)
 	readonly_fields = ("created_at", "updated_at")
 
+	def get_search_results(self, request, queryset, search_term):
+		"""Nombre de empresa o ubicación del pozo, tolerante a errores de tipeo (ver web/search.py)"""
+		if not search_term.strip():
+			return queryset, False
+		empresas = search_empresas(User.objects.all(), search_term).values('id')
+		return queryset.filter(usuario_id__in=empresas), False
+
 
 @admin.register(Medicion)
 class MedicionAdmin(admin.ModelAdmin):
@@ -50,11 +59,13 @@ class MedicionAdmin(admin.ModelAdmin):
 		"ubicacion_manual",
 		"value_formatted",
 		"is_valid_icon",
+		"geofence_formatted",
 		"foto_preview"
 	)
 	
 	list_filter = (
 		"is_valid",
+		"is_out_of_range",
 		"timestamp",
 		"user",
 		"ubicacion_manual"
@@ -71,8 +82,12 @@ class MedicionAdmin(admin.ModelAdmin):
 		"photo",
 		"captured_latitude",
 		"captured_longitude",
+		"matched_perfil",
+		"matched_distance_m",
 		"target_latitude",
 		"target_longitude",
+		"geofence_distance_m",
+		"is_out_of_range",
 		"user",
 		"value",
 		"ubicacion_manual",
@@ -101,13 +116,17 @@ class MedicionAdmin(admin.ModelAdmin):
 		("📍 Geolocalización Capturada", {
 			"fields": (
 				"captured_latitude",
-				"captured_longitude"
+				"captured_longitude",
+				"matched_perfil",
+				"matched_distance_m"
 			)
 		}),
 		("🎯 Geolocalización Objetivo", {
 			"fields": (
 				"target_latitude",
-				"target_longitude"
+				"target_longitude",
+				"geofence_distance_m",
+				"is_out_of_range"
 			)
 		}),
 		("✅ Validación", {
@@ -123,6 +142,10 @@ class MedicionAdmin(admin.ModelAdmin):
 		"""Ordenar por fecha más reciente primero"""
 		return ["-timestamp"]
 	
+	def get_search_results(self, request, queryset, search_term):
+		"""Texto completo y trigram con índice en PostgreSQL en lugar de ILIKE por campo (ver web/search.py)"""
+		return search_mediciones(queryset, search_term), False
+	
 	# === MÉTODOS DE VISUALIZACIÓN ===
 	
 	def timestamp_formatted(self, obj):
@@ -150,6 +173,18 @@ class MedicionAdmin(admin.ModelAdmin):
 	is_valid_icon.short_description = "Estado"
 	is_valid_icon.admin_order_field = "is_valid"
 	
+	def geofence_formatted(self, obj):
+		"""Mostrar distancia al pozo, resaltando las fuera de rango"""
+		if obj.geofence_distance_m is None:
+			return "-"
+		if obj.is_out_of_range:
+			return mark_safe(
+				f'<span style="color: red; font-weight: bold;">{obj.geofence_distance_m:.0f} m</span>'
+			)
+		return f"{obj.geofence_distance_m:.0f} m"
+	geofence_formatted.short_description = "Distancia al pozo"
+	geofence_formatted.admin_order_field = "geofence_distance_m"
+	
 	def foto_preview(self, obj):
 		"""Mostrar thumbnail de la foto en la lista"""
 		if obj.photo:
@@ -199,3 +234,10 @@ class MedicionAdmin(admin.ModelAdmin):
 		css = {
 			"all": ("admin/css/medicion_custom.css",)
 		}
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+	list_display = ('id', 'format', 'status', 'processed_rows', 'total_rows', 'requested_by', 'created_at', 'finished_at')
+	list_filter = ('status', 'format')
+	readonly_fields = ('params', 'params_hash', 'processed_rows', 'total_rows', 'error', 'created_at', 'started_at', 'finished_at')
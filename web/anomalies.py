@@ -0,0 +1,218 @@
+"""
+Detección de anomalías en lote sobre la serie de cada empresa.
+
+Cada serie (lecturas acumuladas del caudalímetro ordenadas por fecha) se
+carga en arrays NumPy con una sola consulta y se evalúa vectorizada:
+
+- Retroceso: la lectura es menor que la anterior.
+- Pico: el caudal desde la lectura anterior se aleja de la mediana móvil
+  más de ``SPIKE_Z`` desvíos robustos (MAD).
+- Sin cambios: ``STALE_RUN`` o más lecturas seguidas con el mismo valor.
+- Hueco: el tiempo desde la lectura anterior supera ``GAP_FACTOR`` veces
+  el intervalo típico de la empresa (y al menos ``GAP_MIN_HOURS``).
+
+Las banderas (bits de ``Medicion.ANOMALIA_*``) y el puntaje (1 = en el
+umbral) se escriben con ``bulk_update`` solo donde cambiaron. Solo se
+reprocesan las empresas con cambios en el feed posteriores a su último
+análisis (``AnomalyScan.last_position``). Se compara la posición del feed y
+no ``seq``: un cambio con ``seq`` menor que se confirma después del análisis
+recibe igual una posición mayor (ver ``web.changefeed``).
+"""
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .changefeed import assign_positions
+
+ROLLING_WINDOW = 31
+SPIKE_Z = 5.0
+STALE_RUN = 3
+GAP_FACTOR = 4.0
+GAP_MIN_HOURS = 24.0
+
+FETCH_CHUNK_SIZE = 5000
+UPDATE_BATCH = 1000
+
+# Constante de consistencia del MAD para la normal
+MAD_SCALE = 0.6745
+# Desvío mínimo, como fracción del caudal típico de la empresa
+MAD_FLOOR = 0.1
+
+
+def load_series(user_id):
+	"""
+	Serie completa de una empresa como array estructurado ordenado por fecha.
+
+	Campos: id, t (epoch en segundos), v, flags, score (NaN si no tiene), reviewed.
+	"""
+	from .models import Medicion
+
+	rows = (
+		Medicion.objects.filter(user_id=user_id).order_by('timestamp', 'id')
+		.values_list('id', 'timestamp', 'value', 'anomaly_flags', 'anomaly_score', 'anomaly_reviewed')
+		.iterator(chunk_size=FETCH_CHUNK_SIZE)
+	)
+	return np.fromiter(
+		(
+			(pk, timestamp.timestamp(), float(value), flags, np.nan if score is None else score, reviewed)
+			for pk, timestamp, value, flags, score, reviewed in rows
+		),
+		dtype=[('id', np.int64), ('t', np.float64), ('v', np.float64), ('flags', np.int64), ('score', np.float64), ('reviewed', np.bool_)],
+	)
+
+
+def rolling_median_mad(x, window=ROLLING_WINDOW):
+	"""Mediana y MAD móviles centrados (ignoran NaN)."""
+	n = len(x)
+	half = window // 2
+	padded = np.concatenate([np.full(half, np.nan), x, np.full(window - half - 1, np.nan)])
+	windows = np.lib.stride_tricks.sliding_window_view(padded, window)[:n]
+	all_nan = np.isnan(windows).all(axis=1)
+	windows = windows.copy()
+	windows[all_nan] = 0.0
+	median = np.nanmedian(windows, axis=1)
+	mad = np.nanmedian(np.abs(windows - median[:, None]), axis=1)
+	median[all_nan] = np.nan
+	mad[all_nan] = np.nan
+	return median, mad
+
+
+def detect(t, v):
+	"""
+	Banderas y puntajes de una serie ordenada.
+
+	Args:
+		t: epoch en segundos (float64, creciente)
+		v: lecturas acumuladas (float64)
+
+	Returns:
+		tuple: (flags int64, score float64 con NaN donde no hay anomalía)
+	"""
+	from .models import Medicion
+
+	n = len(t)
+	flags = np.zeros(n, dtype=np.int64)
+	score = np.zeros(n, dtype=np.float64)
+	if n < 2:
+		return flags, np.full(n, np.nan)
+
+	dv = np.diff(v)
+	hours = np.diff(t) / 3600
+
+	def mark(mask, flag, component):
+		# mask/component tienen largo n - 1 y se refieren a la lectura i + 1
+		idx = np.flatnonzero(mask) + 1
+		flags[idx] |= flag
+		score[idx] = np.maximum(score[idx], component[mask])
+
+	# Retroceso: puntaje relativo al consumo típico entre lecturas
+	increases = dv[dv > 0]
+	scale = np.median(increases) if len(increases) else 1.0
+	mark(dv < 0, Medicion.ANOMALIA_RETROCESO, 1 + np.abs(dv) / scale)
+
+	# Pico de caudal frente a la mediana móvil (los retrocesos no cuentan como caudal)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		rate = np.where((hours > 0) & (dv >= 0), dv / hours, np.nan)
+	median, mad = rolling_median_mad(rate)
+	# Piso del desvío: tramos con caudal constante (o bomba apagada) tienen MAD 0
+	flowing = rate[rate > 0]
+	floor = max(MAD_FLOOR * np.median(flowing), 1e-9) if len(flowing) else 1e-9
+	with np.errstate(invalid='ignore'):
+		z = MAD_SCALE * np.abs(rate - median) / np.maximum(mad, floor)
+		mark(np.nan_to_num(z) > SPIKE_Z, Medicion.ANOMALIA_PICO, z / SPIKE_Z)
+
+	# Medidor sin cambios: largo de la racha de valores idénticos que termina en cada lectura
+	positions = np.arange(n)
+	run_start = np.maximum.accumulate(np.where(np.concatenate([[True], dv != 0]), positions, 0))
+	run_length = (positions - run_start + 1).astype(np.float64)
+	mark(run_length[1:] >= STALE_RUN, Medicion.ANOMALIA_SIN_CAMBIO, run_length[1:] / STALE_RUN)
+
+	# Hueco de reporte frente al intervalo típico de la empresa
+	positive = hours[hours > 0]
+	if len(positive):
+		threshold = max(GAP_FACTOR * np.median(positive), GAP_MIN_HOURS)
+		mark(hours > threshold, Medicion.ANOMALIA_HUECO, hours / threshold)
+
+	score = np.where(flags > 0, np.round(score, 3), np.nan)
+	return flags, score
+
+
+def scan_company(user_id):
+	"""
+	Analizar la serie de una empresa y guardar las banderas que cambiaron.
+
+	Una medición revisada vuelve a la cola si cambian sus banderas.
+
+	Returns:
+		tuple: (mediciones con anomalía, mediciones actualizadas)
+	"""
+	from .models import Medicion
+
+	series = load_series(user_id)
+	if not len(series):
+		return 0, 0
+	flags, score = detect(series['t'], series['v'])
+	changed = (flags != series['flags']) | ~np.isclose(score, series['score'], equal_nan=True)
+	reviewed = series['reviewed'] & (flags == series['flags']) & (flags > 0)
+
+	updates = [
+		Medicion(
+			id=int(series['id'][i]),
+			anomaly_flags=int(flags[i]),
+			anomaly_score=None if np.isnan(score[i]) else float(score[i]),
+			anomaly_reviewed=bool(reviewed[i]),
+		)
+		for i in np.flatnonzero(changed)
+	]
+	# Sin señales ni registro en el feed: las banderas son internas y no deben disparar otro análisis
+	Medicion.objects.bulk_update(updates, ['anomaly_flags', 'anomaly_score', 'anomaly_reviewed'], batch_size=UPDATE_BATCH)
+	return int((flags > 0).sum()), len(updates)
+
+
+def pending_companies():
+	"""{user_id: última posición del feed} de las empresas con cambios posteriores a su último análisis."""
+	from .models import AnomalyScan, MedicionChange
+
+	assign_positions()
+	last_scan = AnomalyScan.objects.filter(user_id=OuterRef('user_id')).values('last_position')
+	rows = (
+		MedicionChange.objects.filter(user_id__isnull=False, position__isnull=False).order_by()
+		.values('user_id')
+		.annotate(last=Max('position'), scanned=Coalesce(Subquery(last_scan), 0))
+		.filter(last__gt=F('scanned'))
+	)
+	return {row['user_id']: row['last'] for row in rows}
+
+
+def run_scan(user_ids=None):
+	"""
+	Analizar las empresas con datos nuevos (o solo ``user_ids``, siempre).
+
+	Returns:
+		dict: {user_id: (con anomalía, actualizadas)}
+	"""
+	from .models import AnomalyScan, MedicionChange
+
+	if user_ids is None:
+		targets = pending_companies()
+	else:
+		assign_positions()
+		targets = dict(
+			MedicionChange.objects.filter(user_id__in=list(user_ids), position__isnull=False).order_by()
+			.values('user_id').annotate(last=Max('position')).values_list('user_id', 'last')
+		)
+		targets.update({user_id: targets.get(user_id, 0) for user_id in user_ids})
+
+	# El feed conserva el user_id de empresas ya borradas
+	existing = set(User.objects.filter(id__in=list(targets)).values_list('id', flat=True))
+	results = {}
+	for user_id, position in sorted(targets.items()):
+		if user_id not in existing:
+			continue
+		with transaction.atomic():
+			flagged, updated = scan_company(user_id)
+			AnomalyScan.objects.update_or_create(user_id=user_id, defaults={'last_position': position, 'flagged': flagged})
+		results[user_id] = (flagged, updated)
+	return results
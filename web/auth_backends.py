@@ -0,0 +1,41 @@
+"""
+Backend de autenticación que guarda en caché el usuario de cada sesión.
+
+Cada pedido autenticado carga el usuario por id. Con este backend sale de
+la caché (y no de la base), así que las pantallas de lectura siguen
+respondiendo con la base en mantenimiento (ver ``web.degraded``). Las
+señales de ``User`` descartan la copia en cada alta, modificación o baja,
+incluidos cambios de contraseña y desactivaciones: al guardar y de nuevo
+al confirmar la transacción, porque un pedido concurrente pudo volver a
+cachear la fila vieja en el medio.
+
+Un ``QuerySet.update()`` no dispara señales; el TTL corto acota cuánto
+puede sobrevivir esa copia. La clave nunca se guarda en el L1 por proceso
+(``L1_EXCLUDE`` en settings).
+"""
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+
+TIMEOUT = 60 * 3
+
+
+def user_cache_key(user_id):
+	return f"auth:user:{user_id}"
+
+
+def invalidate_user(user_id):
+	key = user_cache_key(user_id)
+	cache.delete(key)
+	transaction.on_commit(lambda: cache.delete(key))
+
+
+class CachedModelBackend(ModelBackend):
+	def get_user(self, user_id):
+		key = user_cache_key(user_id)
+		user = cache.get(key)
+		if user is None:
+			user = super().get_user(user_id)
+			if user is not None:
+				cache.set(key, user, TIMEOUT)
+		return user
@@ -0,0 +1,266 @@
+"""
+Agregación de mediciones por período (hora / día / semana / mes).
+
+Los períodos cerrados se materializan en ``MedicionBucket`` con un
+``GROUP BY date_trunc(...)`` y una marca (``BucketWatermark``) indica
+hasta dónde están al día. Una consulta lee de la tabla todo lo anterior
+a la marca y calcula en vivo, sin escribir, solo lo posterior.
+
+Materializar es trabajo de fondo (``manage.py materializar_agregados`` y
+la familia ``agregados`` de ``warm_caches``), nunca de un pedido: el
+primer cálculo recorre todo el historial y no debe correr bajo el timeout
+de gunicorn ni hacer esperar a los lectores detrás del lock de la marca.
+
+El consumo de cada período es la suma de ``delta_value`` de sus lecturas
+validadas (``web.consumption``), no el rango de valores: una lectura sin
+validar no cuenta.
+
+Si se modifica o borra una medición de un período ya cerrado, o
+``web.consumption`` reescribe su consumo, se recalcula solo ese período
+(ver ``apply_change`` y ``refresh_periods``) y se descartan sus rankings
+cacheados (``web.rankings``). El recálculo bloquea las marcas: espera a
+que termine un ``materialize`` en curso y lee la marca que dejó, y mientras
+la transacción de la modificación siga abierta ``materialize`` no avanza.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, Trunc
+from django.utils import timezone
+
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+
+# Un período se materializa recién cuando cerró hace más de este margen,
+# para no perder mediciones de transacciones que confirman tarde
+SETTLE = timedelta(minutes=5)
+
+LOOKUP_BATCH = 500
+
+# Marca inicial (nada materializado): la fila existe para que haya algo que bloquear
+NOTHING_CLOSED = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+BUCKET_FIELDS = ('count', 'value_sum', 'minimo', 'maximo', 'first_at', 'first_value', 'last_at', 'last_value', 'consumo')
+
+
+def truncate(dt, granularity):
+	"""Inicio (aware, hora local) del período que contiene ``dt``."""
+	local = timezone.localtime(dt)
+	if granularity == 'hour':
+		naive = local.replace(minute=0, second=0, microsecond=0, tzinfo=None)
+	else:
+		naive = datetime(local.year, local.month, local.day)
+		if granularity == 'week':
+			naive -= timedelta(days=local.weekday())
+		elif granularity == 'month':
+			naive = naive.replace(day=1)
+	return timezone.make_aware(naive)
+
+
+def next_start(start, granularity):
+	"""Inicio del período siguiente a ``start``."""
+	local = timezone.localtime(start).replace(tzinfo=None)
+	if granularity == 'hour':
+		naive = local + timedelta(hours=1)
+	elif granularity == 'day':
+		naive = local + timedelta(days=1)
+	elif granularity == 'week':
+		naive = local + timedelta(weeks=1)
+	else:
+		naive = local.replace(year=local.year + local.month // 12, month=local.month % 12 + 1)
+	return timezone.make_aware(naive)
+
+
+def aggregate(queryset, granularity):
+	"""
+	Agregar ``queryset`` por (usuario, período) en SQL.
+
+	Returns:
+		list: dicts con user_id, start y ``BUCKET_FIELDS``
+	"""
+	from .models import Medicion
+
+	rows = list(
+		queryset.filter(user__isnull=False)
+		.annotate(start=Trunc('timestamp', granularity))
+		.order_by()
+		.values('user_id', 'start')
+		.annotate(
+			count=Count('id'),
+			value_sum=Sum('value'),
+			minimo=Min('value'),
+			maximo=Max('value'),
+			first_at=Min('timestamp'),
+			last_at=Max('timestamp'),
+			consumo=Coalesce(
+				Sum('delta_value', filter=Q(is_valid=True)), Value(0),
+				output_field=DecimalField(max_digits=18, decimal_places=2),
+			),
+		)
+	)
+	if not rows:
+		return rows
+
+	# Valores de la primera y última lectura: búsqueda por (user, timestamp) indexada, en lotes
+	values = {}
+	for i in range(0, len(rows), LOOKUP_BATCH):
+		batch = rows[i:i + LOOKUP_BATCH]
+		lookup = Medicion.objects.filter(
+			user_id__in={row['user_id'] for row in batch},
+			timestamp__in={row['first_at'] for row in batch} | {row['last_at'] for row in batch},
+		).order_by('id').values_list('user_id', 'timestamp', 'value')
+		for user_id, ts, value in lookup:
+			values[(user_id, ts)] = value
+	for row in rows:
+		row['first_value'] = values[(row['user_id'], row['first_at'])]
+		row['last_value'] = values[(row['user_id'], row['last_at'])]
+	return rows
+
+
+def _store(rows, granularity):
+	from .models import MedicionBucket
+
+	MedicionBucket.objects.bulk_create(
+		[MedicionBucket(granularity=granularity, **row) for row in rows],
+		batch_size=1000,
+		update_conflicts=True,
+		unique_fields=['granularity', 'user', 'start'],
+		update_fields=list(BUCKET_FIELDS),
+	)
+
+
+def watermark(granularity):
+	"""Inicio del primer período sin materializar (``NOTHING_CLOSED`` si todavía no se materializó nada)."""
+	from .models import BucketWatermark
+
+	closed_until = BucketWatermark.objects.filter(granularity=granularity).values_list('closed_until', flat=True).first()
+	return closed_until or NOTHING_CLOSED
+
+
+def materialize(granularity, now=None):
+	"""
+	Materializar los períodos cerrados desde la última marca.
+
+	Si otro proceso ya está materializando la misma granularidad, no espera.
+
+	Returns:
+		datetime: nueva marca (inicio del primer período sin materializar), o None si
+		otro proceso tenía el lock
+	"""
+	from .models import BucketWatermark, Medicion
+
+	open_start = truncate((now or timezone.now()) - SETTLE, granularity)
+	# Crear la fila antes de bloquearla: sin fila, select_for_update no bloquea nada
+	BucketWatermark.objects.get_or_create(granularity=granularity, defaults={'closed_until': NOTHING_CLOSED})
+	with transaction.atomic():
+		current = BucketWatermark.objects.select_for_update(skip_locked=True).filter(granularity=granularity).first()
+		if current is None:
+			return None
+		if current.closed_until >= open_start:
+			return current.closed_until
+
+		queryset = Medicion.objects.filter(timestamp__lt=open_start, timestamp__gte=current.closed_until)
+		_store(aggregate(queryset, granularity), granularity)
+		current.closed_until = open_start
+		current.save(update_fields=['closed_until'])
+	return open_start
+
+
+def refresh_bucket(user_id, timestamp):
+	"""Recalcular los períodos cerrados de ``user_id`` que contienen ``timestamp``."""
+	refresh_periods([(user_id, timestamp)])
+
+
+def refresh_periods(rows):
+	"""Recalcular, una vez cada uno, los períodos cerrados que contienen los ``(user_id, timestamp)`` de ``rows``."""
+	from .models import BucketWatermark, Medicion, MedicionBucket
+	from .rankings import invalidate_period
+
+	with transaction.atomic():
+		# Esperar a un materialize() en curso: si no, esta modificación vería la marca vieja y
+		# no recalcularía un período que materialize() guarda con datos de antes del cambio
+		watermarks = dict(
+			BucketWatermark.objects.select_for_update().order_by('granularity').values_list('granularity', 'closed_until')
+		)
+		periods = {
+			(granularity, user_id, truncate(timestamp, granularity))
+			for user_id, timestamp in rows
+			for granularity, closed_until in watermarks.items()
+			if user_id is not None and timestamp < closed_until
+		}
+		for granularity, user_id, start in sorted(periods):
+			queryset = Medicion.objects.filter(user_id=user_id, timestamp__gte=start, timestamp__lt=next_start(start, granularity))
+			MedicionBucket.objects.filter(granularity=granularity, user_id=user_id, start=start).delete()
+			_store(aggregate(queryset, granularity), granularity)
+			invalidate_period(granularity, start)
+
+
+def apply_change(old, new):
+	"""Invalidar los períodos cerrados afectados por una modificación o baja (snapshots de ``web.stats``)."""
+	if old == new:
+		return
+	if old and new and all(old[f] == new[f] for f in ('user_id', 'value', 'timestamp')):
+		# Solo cambió una bandera: los agregados no dependen de ella
+		return
+	for row in (old, new):
+		if row is not None:
+			refresh_bucket(row['user_id'], row['timestamp'])
+
+
+def _merge(rows):
+	"""Combinar filas de distintas empresas para el mismo período."""
+	merged = {}
+	for row in rows:
+		current = merged.get(row['start'])
+		if current is None:
+			merged[row['start']] = dict(row)
+			continue
+		current['count'] += row['count']
+		current['value_sum'] += row['value_sum']
+		current['consumo'] += row['consumo']
+		current['minimo'] = min(current['minimo'], row['minimo'])
+		current['maximo'] = max(current['maximo'], row['maximo'])
+		if row['first_at'] < current['first_at']:
+			current['first_at'], current['first_value'] = row['first_at'], row['first_value']
+		if row['last_at'] > current['last_at']:
+			current['last_at'], current['last_value'] = row['last_at'], row['last_value']
+	return [merged[start] for start in sorted(merged)]
+
+
+def bucket_stats(granularity, user_id=None, start=None, end=None):
+	"""
+	Estadísticas por período entre ``start`` y ``end`` (exclusivo).
+
+	Con ``user_id=None`` combina todas las empresas.
+
+	Returns:
+		list: dicts con start, count, avg, minimo, maximo, first_at/value, last_at/value y consumo
+	"""
+	from .models import Medicion, MedicionBucket
+
+	if granularity not in GRANULARITIES:
+		raise ValueError(f"Granularidad inválida: {granularity}")
+	end = end or timezone.now()
+	start = truncate(start, granularity) if start else None
+	# Lo que falte materializar (si el proceso de fondo se atrasó) se agrega en vivo
+	closed_until = watermark(granularity)
+
+	stored = MedicionBucket.objects.filter(granularity=granularity, start__lt=min(end, closed_until))
+	live = Medicion.objects.filter(timestamp__gte=closed_until, timestamp__lt=end)
+	if user_id is not None:
+		stored = stored.filter(user_id=user_id)
+		live = live.filter(user_id=user_id)
+	if start:
+		stored = stored.filter(start__gte=start)
+		live = live.filter(timestamp__gte=start)
+
+	rows = list(stored.values('user_id', 'start', *BUCKET_FIELDS))
+	if end > closed_until:
+		rows += aggregate(live, granularity)
+
+	result = []
+	for row in _merge(rows):
+		row.pop('user_id', None)
+		row['avg'] = row['value_sum'] / row['count']
+		result.append(row)
+	return result
@@ -0,0 +1,351 @@
+"""
+Backend de caché en dos niveles: LRU local por proceso (L1) delante de Redis (L2).
+
+Las lecturas se sirven primero desde memoria del proceso. Si no está, se
+buscan en el alias configurado como L2 y el valor queda en L1 por un TTL
+corto (``L1_TIMEOUT``, nunca más de lo que le queda en L2). Toda escritura
+va a L2 y publica la clave en un canal de Redis: cada proceso (todos los
+workers de gunicorn de todos los nodos) escucha ese canal en un hilo
+propio y descarta su copia local. Si la invalidación llega mientras se
+leía L2, el valor leído no se guarda en L1 (ver ``LocalLRU.generation``).
+
+Las claves que coordinan procesos (contadores de versión, locks) van en
+``L1_EXCLUDE``: una copia local de unos segundos de más ya es un error.
+
+Si L2 no es Redis (desarrollo con locmem) no hay pub/sub; el TTL de L1
+sigue acotando cuánto puede durar una copia vieja.
+
+Configuración::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'web.cache_backends.TwoTierCache',
+            'TIMEOUT': 60,
+            'OPTIONS': {
+                'L2': 'redis',              # alias de CACHES
+                'L1_MAX_ENTRIES': 2048,
+                'L1_TIMEOUT': 30,
+                'CHANNEL': 'cache:invalidate',
+                'L1_EXCLUDE': ['rl:', 'lock:'],  # prefijos que nunca se guardan en L1
+            },
+        },
+        'redis': {...},
+    }
+"""
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+logger = logging.getLogger(__name__)
+
+# Mensaje de invalidación total (clear)
+CLEAR_ALL = "*"
+SEPARATOR = "\n"
+RECONNECT_DELAY = 5
+# Generaciones recordadas por entrada de L1 antes de descartarlas todas
+GENERATIONS_PER_ENTRY = 4
+
+
+class LocalLRU:
+	"""LRU acotado con vencimiento por entrada, seguro entre hilos."""
+
+	def __init__(self, max_entries):
+		self.max_entries = max_entries
+		self._data = OrderedDict()
+		self._lock = threading.Lock()
+		# Invalidaciones por clave; ``_epoch`` cambia al vaciar todo
+		self._generations = {}
+		self._epoch = 0
+
+	def get(self, key):
+		"""(encontrado, valor serializado)"""
+		with self._lock:
+			entry = self._data.get(key)
+			if entry is None:
+				return False, None
+			expires_at, value = entry
+			if expires_at <= time.monotonic():
+				del self._data[key]
+				return False, None
+			self._data.move_to_end(key)
+			return True, value
+
+	def generation(self, key):
+		"""Marca a tomar antes de leer L2: si ``key`` se invalida mientras tanto, ``set`` descarta el valor."""
+		with self._lock:
+			return self._epoch, self._generations.get(key, 0)
+
+	def set(self, key, value, ttl, generation=None):
+		with self._lock:
+			if generation is not None and generation != (self._epoch, self._generations.get(key, 0)):
+				return
+			self._data[key] = (time.monotonic() + ttl, value)
+			self._data.move_to_end(key)
+			while len(self._data) > self.max_entries:
+				self._data.popitem(last=False)
+
+	def discard(self, keys):
+		with self._lock:
+			for key in keys:
+				self._data.pop(key, None)
+				self._generations[key] = self._generations.get(key, 0) + 1
+			if len(self._generations) > self.max_entries * GENERATIONS_PER_ENTRY:
+				self._forget_generations()
+
+	def clear(self):
+		with self._lock:
+			self._data.clear()
+			self._forget_generations()
+
+	def _forget_generations(self):
+		# Cambiar de época invalida también las lecturas de L2 en curso
+		self._generations.clear()
+		self._epoch += 1
+
+	def __len__(self):
+		return len(self._data)
+
+
+class TwoTierCache(BaseCache):
+	def __init__(self, server, params):
+		super().__init__(params)
+		options = params.get("OPTIONS", {})
+		self._l2_alias = options["L2"]
+		self._l1_timeout = options.get("L1_TIMEOUT", 30)
+		self._exclude = tuple(options.get("L1_EXCLUDE", ()))
+		self._channel = options.get("CHANNEL", "cache:invalidate")
+		self._l1 = LocalLRU(options.get("L1_MAX_ENTRIES", 2048))
+		self._counters = dict.fromkeys(("l1_hits", "l1_misses", "l2_hits", "l2_misses", "invalidations"), 0)
+		self._counter_lock = threading.Lock()
+		self._listener_pid = None
+		self._listener_lock = threading.Lock()
+
+	# === Infraestructura ===
+
+	@property
+	def l2(self):
+		return caches[self._l2_alias]
+
+	def _redis(self):
+		"""Conexión de Redis del L2, o None si L2 no es django_redis."""
+		try:
+			from django_redis import get_redis_connection
+		except ImportError:
+			return None
+		try:
+			return get_redis_connection(self._l2_alias)
+		except NotImplementedError:
+			return None
+
+	def _count(self, name, amount=1):
+		with self._counter_lock:
+			self._counters[name] += amount
+
+	def _local(self, key):
+		"""¿Se puede guardar ``key`` (sin prefijo ni versión) en L1?"""
+		return not key.startswith(self._exclude)
+
+	def _l1_ttl(self, timeout):
+		timeout = self.get_backend_timeout(timeout)
+		if timeout is None:
+			return self._l1_timeout
+		return min(self._l1_timeout, max(timeout - time.time(), 0))
+
+	def _fill_ttl(self, key, version=None):
+		"""TTL en L1 de un valor leído de L2: no más de lo que le queda allá (si L2 lo informa)."""
+		ttl = getattr(self.l2, "ttl", None)
+		if ttl is None:
+			return self._l1_timeout
+		remaining = ttl(key, version=version)
+		if remaining is None:
+			return self._l1_timeout
+		return min(self._l1_timeout, remaining)
+
+	def _ensure_listener(self):
+		# Un hilo por proceso; tras un fork (gunicorn --preload) se arranca de nuevo
+		pid = os.getpid()
+		if self._listener_pid == pid:
+			return
+		with self._listener_lock:
+			if self._listener_pid == pid:
+				return
+			self._listener_pid = pid
+			if self._redis() is None:
+				return
+			thread = threading.Thread(target=self._listen, name="cache-invalidation", daemon=True)
+			thread.start()
+
+	def _listen(self):
+		while True:
+			try:
+				pubsub = self._redis().pubsub(ignore_subscribe_messages=True)
+				pubsub.subscribe(self._channel)
+				# Pudieron perderse mensajes mientras no había suscripción
+				self._l1.clear()
+				for message in pubsub.listen():
+					if message.get("type") == "message":
+						self.handle_invalidation(message["data"])
+			except Exception:
+				logger.exception("Suscripción de invalidación de caché interrumpida")
+				self._l1.clear()
+				time.sleep(RECONNECT_DELAY)
+
+	def handle_invalidation(self, payload):
+		"""Aplicar un mensaje del canal: claves separadas por salto de línea o ``*``."""
+		if isinstance(payload, bytes):
+			payload = payload.decode()
+		if payload == CLEAR_ALL:
+			self._l1.clear()
+		else:
+			self._l1.discard(payload.split(SEPARATOR))
+		self._count("invalidations")
+
+	def _invalidate(self, keys, version=None):
+		"""Descartar ``keys`` en este proceso y avisar al resto."""
+		keys = [self.make_and_validate_key(key, version=version) for key in keys if self._local(key)]
+		if not keys:
+			return
+		self._l1.discard(keys)
+		connection = self._redis()
+		if connection is not None:
+			try:
+				connection.publish(self._channel, SEPARATOR.join(keys))
+			except Exception:
+				logger.exception("No se pudo publicar la invalidación de caché")
+
+	def stats(self):
+		"""Aciertos y fallos por nivel (de este proceso)."""
+		with self._counter_lock:
+			stats = dict(self._counters)
+		stats["l1_entries"] = len(self._l1)
+		return stats
+
+	# === API de caché ===
+
+	def get(self, key, default=None, version=None):
+		self._ensure_listener()
+		local = self._local(key)
+		local_key = self.make_and_validate_key(key, version=version)
+		if local:
+			found, value = self._l1.get(local_key)
+			if found:
+				self._count("l1_hits")
+				return pickle.loads(value)
+			self._count("l1_misses")
+			generation = self._l1.generation(local_key)
+
+		sentinel = object()
+		value = self.l2.get(key, sentinel, version=version)
+		if value is sentinel:
+			self._count("l2_misses")
+			return default
+		self._count("l2_hits")
+		if local:
+			ttl = self._fill_ttl(key, version)
+			if ttl > 0:
+				self._l1.set(local_key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ttl, generation)
+		return value
+
+	def get_many(self, keys, version=None):
+		self._ensure_listener()
+		result = {}
+		missing = []
+		generations = {}
+		for key in keys:
+			if self._local(key):
+				local_key = self.make_and_validate_key(key, version=version)
+				found, value = self._l1.get(local_key)
+				if found:
+					self._count("l1_hits")
+					result[key] = pickle.loads(value)
+					continue
+				self._count("l1_misses")
+				generations[key] = self._l1.generation(local_key)
+			missing.append(key)
+		if missing:
+			fetched = self.l2.get_many(missing, version=version)
+			self._count("l2_hits", len(fetched))
+			self._count("l2_misses", len(missing) - len(fetched))
+			for key, value in fetched.items():
+				if key in generations:
+					ttl = self._fill_ttl(key, version)
+					if ttl > 0:
+						self._l1.set(self.make_key(key, version=version), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ttl, generations[key])
+			result.update(fetched)
+		return result
+
+	def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+		self._ensure_listener()
+		self.l2.set(key, value, timeout=self._l2_timeout(timeout), version=version)
+		self._invalidate([key], version)
+		ttl = self._l1_ttl(timeout)
+		if self._local(key) and ttl > 0:
+			self._l1.set(self.make_key(key, version=version), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ttl)
+
+	def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+		self._ensure_listener()
+		added = self.l2.add(key, value, timeout=self._l2_timeout(timeout), version=version)
+		if added:
+			self._invalidate([key], version)
+		return added
+
+	def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+		self._ensure_listener()
+		failed = self.l2.set_many(data, timeout=self._l2_timeout(timeout), version=version)
+		self._invalidate(list(data), version)
+		return failed
+
+	def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+		return self.l2.touch(key, timeout=self._l2_timeout(timeout), version=version)
+
+	def delete(self, key, version=None):
+		self._ensure_listener()
+		deleted = self.l2.delete(key, version=version)
+		self._invalidate([key], version)
+		return deleted
+
+	def delete_many(self, keys, version=None):
+		self._ensure_listener()
+		keys = list(keys)
+		self.l2.delete_many(keys, version=version)
+		self._invalidate(keys, version)
+
+	def has_key(self, key, version=None):
+		if self._local(key) and self._l1.get(self.make_and_validate_key(key, version=version))[0]:
+			return True
+		return self.l2.has_key(key, version=version)
+
+	def incr(self, key, delta=1, version=None):
+		self._ensure_listener()
+		value = self.l2.incr(key, delta, version=version)
+		self._invalidate([key], version)
+		return value
+
+	def decr(self, key, delta=1, version=None):
+		return self.incr(key, -delta, version=version)
+
+	def clear(self):
+		self.l2.clear()
+		self._l1.clear()
+		connection = self._redis()
+		if connection is not None:
+			connection.publish(self._channel, CLEAR_ALL)
+
+	def close(self, **kwargs):
+		self.l2.close(**kwargs)
+
+	def _l2_timeout(self, timeout):
+		# DEFAULT_TIMEOUT se resuelve con el TIMEOUT de este backend, no con el de L2
+		return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+	def __getattr__(self, name):
+		# Extensiones propias de django_redis (lock, ttl, ...) van directo a L2
+		if name.startswith("_"):
+			raise AttributeError(name)
+		return getattr(self.l2, name)
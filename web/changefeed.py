@@ -0,0 +1,164 @@
+"""
+Feed incremental de cambios de mediciones.
+
+Cada alta, modificación o baja de ``Medicion`` agrega una fila a
+``MedicionChange`` dentro de la misma transacción; ``seq`` es el cursor.
+Un consumidor guarda el último ``seq`` recibido y en la próxima
+sincronización pide solo lo posterior, así el costo depende del delta
+diario y no del tamaño de la tabla.
+
+El ``seq`` de la tabla se asigna al insertar, pero las transacciones
+pueden confirmarse en otro orden (un recálculo de consumos puede tardar
+minutos): entregar por ``seq`` saltearía para siempre los cambios que se
+confirman detrás de un cursor ya entregado. Por eso el cursor del feed es
+``position``, que se asigna al leer (``assign_positions``) y solo a los
+cambios ya visibles, bajo un lock: todo cambio que se confirme después
+recibe una posición mayor que cualquiera ya entregada. En la salida el
+cursor se sigue llamando ``seq``.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Max
+
+from .utils import media_url
+
+# Campos de la medición incluidos en altas y modificaciones (nombre -> campo ORM)
+FEED_FIELDS = {
+	'id': 'id',
+	'timestamp': 'timestamp',
+	'user_id': 'user_id',
+	'username': 'user__username',
+	'value': 'value',
+	'ubicacion_manual': 'ubicacion_manual',
+	'observation': 'observation',
+	'is_valid': 'is_valid',
+	'photo_url': 'photo',
+	'captured_latitude': 'captured_latitude',
+	'captured_longitude': 'captured_longitude',
+	'captured_at': 'captured_at',
+	'uploaded_at': 'uploaded_at',
+	'target_latitude': 'target_latitude',
+	'target_longitude': 'target_longitude',
+	'geofence_distance_m': 'geofence_distance_m',
+	'is_out_of_range': 'is_out_of_range',
+	'matched_perfil_id': 'matched_perfil_id',
+	'matched_distance_m': 'matched_distance_m',
+	'delta_value': 'delta_value',
+	'delta_hours': 'delta_hours',
+	'consumption_rate': 'consumption_rate',
+}
+
+DEFAULT_LIMIT = 10000
+CHUNK_SIZE = 1000
+# Cambios a los que se da posición por transacción
+ASSIGN_BATCH = 5000
+# Advisory lock de PostgreSQL que serializa la asignación de posiciones
+POSITION_LOCK_ID = 4127001
+
+
+def record_change(medicion, op):
+	"""Registrar un cambio de una medición (llamado desde las señales)."""
+	from .models import MedicionChange
+
+	MedicionChange.objects.create(medicion_id=medicion.pk, user_id=medicion.user_id, op=op)
+
+
+def record_changes(ids, op=None):
+	"""Registrar modificaciones en lote (para ``bulk_update``, que no emite señales)."""
+	from .models import Medicion, MedicionChange
+
+	op = op or MedicionChange.OP_UPDATE
+	rows = Medicion.objects.filter(id__in=list(ids)).order_by('id').values_list('id', 'user_id')
+	MedicionChange.objects.bulk_create(
+		[MedicionChange(medicion_id=pk, user_id=user_id, op=op) for pk, user_id in rows],
+		batch_size=1000,
+	)
+
+
+def assign_positions():
+	"""
+	Dar posición, en orden de ``seq``, a los cambios confirmados que todavía no la tienen.
+
+	Un cambio de una transacción abierta no es visible acá: recibe su posición
+	en una lectura posterior, mayor que todas las ya asignadas.
+
+	Returns:
+		int: cambios a los que se asignó posición
+	"""
+	from .models import MedicionChange
+
+	assigned = 0
+	while True:
+		with transaction.atomic():
+			if connection.vendor == 'postgresql':
+				# Las lecturas posteriores al lock ven lo que confirmó el asignador anterior
+				with connection.cursor() as cursor:
+					cursor.execute("SELECT pg_advisory_xact_lock(%s)", [POSITION_LOCK_ID])
+			pending = list(
+				MedicionChange.objects.filter(position__isnull=True).order_by('seq').values_list('seq', flat=True)[:ASSIGN_BATCH]
+			)
+			if not pending:
+				return assigned
+			last = MedicionChange.objects.aggregate(last=Max('position'))['last'] or 0
+			MedicionChange.objects.bulk_update(
+				[MedicionChange(seq=seq, position=last + i) for i, seq in enumerate(pending, start=1)],
+				['position'],
+				batch_size=1000,
+			)
+		assigned += len(pending)
+		if len(pending) < ASSIGN_BATCH:
+			return assigned
+
+
+def iter_changes(since=0, limit=DEFAULT_LIMIT, user_id=None, chunk_size=CHUNK_SIZE):
+	"""
+	Cambios con posición ``> since`` en orden, hasta ``limit`` (``seq`` de cada item es su posición).
+
+	Las altas y modificaciones incluyen el estado actual de la medición en
+	``data``; si la medición ya se borró se omiten (su baja llega después).
+	Termina con ``{"op": "end", "cursor": ..., "has_more": ...}``.
+	"""
+	from .models import Medicion, MedicionChange
+
+	assign_positions()
+	changes = MedicionChange.objects.filter(position__isnull=False)
+	if user_id is not None:
+		changes = changes.filter(user_id=user_id)
+	changes = changes.order_by('position')
+
+	cursor = since
+	sent = 0
+	while sent < limit:
+		chunk = list(changes.filter(position__gt=cursor).values_list('position', 'medicion_id', 'op', 'changed_at')[:min(chunk_size, limit - sent)])
+		if not chunk:
+			break
+
+		live_ids = {medicion_id for _, medicion_id, op, _ in chunk if op != MedicionChange.OP_DELETE}
+		rows = {
+			row['id']: row
+			for row in Medicion.objects.filter(id__in=live_ids).values(*FEED_FIELDS.values())
+		}
+
+		for seq, medicion_id, op, changed_at in chunk:
+			cursor = seq
+			sent += 1
+			item = {'seq': seq, 'op': op, 'id': medicion_id, 'changed_at': changed_at}
+			if op != MedicionChange.OP_DELETE:
+				row = rows.get(medicion_id)
+				if row is None:
+					continue
+				data = {name: row[field] for name, field in FEED_FIELDS.items()}
+				data['photo_url'] = media_url(data['photo_url'])
+				item['data'] = data
+			yield item
+
+	has_more = sent >= limit and changes.filter(position__gt=cursor).exists()
+	yield {'op': 'end', 'cursor': cursor, 'has_more': has_more}
+
+
+def ndjson(items):
+	"""Serializar a NDJSON (una línea JSON por elemento)."""
+	for item in items:
+		yield json.dumps(item, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
@@ -0,0 +1,99 @@
+"""
+Series para gráficos con reducción de puntos (LTTB).
+
+Largest-Triangle-Three-Buckets conserva la forma de la curva (picos,
+caídas) con un número fijo de puntos, así el legajo puede mostrar todo
+el historial de una empresa con un payload constante.
+
+El resultado se cachea por empresa y versión de datos: la misma versión
+por empresa que el dashboard (``web.dashboard.data_version``), que las
+señales incrementan al confirmar cualquier alta, modificación o baja,
+tanto para la empresa nueva como para la anterior de una medición movida.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.utils import timezone
+
+from . import dashboard, singleflight
+
+DEFAULT_POINTS = 300
+MAX_POINTS = 2000
+CACHE_TIMEOUT = 60 * 60 * 24
+FETCH_CHUNK_SIZE = 5000
+
+
+def lttb(x, y, threshold):
+	"""
+	Índices de los puntos elegidos por LTTB.
+
+	Args:
+		x, y: arrays float64 de igual largo, ``x`` creciente
+		threshold: cantidad de puntos deseada
+
+	Returns:
+		np.ndarray: índices ordenados (siempre incluye el primero y el último)
+	"""
+	n = len(x)
+	if threshold >= n or threshold < 3:
+		return np.arange(n)
+
+	every = (n - 2) / (threshold - 2)
+	indices = np.empty(threshold, dtype=np.int64)
+	indices[0] = 0
+	indices[-1] = n - 1
+
+	a = 0
+	for i in range(threshold - 2):
+		# Promedio del bucket siguiente (tercer vértice del triángulo)
+		next_start = int((i + 1) * every) + 1
+		next_end = min(int((i + 2) * every) + 1, n)
+		avg_x = x[next_start:next_end].mean()
+		avg_y = y[next_start:next_end].mean()
+
+		# Punto del bucket actual con el triángulo de mayor área
+		start = int(i * every) + 1
+		end = int((i + 1) * every) + 1
+		area = np.abs(
+			(x[a] - avg_x) * (y[start:end] - y[a])
+			- (x[a] - x[start:end]) * (avg_y - y[a])
+		)
+		a = start + int(np.argmax(area))
+		indices[i + 1] = a
+	return indices
+
+
+def company_series(user_id):
+	"""Serie completa (timestamps epoch en segundos, valores) de una empresa como arrays."""
+	from .models import Medicion
+
+	rows = Medicion.objects.filter(user_id=user_id).order_by('timestamp', 'id').values_list('timestamp', 'value').iterator(chunk_size=FETCH_CHUNK_SIZE)
+	series = np.fromiter(
+		((timestamp.timestamp(), float(value)) for timestamp, value in rows),
+		dtype=[('t', np.float64), ('v', np.float64)],
+	)
+	return series['t'], series['v']
+
+
+def downsampled_series(user_id, points=DEFAULT_POINTS):
+	"""
+	Serie reducida a ``points`` puntos, cacheada por empresa y versión de datos.
+
+	Returns:
+		dict: {'timestamps': [...], 'labels': [...], 'values': [...], 'total': int}
+	"""
+	points = max(3, min(int(points), MAX_POINTS))
+
+	def compute():
+		x, y = company_series(user_id)
+		selected = lttb(x, y, points)
+		local = [timezone.localtime(datetime.fromtimestamp(ts, tz=dt_timezone.utc)) for ts in x[selected]]
+		return {
+			'timestamps': [dt.isoformat() for dt in local],
+			'labels': [dt.strftime('%d/%m/%y %H:%M') for dt in local],
+			'values': [round(float(v), 2) for v in y[selected]],
+			'total': int(len(x)),
+		}
+
+	key = f"chart:legajo:{user_id}:{dashboard.data_version(f'user:{user_id}')}:{points}"
+	return singleflight.get_or_set(key, compute, CACHE_TIMEOUT)
@@ -0,0 +1,139 @@
+"""
+Exportación columnar (Parquet / Arrow IPC) de mediciones para análisis.
+
+A diferencia del CSV se conservan los tipos: ``value`` como decimal(10,2),
+fechas como timestamp UTC y coordenadas como float64. Las filas se leen
+con un cursor por bloques y se escriben en lotes (un row group por lote),
+así la memoria queda acotada a ``ROW_GROUP_SIZE`` filas.
+
+Requiere ``pyarrow``; si no está instalado los escritores lanzan
+``ImproperlyConfigured``.
+"""
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+	import pyarrow as pa
+	import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - dependencia opcional
+	pa = None
+	pq = None
+
+ROW_GROUP_SIZE = 50000
+FETCH_CHUNK_SIZE = 2000
+COMPRESSION = 'zstd'
+
+
+def _types():
+	utc = pa.timestamp('us', tz='UTC')
+	return {
+		'id': ('id', pa.int64()),
+		'timestamp': ('timestamp', utc),
+		'user_id': ('user_id', pa.int64()),
+		'username': ('user__username', pa.string()),
+		'value': ('value', pa.decimal128(10, 2)),
+		'ubicacion_manual': ('ubicacion_manual', pa.string()),
+		'observation': ('observation', pa.string()),
+		'is_valid': ('is_valid', pa.bool_()),
+		'photo': ('photo', pa.string()),
+		'captured_latitude': ('captured_latitude', pa.float64()),
+		'captured_longitude': ('captured_longitude', pa.float64()),
+		'captured_at': ('captured_at', utc),
+		'uploaded_at': ('uploaded_at', utc),
+		'target_latitude': ('target_latitude', pa.float64()),
+		'target_longitude': ('target_longitude', pa.float64()),
+		'geofence_distance_m': ('geofence_distance_m', pa.float64()),
+		'is_out_of_range': ('is_out_of_range', pa.bool_()),
+		'matched_perfil_id': ('matched_perfil_id', pa.int64()),
+		'matched_distance_m': ('matched_distance_m', pa.float64()),
+		'delta_value': ('delta_value', pa.decimal128(12, 2)),
+		'delta_hours': ('delta_hours', pa.float64()),
+		'consumption_rate': ('consumption_rate', pa.float64()),
+	}
+
+
+# Columnas exportables, en el orden del archivo
+COLUMNS = (
+	'id', 'timestamp', 'user_id', 'username', 'value', 'ubicacion_manual', 'observation',
+	'is_valid', 'photo', 'captured_latitude', 'captured_longitude', 'captured_at',
+	'uploaded_at', 'target_latitude', 'target_longitude', 'geofence_distance_m',
+	'is_out_of_range', 'matched_perfil_id', 'matched_distance_m',
+	'delta_value', 'delta_hours', 'consumption_rate',
+)
+
+
+def available():
+	return pa is not None
+
+
+def _require_pyarrow():
+	if pa is None:
+		raise ImproperlyConfigured("La exportación Parquet/Arrow requiere pyarrow (pip install pyarrow)")
+
+
+def validate_columns(columns):
+	"""Normalizar la proyección pedida; None = todas. Lanza ValueError si hay desconocidas."""
+	if not columns:
+		return None
+	unknown = [c for c in columns if c not in COLUMNS]
+	if unknown:
+		raise ValueError(f"Columnas desconocidas: {', '.join(unknown)}")
+	# Orden canónico: misma proyección => mismo trabajo
+	return [c for c in COLUMNS if c in columns]
+
+
+def arrow_schema(columns=None):
+	_require_pyarrow()
+	types = _types()
+	return pa.schema([pa.field(name, types[name][1]) for name in (columns or COLUMNS)])
+
+
+def record_batches(queryset, columns=None, batch_size=ROW_GROUP_SIZE, chunk_size=FETCH_CHUNK_SIZE):
+	"""
+	``RecordBatch`` de hasta ``batch_size`` filas desde un cursor por bloques.
+
+	Solo se consultan las columnas pedidas (proyección en el SELECT).
+	"""
+	schema = arrow_schema(columns)
+	types = _types()
+	fields = [types[name][0] for name in schema.names]
+	rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+	buffer = []
+	for row in rows:
+		buffer.append(row)
+		if len(buffer) >= batch_size:
+			yield _to_batch(buffer, schema)
+			buffer = []
+	if buffer:
+		yield _to_batch(buffer, schema)
+
+
+def _to_batch(rows, schema):
+	columns = list(zip(*rows))
+	arrays = [pa.array(values, type=field.type) for values, field in zip(columns, schema)]
+	return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(queryset, fileobj, on_progress, columns=None):
+	"""Escribir Parquet (zstd, un row group por lote); devuelve la extensión."""
+	schema = arrow_schema(columns)
+	count = 0
+	with pq.ParquetWriter(fileobj, schema, compression=COMPRESSION) as writer:
+		for batch in record_batches(queryset, columns):
+			writer.write_batch(batch)
+			count += batch.num_rows
+			on_progress(count)
+	return 'parquet'
+
+
+def write_arrow(queryset, fileobj, on_progress, columns=None):
+	"""Escribir Arrow IPC (formato archivo / Feather v2, zstd); devuelve la extensión."""
+	schema = arrow_schema(columns)
+	options = pa.ipc.IpcWriteOptions(compression=COMPRESSION)
+	count = 0
+	with pa.ipc.new_file(fileobj, schema, options=options) as writer:
+		for batch in record_batches(queryset, columns):
+			writer.write_batch(batch)
+			count += batch.num_rows
+			on_progress(count)
+	return 'arrow'
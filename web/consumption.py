@@ -0,0 +1,181 @@
+"""
+Consumo derivado entre lecturas validadas consecutivas.
+
+``Medicion.value`` es la lectura acumulada del caudalímetro. Para cada
+lectura validada se guarda el volumen consumido desde la lectura validada
+anterior de la misma empresa (``delta_value``), las horas transcurridas
+(``delta_hours``) y el caudal medio (``consumption_rate``, volumen/hora).
+
+La lectura anterior se obtiene con ``LAG`` sobre una ventana particionada
+por empresa y ordenada por fecha. El historial se calcula en lote
+(``manage.py recalcular_consumos``) y las señales recalculan solo la
+lectura afectada y la siguiente cuando una medición se valida, cambia o
+se borra. Cada reescritura recalcula además los agregados cerrados que
+contienen las lecturas tocadas (``web.buckets``), que suman su consumo.
+"""
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import Lag
+
+from . import buckets
+
+DERIVED_FIELDS = ('delta_value', 'delta_hours', 'consumption_rate')
+
+FETCH_CHUNK_SIZE = 2000
+UPDATE_BATCH = 1000
+
+
+def with_previous(queryset):
+	"""Anotar ``prev_value`` y ``prev_timestamp`` (lectura anterior de la misma empresa) con LAG."""
+	window = {
+		'partition_by': [F('user_id')],
+		'order_by': [F('timestamp').asc(), F('id').asc()],
+	}
+	return queryset.annotate(
+		prev_value=Window(Lag('value'), **window),
+		prev_timestamp=Window(Lag('timestamp'), **window),
+	)
+
+
+def derive(value, timestamp, prev_value, prev_timestamp):
+	"""(delta_value, delta_hours, consumption_rate) respecto de la lectura anterior."""
+	if prev_value is None:
+		return None, None, None
+	delta = value - prev_value
+	hours = (timestamp - prev_timestamp).total_seconds() / 3600
+	rate = float(delta) / hours if hours > 0 else None
+	return delta, hours, rate
+
+
+def _valid_readings(user_id, since=None):
+	from .models import Medicion
+
+	queryset = Medicion.objects.filter(user_id=user_id, is_valid=True)
+	if since is not None:
+		queryset = queryset.filter(timestamp__gte=since)
+	return with_previous(queryset).order_by('timestamp', 'id').values_list(
+		'id', 'value', 'timestamp', 'prev_value', 'prev_timestamp', *DERIVED_FIELDS,
+	)
+
+
+def _write(updates):
+	from .changefeed import record_changes
+	from .models import Medicion
+
+	if not updates:
+		return
+	Medicion.objects.bulk_update(
+		[Medicion(id=pk, **dict(zip(DERIVED_FIELDS, values))) for pk, values in updates],
+		list(DERIVED_FIELDS),
+		batch_size=UPDATE_BATCH,
+	)
+	record_changes([pk for pk, _ in updates])
+	buckets.refresh_periods(Medicion.objects.filter(id__in=[pk for pk, _ in updates]).values_list('user_id', 'timestamp'))
+
+
+def _clear_invalid(user_ids=None, ids=None):
+	"""Quitar el consumo de lecturas no validadas (devuelve cuántas se limpiaron)."""
+	from .changefeed import record_changes
+	from .models import Medicion
+
+	queryset = Medicion.objects.filter(is_valid=False).filter(
+		Q(delta_value__isnull=False) | Q(delta_hours__isnull=False) | Q(consumption_rate__isnull=False)
+	)
+	if user_ids is not None:
+		queryset = queryset.filter(user_id__in=list(user_ids))
+	if ids is not None:
+		queryset = queryset.filter(id__in=list(ids))
+	stale = list(queryset.values_list('id', 'user_id', 'timestamp'))
+	if stale:
+		ids = [pk for pk, _, _ in stale]
+		Medicion.objects.filter(id__in=ids).update(**dict.fromkeys(DERIVED_FIELDS))
+		record_changes(ids)
+		buckets.refresh_periods([(user_id, timestamp) for _, user_id, timestamp in stale])
+	return len(stale)
+
+
+def recalculate(user_ids=None):
+	"""
+	Recalcular el consumo de todo el historial (todas las empresas o solo ``user_ids``).
+
+	Solo se escriben las filas cuyo valor cambió.
+
+	Returns:
+		int: mediciones actualizadas
+	"""
+	from .models import Medicion
+
+	if user_ids is None:
+		user_ids = Medicion.objects.filter(user__isnull=False).order_by('user_id').values_list('user_id', flat=True).distinct()
+	updated = 0
+	for user_id in list(user_ids):
+		with transaction.atomic():
+			updated += _clear_invalid(user_ids=[user_id])
+			updates = []
+			for pk, value, timestamp, prev_value, prev_timestamp, *stored in _valid_readings(user_id).iterator(chunk_size=FETCH_CHUNK_SIZE):
+				derived = derive(value, timestamp, prev_value, prev_timestamp)
+				if tuple(stored) != derived:
+					updates.append((pk, derived))
+				if len(updates) >= UPDATE_BATCH:
+					_write(updates)
+					updated += len(updates)
+					updates = []
+			_write(updates)
+			updated += len(updates)
+	return updated
+
+
+def refresh_from(user_id, timestamp):
+	"""
+	Recalcular el consumo de las lecturas validadas de ``user_id`` desde ``timestamp``.
+
+	Arranca en la lectura validada anterior (para que LAG la vea) y se
+	detiene en la primera lectura posterior que ya estaba al día: un alta,
+	baja o cambio solo altera su propia fila y la siguiente.
+	"""
+	from .models import Medicion
+
+	previous = (
+		Medicion.objects.filter(user_id=user_id, is_valid=True, timestamp__lt=timestamp)
+		.order_by('-timestamp', '-id').values_list('timestamp', flat=True).first()
+	)
+	updates = []
+	for pk, value, timestamp_, prev_value, prev_timestamp, *stored in _valid_readings(user_id, since=previous or timestamp).iterator(chunk_size=100):
+		if timestamp_ < timestamp:
+			continue
+		derived = derive(value, timestamp_, prev_value, prev_timestamp)
+		if tuple(stored) == derived:
+			if timestamp_ > timestamp:
+				break
+			continue
+		updates.append((pk, derived))
+	_write(updates)
+
+
+def apply_change(old, new, medicion_id):
+	"""
+	Actualizar el consumo tras el paso de ``old`` a ``new`` (snapshots de ``web.stats``).
+
+	Returns:
+		bool: True si se recalculó algo (la instancia en memoria quedó desactualizada)
+	"""
+	if old == new:
+		return False
+	if old and new and all(old[f] == new[f] for f in ('user_id', 'value', 'timestamp', 'is_valid')):
+		# Solo cambió una bandera ajena al consumo
+		return False
+	if not any(row and row['is_valid'] for row in (old, new)):
+		# Lecturas pendientes no tienen consumo
+		return False
+	with transaction.atomic():
+		if new and not new['is_valid']:
+			_clear_invalid(ids=[medicion_id])
+		# Por separado: refresh_from se detiene en la primera lectura al día, que puede
+		# estar entre la posición vieja y la nueva si la medición se movió en el tiempo
+		affected = []
+		for row in (old, new):
+			if row and row['is_valid'] and (row['user_id'], row['timestamp']) not in affected:
+				affected.append((row['user_id'], row['timestamp']))
+		for user_id, timestamp in affected:
+			refresh_from(user_id, timestamp)
+	return True
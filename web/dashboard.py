@@ -0,0 +1,108 @@
+"""
+Caché de las últimas mediciones del dashboard.
+
+El dashboard es la página de llegada después de cada login y de cada
+carga, así que sus listas (las últimas del operario y, para staff, las
+últimas de todas las empresas) se guardan en la caché compartida como
+tuplas compactas.
+
+Las claves llevan un número de versión que las señales incrementan en
+cada alta, modificación o baja de una medición y en cada cambio de
+usuario o perfil. Todos los workers de gunicorn leen la misma versión
+desde Redis, así que ninguno sirve una lista vieja y no hace falta
+borrar claves: las versiones anteriores vencen solas. Las mismas
+versiones sirven a otras cachés que dependen de las mismas mediciones
+(ver ``web.weekly``).
+
+Al cambiar la versión, el recálculo pasa por ``web.singleflight``: un
+solo worker consulta la base y los demás esperan su resultado. Si la base
+está lenta o caída se sirve la última lista buena (``web.degraded``).
+"""
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+
+from . import degraded
+from .utils import media_url
+
+STAFF_LIMIT = 10
+OPERATOR_LIMIT = 5
+TIMEOUT = 60 * 10
+
+STAFF_SCOPE = "staff"
+
+# Orden de las columnas en las tuplas cacheadas
+FIELDS = (
+	'id', 'timestamp', 'user__username', 'ubicacion_manual', 'value', 'is_valid', 'photo',
+	'captured_latitude', 'captured_longitude', 'target_latitude', 'target_longitude',
+)
+
+DashboardMedicion = namedtuple('DashboardMedicion', (
+	'id', 'timestamp', 'username', 'ubicacion_manual', 'value', 'is_valid', 'photo_url',
+	'captured_latitude', 'captured_longitude', 'target_latitude', 'target_longitude',
+))
+
+
+def _version_key(scope):
+	return f"dashboard:version:{scope}"
+
+
+def scope_for(user):
+	"""Alcance de versión: todas las empresas para staff, la propia para el operario."""
+	return STAFF_SCOPE if user.is_staff else f"user:{user.id}"
+
+
+def data_version(scope):
+	"""Versión actual de las mediciones de ``scope``."""
+	key = _version_key(scope)
+	version = cache.get(key)
+	if version is None:
+		# Arrancar desde el reloj: si la versión se perdió (reinicio de Redis, desalojo) no
+		# se reutiliza un número que pueda tener datos viejos asociados
+		cache.add(key, time.time_ns(), None)
+		version = cache.get(key)
+	return version
+
+
+def invalidate(*user_ids):
+	"""Invalidar el dashboard de staff y el de ``user_ids``."""
+	for scope in (STAFF_SCOPE, *(f"user:{user_id}" for user_id in user_ids if user_id is not None)):
+		try:
+			cache.incr(_version_key(scope))
+		except ValueError:
+			cache.add(_version_key(scope), time.time_ns(), None)
+
+
+def _rows(queryset, limit):
+	return [tuple(row) for row in queryset.values_list(*FIELDS)[:limit]]
+
+
+def recent_mediciones(user):
+	"""
+	Últimas mediciones para el dashboard de ``user`` (todas las empresas si es staff).
+
+	Returns:
+		tuple: (lista de ``DashboardMedicion`` en orden de fecha descendente, fecha de la
+		copia si la base no respondió y se sirvió la última buena, si no None)
+
+	Raises:
+		degraded.Unavailable: la base no respondió y no hay copia guardada
+	"""
+	from .models import Medicion
+
+	def compute():
+		queryset = Medicion.objects.order_by('-timestamp', '-id')
+		if user.is_staff:
+			return _rows(queryset, STAFF_LIMIT)
+		return _rows(queryset.filter(user=user), OPERATOR_LIMIT)
+
+	scope = scope_for(user)
+	rows, stale_as_of = degraded.read(f"dashboard:{scope}:{data_version(scope)}", compute, TIMEOUT, f"dashboard:{scope}")
+
+	result = []
+	for row in rows:
+		row = list(row)
+		row[6] = media_url(row[6]) if row[6] else None
+		result.append(DashboardMedicion(*row))
+	return result, stale_as_of
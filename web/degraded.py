@@ -0,0 +1,149 @@
+"""
+Lecturas con última copia buena cuando la base está lenta o caída.
+
+Las pantallas de lectura (dashboard, mapa semanal, lista de empresas)
+pasan por ``read``. Cada cálculo exitoso deja además una copia "última
+buena" sin versión y con vencimiento largo. Si al recalcular la consulta
+supera el presupuesto de latencia (``DB_READ_BUDGET``) o falla por un
+error de conexión, se sirve esa copia marcada como vieja. El cálculo
+lento sigue en un hilo aparte y guarda su resultado al terminar, así que
+el pedido siguiente ya recibe datos frescos.
+
+Dentro de una transacción (o con ``DB_READ_BUDGET = 0``) el cálculo corre
+en el mismo hilo: otra conexión no vería lo que la transacción escribió.
+Los comandos que precalculan cachés usan ``unbounded()`` para esperar el
+resultado en lugar de conformarse con la copia vieja.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import InterfaceError, OperationalError, close_old_connections, connection
+
+from . import singleflight
+
+logger = logging.getLogger(__name__)
+
+# Errores de conexión: la base no está disponible (no errores de programación)
+DB_ERRORS = (OperationalError, InterfaceError)
+
+LKG_PREFIX = "lkg:"
+LKG_TIMEOUT = 60 * 60 * 24 * 7
+
+_executor = None
+_executor_lock = threading.Lock()
+# Claves con un recálculo lento todavía en curso en este proceso
+_pending = set()
+_pending_lock = threading.Lock()
+_state = threading.local()
+
+
+class Unavailable(Exception):
+	"""La base no respondió dentro del presupuesto o no está disponible."""
+
+
+def _get_executor():
+	global _executor
+	if _executor is None:
+		with _executor_lock:
+			if _executor is None:
+				_executor = ThreadPoolExecutor(
+					max_workers=getattr(settings, "DB_READ_WORKERS", 4),
+					thread_name_prefix="db-read",
+				)
+	return _executor
+
+
+def _budget():
+	if getattr(_state, "unbounded", False):
+		return 0
+	return getattr(settings, "DB_READ_BUDGET", 2.0)
+
+
+@contextmanager
+def unbounded():
+	"""Sin presupuesto de latencia en este hilo: se espera siempre el cálculo."""
+	previous = getattr(_state, "unbounded", False)
+	_state.unbounded = True
+	try:
+		yield
+	finally:
+		_state.unbounded = previous
+
+
+def _guarded(key, compute, timeout, lkg_key):
+	"""``compute`` con presupuesto de latencia; lanza ``Unavailable`` si no llega a tiempo."""
+
+	def run():
+		value = compute()
+		cache.set(lkg_key, (value, time.time()), LKG_TIMEOUT)
+		return value
+
+	def inline():
+		try:
+			return run()
+		except DB_ERRORS as exc:
+			raise Unavailable(str(exc)) from exc
+
+	budget = _budget()
+	if not budget or connection.in_atomic_block:
+		return inline
+
+	def in_thread(abandoned):
+		close_old_connections()
+		try:
+			started = time.monotonic()
+			value = run()
+			if abandoned.is_set():
+				# Quien lo pidió ya sirvió la copia vieja: dejar el resultado para el próximo
+				singleflight.store(key, value, timeout, time.monotonic() - started)
+			return value
+		finally:
+			with _pending_lock:
+				_pending.discard(key)
+			close_old_connections()
+
+	def guarded():
+		with _pending_lock:
+			if key in _pending:
+				raise Unavailable("recálculo en curso")
+			_pending.add(key)
+		abandoned = threading.Event()
+		future = _get_executor().submit(in_thread, abandoned)
+		try:
+			return future.result(timeout=budget)
+		except FutureTimeout:
+			abandoned.set()
+			raise Unavailable(f"sin respuesta en {budget}s")
+		except DB_ERRORS as exc:
+			raise Unavailable(str(exc)) from exc
+
+	return guarded
+
+
+def read(key, compute, timeout, lkg_key):
+	"""
+	Valor de ``key`` (vía ``web.singleflight``) con la copia ``lkg_key`` como respaldo.
+
+	Returns:
+		tuple: (valor, None) si está al día, o (valor, fecha de la copia) si se sirvió
+		la última copia buena
+
+	Raises:
+		Unavailable: la base no respondió y no hay copia guardada
+	"""
+	lkg_key = LKG_PREFIX + lkg_key
+	try:
+		return singleflight.get_or_set(key, _guarded(key, compute, timeout, lkg_key), timeout), None
+	except Unavailable:
+		stored = cache.get(lkg_key)
+		if stored is None:
+			raise
+		logger.warning("Base no disponible; se sirve la última copia de %s", key)
+		value, stored_at = stored
+		return value, datetime.fromtimestamp(stored_at, tz=dt_timezone.utc)
@@ -0,0 +1,479 @@
+"""
+Exportación de mediciones.
+
+Las filas se leen con ``values_list`` (join con ``auth_user`` en la misma
+consulta) e ``.iterator()`` por bloques, así el costo en memoria no depende
+del tamaño del historial.
+
+Las exportaciones pesadas se ejecutan como ``ExportJob`` en segundo plano:
+el archivo comprimido queda en el storage y se descarga cuando termina.
+Parámetros idénticos comparten el mismo trabajo. Los trabajos corren en el
+pool del proceso, así que se pierden si gunicorn recicla el worker: el
+que no late en ``EXPORT_JOB_STALE_SECONDS`` se marca como fallido y deja
+de bloquear sus parámetros. Un trabajo en espera detrás de otros del mismo
+pool late con ellos (ver ``_touch_queued``): solo deja de latir si el
+proceso que lo tenía encolado ya no existe.
+"""
+import csv
+import gzip
+import hashlib
+import io
+import json
+import logging
+import tempfile
+import threading
+import zlib
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile, File
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import dashboard
+from .columnar import available as columnar_available, validate_columns, write_arrow, write_parquet
+from .tasks import enqueue
+from .utils import media_url
+from .zipstream import ZipEntry, ZipStream
+
+logger = logging.getLogger(__name__)
+
+CSV_HEADER = ['Timestamp', 'Usuario (Empresa)', 'Ubicación Manual', 'Valor (m³/h)', 'Foto URL', 'Estado', 'Ubicación GPS', 'Observaciones']
+
+CSV_COLUMNS = (
+	'timestamp',
+	'user__username',
+	'ubicacion_manual',
+	'value',
+	'photo',
+	'is_valid',
+	'captured_latitude',
+	'captured_longitude',
+	'observation',
+)
+
+CHUNK_SIZE = 2000
+
+
+class Echo:
+	"""Pseudo-buffer para ``csv.writer``: devuelve la línea en lugar de guardarla."""
+
+	def write(self, value):
+		return value
+
+
+def medicion_csv_rows(queryset, chunk_size=CHUNK_SIZE):
+	"""Filas del CSV (sin encabezado) para ``queryset``, en el orden que traiga."""
+	rows = queryset.values_list(*CSV_COLUMNS).iterator(chunk_size=chunk_size)
+	for timestamp, username, ubicacion, value, photo, is_valid, lat, lon, observation in rows:
+		yield [
+			timestamp.strftime('%d/%m/%Y %H:%M:%S'),
+			username,
+			ubicacion or '-',
+			value,
+			media_url(photo) or '-',
+			'Validado' if is_valid else 'Pendiente',
+			f"{lat or '-'}, {lon or '-'}",
+			observation or '-',
+		]
+
+
+def stream_medicion_csv(queryset, chunk_size=CHUNK_SIZE):
+	"""
+	Generador de líneas CSV listo para ``StreamingHttpResponse``.
+
+	Empieza con el BOM UTF-8 para que Excel reconozca los acentos.
+	"""
+	writer = csv.writer(Echo())
+	yield '\ufeff'
+	yield writer.writerow(CSV_HEADER)
+	for row in medicion_csv_rows(queryset, chunk_size=chunk_size):
+		yield writer.writerow(row)
+
+
+# --- Exportaciones en segundo plano ---------------------------------------
+
+def normalize_export_params(user_id=None, start_date=None, end_date=None, columns=None):
+	"""
+	Parámetros canónicos de una exportación (mismo dict => mismo trabajo).
+
+	Las fechas se reciben como ``date`` o texto YYYY-MM-DD; ``end_date`` es inclusivo.
+	``columns`` (proyección) solo aplica a los formatos columnar.
+	"""
+	def _date(value):
+		if not value:
+			return None
+		parsed = value if isinstance(value, date) else parse_date(str(value))
+		if parsed is None:
+			raise ValueError(f"Fecha inválida: {value}")
+		return parsed.isoformat()
+
+	params = {
+		'user_id': int(user_id) if user_id else None,
+		'start_date': _date(start_date),
+		'end_date': _date(end_date),
+	}
+	if params['start_date'] and params['end_date'] and params['start_date'] > params['end_date']:
+		raise ValueError("start_date no puede ser posterior a end_date")
+	columns = validate_columns(columns)
+	if columns:
+		params['columns'] = columns
+	return params
+
+
+def export_params_hash(export_format, params):
+	payload = json.dumps({'format': export_format, 'params': params}, sort_keys=True, separators=(',', ':'))
+	return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def export_queryset(params):
+	"""Queryset de mediciones para los parámetros normalizados."""
+	from .models import Medicion
+
+	queryset = Medicion.objects.all()
+	if params.get('user_id'):
+		queryset = queryset.filter(user_id=params['user_id'])
+	if params.get('start_date'):
+		start = timezone.make_aware(datetime.combine(date.fromisoformat(params['start_date']), time.min))
+		queryset = queryset.filter(timestamp__gte=start)
+	if params.get('end_date'):
+		end = timezone.make_aware(datetime.combine(date.fromisoformat(params['end_date']) + timedelta(days=1), time.min))
+		queryset = queryset.filter(timestamp__lt=end)
+	return queryset.order_by('-timestamp', '-id')
+
+
+def write_csv_gz(queryset, fileobj, on_progress, columns=None):
+	"""Escribir el CSV comprimido con gzip en ``fileobj``; devuelve la extensión."""
+	with gzip.GzipFile(fileobj=fileobj, mode='wb') as gz:
+		text = io.TextIOWrapper(gz, encoding='utf-8', newline='')
+		writer = csv.writer(text)
+		text.write('\ufeff')
+		writer.writerow(CSV_HEADER)
+		for count, row in enumerate(medicion_csv_rows(queryset), start=1):
+			writer.writerow(row)
+			if count % CHUNK_SIZE == 0:
+				on_progress(count)
+		text.flush()
+		text.detach()
+	return 'csv.gz'
+
+
+# Escritores por formato: (queryset, archivo binario, callback de progreso, columnas) -> extensión
+EXPORT_WRITERS = {
+	'csv': write_csv_gz,
+	'parquet': write_parquet,
+	'arrow': write_arrow,
+}
+
+
+# Intentos de obtener o crear el trabajo si otra petición compite por los mismos parámetros
+REQUEST_ATTEMPTS = 3
+
+# Trabajos encolados en el pool de este proceso que todavía no empezaron
+_queued_jobs = set()
+_queued_lock = threading.Lock()
+
+
+def _mark_queued(job_id):
+	with _queued_lock:
+		_queued_jobs.add(job_id)
+
+
+def _touch_queued(now):
+	"""Latido de los trabajos que esperan en este proceso: siguen encolados mientras el pool avance."""
+	from .models import ExportJob
+
+	with _queued_lock:
+		queued = list(_queued_jobs)
+	if queued:
+		ExportJob.objects.filter(pk__in=queued, status=ExportJob.STATUS_PENDING).update(heartbeat_at=now)
+
+
+def expire_stale_jobs(params_hash=None):
+	"""
+	Marcar como fallidos los trabajos activos sin avance reciente.
+
+	Sin latido (``heartbeat_at``) desde el corte, tanto pendientes como en
+	proceso: un pendiente que sigue encolado late con los trabajos que corren
+	delante de él en el mismo pool.
+
+	Returns:
+		int: trabajos marcados
+	"""
+	from .models import ExportJob
+
+	now = timezone.now()
+	cutoff = now - timedelta(seconds=getattr(settings, 'EXPORT_JOB_STALE_SECONDS', 600))
+	queryset = ExportJob.objects.filter(status__in=ExportJob.ACTIVE_STATUSES).filter(
+		models.Q(heartbeat_at__lt=cutoff) | models.Q(heartbeat_at__isnull=True, created_at__lt=cutoff)
+	)
+	if params_hash is not None:
+		queryset = queryset.filter(params_hash=params_hash)
+	expired = queryset.update(
+		status=ExportJob.STATUS_FAILED,
+		error='El trabajo se interrumpió (el proceso que lo ejecutaba se detuvo). Vuelva a solicitarlo.',
+		finished_at=now,
+	)
+	if expired:
+		logger.warning("Exportaciones abandonadas marcadas como fallidas: %s", expired)
+	return expired
+
+
+def request_export(params, user=None, export_format='csv'):
+	"""
+	Obtener o crear el trabajo para ``params``.
+
+	Reutiliza un trabajo activo con los mismos parámetros, o uno terminado
+	hace menos de ``EXPORT_JOB_REUSE_SECONDS``.
+
+	Returns:
+		tuple: (ExportJob, creado)
+	"""
+	from .models import ExportJob
+
+	if export_format not in EXPORT_WRITERS:
+		raise ValueError(f"Formato no soportado: {export_format}")
+	if export_format in ('parquet', 'arrow') and not columnar_available():
+		raise ValueError("Formato no disponible: falta instalar pyarrow")
+	if export_format == 'csv' and params.get('columns'):
+		raise ValueError("La selección de columnas solo está disponible para parquet y arrow")
+
+	params_hash = export_params_hash(export_format, params)
+	# Un trabajo abandonado no se reutiliza y libera la restricción de unicidad
+	expire_stale_jobs(params_hash)
+	reuse_since = timezone.now() - timedelta(seconds=getattr(settings, 'EXPORT_JOB_REUSE_SECONDS', 900))
+	for attempt in range(REQUEST_ATTEMPTS):
+		existing = ExportJob.objects.filter(params_hash=params_hash).filter(
+			models.Q(status__in=ExportJob.ACTIVE_STATUSES)
+			| models.Q(status=ExportJob.STATUS_DONE, finished_at__gte=reuse_since)
+		).order_by('-created_at').first()
+		if existing:
+			return existing, False
+
+		try:
+			with transaction.atomic():
+				job = ExportJob.objects.create(
+					params=params,
+					params_hash=params_hash,
+					format=export_format,
+					requested_by=user,
+					heartbeat_at=timezone.now(),
+				)
+		except IntegrityError:
+			# Otra petición creó el mismo trabajo al mismo tiempo (y pudo terminar ya): buscarlo de nuevo
+			if attempt == REQUEST_ATTEMPTS - 1:
+				raise
+			continue
+
+		transaction.on_commit(lambda: _mark_queued(job.pk))
+		enqueue(run_export_job, job.pk)
+		return job, True
+
+
+def run_export_job(job_id):
+	"""Tarea: generar el archivo del trabajo ``job_id``."""
+	from .models import ExportJob
+
+	with _queued_lock:
+		_queued_jobs.discard(job_id)
+	# Tomar el trabajo de forma atómica (evita ejecutarlo dos veces)
+	now = timezone.now()
+	claimed = ExportJob.objects.filter(pk=job_id, status=ExportJob.STATUS_PENDING).update(
+		status=ExportJob.STATUS_RUNNING,
+		started_at=now,
+		heartbeat_at=now,
+	)
+	if not claimed:
+		return None
+
+	job = ExportJob.objects.get(pk=job_id)
+	queryset = export_queryset(job.params)
+	ExportJob.objects.filter(pk=job_id).update(total_rows=queryset.count())
+
+	def on_progress(count):
+		# El avance es también el latido que usa expire_stale_jobs
+		now = timezone.now()
+		ExportJob.objects.filter(pk=job_id).update(processed_rows=count, heartbeat_at=now)
+		_touch_queued(now)
+
+	try:
+		with tempfile.TemporaryFile() as tmp:
+			extension = EXPORT_WRITERS[job.format](queryset, tmp, on_progress, columns=job.params.get('columns'))
+			ExportJob.objects.filter(pk=job_id).update(heartbeat_at=timezone.now())
+			tmp.seek(0)
+			job.file.save(f"mediciones_{job.pk}_{job.params_hash[:8]}.{extension}", File(tmp), save=False)
+	except Exception as e:
+		logger.exception("Error generando exportación", extra={"job_id": job_id})
+		ExportJob.objects.filter(pk=job_id, status=ExportJob.STATUS_RUNNING).update(
+			status=ExportJob.STATUS_FAILED,
+			error=str(e),
+			finished_at=timezone.now(),
+		)
+		return None
+
+	total = ExportJob.objects.filter(pk=job_id).values_list('total_rows', flat=True).first()
+	finished = ExportJob.objects.filter(pk=job_id, status=ExportJob.STATUS_RUNNING).update(
+		file=job.file.name,
+		status=ExportJob.STATUS_DONE,
+		processed_rows=total or 0,
+		finished_at=timezone.now(),
+	)
+	if not finished:
+		# Se dio por abandonado mientras corría y ya lo reemplazó otro: no revivirlo
+		job.file.delete(save=False)
+		return None
+	return job.file.name
+
+
+# --- Paquete de evidencias (ZIP) -------------------------------------------
+
+# CSV y manifiesto de cada paquete: un directorio por parámetros, un archivo por versión de los datos
+EVIDENCE_DIR = 'exportaciones/evidencias'
+# CRC de cada foto por (nombre, tamaño): las fotos no se reescriben, sirve para cualquier paquete
+CRC_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def _evidence_storage():
+	from .models import ExportJob
+
+	return ExportJob._meta.get_field('file').storage
+
+
+def _crc_cache_key(name, size):
+	return f"evidencia:crc:{size}:{hashlib.sha1(name.encode()).hexdigest()}"
+
+
+def _load_manifest(storage, name):
+	try:
+		with storage.open(name, 'rb') as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return None
+
+
+def _save_manifest(storage, name, manifest):
+	"""
+	Guardar el manifiesto una sola vez: nunca se reescribe.
+
+	Returns:
+		bool: False si otro pedido lo guardó antes (el storage eligió otro nombre y se descarta)
+	"""
+	saved = storage.save(name, ContentFile(json.dumps(manifest).encode()))
+	if saved != name:
+		storage.delete(saved)
+		return False
+	return True
+
+
+def _build_evidence(params, storage, directory, etag):
+	"""Escribir el CSV en el storage y armar el manifiesto (fotos con su tamaño)."""
+	from .models import Medicion
+
+	queryset = export_queryset(params)
+	with tempfile.TemporaryFile() as tmp:
+		csv_crc = 0
+		for line in stream_medicion_csv(queryset):
+			data = line.encode('utf-8')
+			csv_crc = zlib.crc32(data, csv_crc)
+			tmp.write(data)
+		csv_size = tmp.tell()
+		tmp.seek(0)
+		csv_name = storage.save(f"{directory}/{etag}.csv", File(tmp))
+
+	photo_storage = Medicion._meta.get_field('photo').storage
+	photos = []
+	for name, timestamp in queryset.exclude(photo='').exclude(photo__isnull=True).values_list('photo', 'timestamp').iterator(chunk_size=CHUNK_SIZE):
+		try:
+			size = photo_storage.size(name)
+		except (OSError, NotImplementedError):
+			logger.warning("Evidencia no encontrada en el storage", extra={"photo": name})
+			continue
+		photos.append([name, size, timestamp.isoformat()])
+
+	latest = queryset.values_list('timestamp', flat=True).first()
+	return {
+		'csv': csv_name,
+		'csv_size': csv_size,
+		'csv_crc': csv_crc,
+		'modified': latest.isoformat() if latest else None,
+		'photos': photos,
+	}
+
+
+def _discard_old_evidence(storage, directory, etag):
+	"""Borrar los paquetes de versiones anteriores de los mismos parámetros."""
+	try:
+		_, files = storage.listdir(directory)
+	except (OSError, NotImplementedError):
+		return
+	for name in files:
+		if not name.startswith(etag):
+			storage.delete(f"{directory}/{name}")
+
+
+def evidence_bundle(params):
+	"""
+	ZIP con ``mediciones.csv`` y las fotos de ``evidencias/`` que correspondan.
+
+	Las entradas se ordenan de forma determinística para que el archivo sea
+	idéntico entre pedidos y se pueda retomar con ``Range``. El CSV y los
+	tamaños de las fotos se guardan en el storage la primera vez, con la
+	versión de los datos de la empresa (``web.dashboard``) como ETag; el CRC
+	de cada foto queda en la caché apenas se envía. Los pedidos siguientes,
+	y cada rango de una descarga retomada, no vuelven a consultar la base ni
+	a leer fotos que no envían.
+
+	Returns:
+		tuple: (ZipStream, etag)
+	"""
+	from .models import Medicion
+
+	# La versión cambia con cada alta, modificación o baja confirmada del alcance
+	scope = f"user:{params['user_id']}" if params.get('user_id') else dashboard.STAFF_SCOPE
+	etag = export_params_hash('evidencias', {**params, 'version': dashboard.data_version(scope)})[:32]
+	storage = _evidence_storage()
+	directory = f"{EVIDENCE_DIR}/{export_params_hash('evidencias', params)[:16]}"
+	manifest_name = f"{directory}/{etag}.json"
+	manifest = _load_manifest(storage, manifest_name)
+	if manifest is None:
+		manifest = _build_evidence(params, storage, directory, etag)
+		if _save_manifest(storage, manifest_name, manifest):
+			_discard_old_evidence(storage, directory, etag)
+		else:
+			# Otro pedido armó el mismo paquete a la vez: usar el suyo y descartar este CSV
+			winner = _load_manifest(storage, manifest_name)
+			if winner is not None:
+				storage.delete(manifest['csv'])
+				manifest = winner
+
+	photo_storage = Medicion._meta.get_field('photo').storage
+	crc_keys = {(name, size): _crc_cache_key(name, size) for name, size, _ in manifest['photos']}
+	crcs = cache.get_many(list(crc_keys.values()))
+	modified = timezone.localtime(datetime.fromisoformat(manifest['modified'])) if manifest['modified'] else datetime(1980, 1, 1)
+	entries = [ZipEntry(
+		'mediciones.csv',
+		manifest['csv_size'],
+		modified,
+		opener=lambda: storage.open(manifest['csv'], 'rb'),
+		crc=manifest['csv_crc'],
+	)]
+	sizes = {}
+	for name, size, timestamp in manifest['photos']:
+		sizes[name] = size
+		entries.append(ZipEntry(
+			name,
+			size,
+			timezone.localtime(datetime.fromisoformat(timestamp)),
+			opener=lambda name=name: photo_storage.open(name, 'rb'),
+			crc=crcs.get(crc_keys[(name, size)]),
+		))
+
+	def save_crcs(computed):
+		cache.set_many(
+			{crc_keys[(name, sizes[name])]: crc for name, crc in computed.items() if name in sizes},
+			CRC_CACHE_TIMEOUT,
+		)
+
+	return ZipStream(entries, on_crc=save_crcs), f'"{etag}"'
@@ -0,0 +1,275 @@
+"""
+Geocodificador inverso offline a partir de un nomenclador local (gazetteer).
+
+El archivo binario (``.gaz``) se genera con ``manage.py construir_gazetteer``
+y se abre con ``numpy.memmap``: el arranque no parsea nada y las páginas se
+cargan bajo demanda, compartidas entre los workers de gunicorn.
+
+Formato (little-endian):
+	b"GAZ1" | uint32 largo del header | header JSON | padding a 8 bytes | arrays
+
+Los registros están ordenados por (tipo, celda) de una grilla regular;
+``cell_start`` (estilo CSR) indica dónde empieza cada par, así una búsqueda
+solo mira las celdas alrededor del punto y con el radio propio de cada tipo.
+"""
+import json
+import logging
+import math
+import struct
+import threading
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .geocoding import ReverseGeocoder
+from .geofence import haversine_vector
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"GAZ1"
+
+KIND_PLACE = 0
+KIND_ADMIN = 1
+KIND_ROAD = 2
+
+KINDS = {
+	"lugar": KIND_PLACE,
+	"departamento": KIND_ADMIN,
+	"calle": KIND_ROAD,
+}
+
+# Distancia máxima (m) para considerar cada tipo de registro
+MAX_DISTANCE_M = {
+	KIND_ROAD: 2000,
+	KIND_PLACE: 30000,
+	KIND_ADMIN: 150000,
+}
+
+DEFAULT_CELL_SIZE = 0.1  # grados (~11 km)
+
+
+def build_gazetteer(records, path, cell_size=DEFAULT_CELL_SIZE, region="Mendoza", country="Argentina"):
+	"""
+	Escribir el archivo binario a partir de ``records``.
+
+	Args:
+		records: iterable de (nombre, tipo, lat, lon) con tipo en ``KINDS``
+		path: destino del archivo ``.gaz``
+		cell_size: lado de la celda de la grilla en grados
+
+	Returns:
+		int: cantidad de registros escritos
+	"""
+	records = [(name.strip(), KINDS[kind], float(lat), float(lon)) for name, kind, lat, lon in records if name.strip()]
+	if not records:
+		raise ValueError("El nomenclador no tiene registros")
+
+	lat = np.array([r[2] for r in records], dtype=np.float64)
+	lon = np.array([r[3] for r in records], dtype=np.float64)
+	min_lat = math.floor(lat.min() / cell_size) * cell_size
+	min_lon = math.floor(lon.min() / cell_size) * cell_size
+	n_rows = int((lat.max() - min_lat) // cell_size) + 1
+	n_cols = int((lon.max() - min_lon) // cell_size) + 1
+
+	rows = ((lat - min_lat) // cell_size).astype(np.int64)
+	cols = ((lon - min_lon) // cell_size).astype(np.int64)
+	kinds = np.array([r[1] for r in records], dtype=np.int64)
+	n_cells = n_rows * n_cols
+	keys = kinds * n_cells + rows * n_cols + cols
+	order = np.argsort(keys, kind="stable")
+
+	cell_start = np.zeros(len(KINDS) * n_cells + 1, dtype=np.uint32)
+	np.add.at(cell_start, keys + 1, 1)
+	cell_start = np.cumsum(cell_start, dtype=np.uint32)
+
+	names = [records[i][0].encode("utf-8") for i in order]
+	name_offset = np.zeros(len(names) + 1, dtype=np.uint32)
+	name_offset[1:] = np.cumsum([len(n) for n in names], dtype=np.uint32)
+
+	arrays = {
+		"lat": lat[order].astype(np.float32),
+		"lon": lon[order].astype(np.float32),
+		"kind": kinds[order].astype(np.uint8),
+		"cell_start": cell_start,
+		"name_offset": name_offset,
+		"names": np.frombuffer(b"".join(names), dtype=np.uint8),
+	}
+
+	header = {
+		"count": len(records),
+		"cell_size": cell_size,
+		"min_lat": min_lat,
+		"min_lon": min_lon,
+		"n_rows": n_rows,
+		"n_cols": n_cols,
+		"region": region,
+		"country": country,
+		"arrays": {},
+	}
+
+	# Offsets relativos de cada array, alineados a 8 bytes
+	layout = []
+	offset = 0
+	for name, array in arrays.items():
+		layout.append((name, offset, array))
+		offset += array.nbytes
+		offset += (-offset) % 8
+
+	# El header contiene offsets absolutos que dependen de su propio largo:
+	# iterar hasta que el inicio de los datos no cambie
+	data_start = 0
+	while True:
+		for name, rel_offset, array in layout:
+			header["arrays"][name] = [data_start + rel_offset, array.dtype.str, len(array)]
+		header_bytes = json.dumps(header).encode("utf-8")
+		prefix = len(MAGIC) + 4 + len(header_bytes)
+		aligned = prefix + (-prefix) % 8
+		if aligned == data_start:
+			break
+		data_start = aligned
+
+	path = Path(path)
+	path.parent.mkdir(parents=True, exist_ok=True)
+	tmp_path = path.with_suffix(path.suffix + ".tmp")
+	with open(tmp_path, "wb") as f:
+		f.write(MAGIC)
+		f.write(struct.pack("<I", len(header_bytes)))
+		f.write(header_bytes)
+		f.write(b"\0" * (data_start - f.tell()))
+		for name, rel_offset, array in layout:
+			f.write(b"\0" * (data_start + rel_offset - f.tell()))
+			f.write(array.tobytes())
+	tmp_path.replace(path)
+	return len(records)
+
+
+class Gazetteer:
+	"""Nomenclador abierto con memmap (solo lectura)."""
+
+	def __init__(self, path):
+		self.path = Path(path)
+		with open(self.path, "rb") as f:
+			if f.read(4) != MAGIC:
+				raise ValueError(f"{self.path} no es un archivo de nomenclador válido")
+			(header_len,) = struct.unpack("<I", f.read(4))
+			self.header = json.loads(f.read(header_len))
+
+		self.cell_size = self.header["cell_size"]
+		self.min_lat = self.header["min_lat"]
+		self.min_lon = self.header["min_lon"]
+		self.n_rows = self.header["n_rows"]
+		self.n_cols = self.header["n_cols"]
+
+		for name, (offset, dtype, length) in self.header["arrays"].items():
+			array = np.memmap(self.path, dtype=np.dtype(dtype), mode="r", offset=offset, shape=(length,)) if length else np.empty(0, dtype=dtype)
+			setattr(self, name, array)
+
+	def __len__(self):
+		return self.header["count"]
+
+	def name(self, index):
+		start, end = int(self.name_offset[index]), int(self.name_offset[index + 1])
+		return bytes(self.names[start:end]).decode("utf-8")
+
+	def _candidates(self, kind, latitude, longitude, radius_m):
+		"""Índices de registros de ``kind`` en las celdas que cubren el radio."""
+		ring_lat = math.ceil(math.degrees(radius_m / 6371008.8) / self.cell_size)
+		cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+		ring_lon = math.ceil(math.degrees(radius_m / (6371008.8 * cos_lat)) / self.cell_size)
+
+		row = int((latitude - self.min_lat) // self.cell_size)
+		col = int((longitude - self.min_lon) // self.cell_size)
+		row_lo, row_hi = max(row - ring_lat, 0), min(row + ring_lat, self.n_rows - 1)
+		col_lo, col_hi = max(col - ring_lon, 0), min(col + ring_lon, self.n_cols - 1)
+		if row_lo > row_hi or col_lo > col_hi:
+			return np.empty(0, dtype=np.int64)
+
+		# Las celdas de una fila son contiguas: un rango por fila
+		base = kind * self.n_rows * self.n_cols
+		ranges = []
+		for r in range(row_lo, row_hi + 1):
+			start = int(self.cell_start[base + r * self.n_cols + col_lo])
+			end = int(self.cell_start[base + r * self.n_cols + col_hi + 1])
+			if end > start:
+				ranges.append(np.arange(start, end))
+		if not ranges:
+			return np.empty(0, dtype=np.int64)
+		return np.concatenate(ranges)
+
+	def lookup(self, latitude, longitude):
+		"""
+		Registro más cercano de cada tipo dentro de su distancia máxima.
+
+		Returns:
+			dict: {KIND_*: (nombre, distancia_m)}
+		"""
+		result = {}
+		for kind, max_distance in MAX_DISTANCE_M.items():
+			candidates = self._candidates(kind, latitude, longitude, max_distance)
+			if not len(candidates):
+				continue
+			distances = haversine_vector(self.lat[candidates], self.lon[candidates], latitude, longitude)
+			best = int(np.argmin(distances))
+			if distances[best] <= max_distance:
+				result[kind] = (self.name(int(candidates[best])), float(distances[best]))
+		return result
+
+	def describe(self, latitude, longitude):
+		"""
+		Texto legible con el formato de Nominatim: calle, lugar, provincia, país.
+
+		El departamento se omite: el nomenclador solo guarda un punto por
+		departamento, y el más cercano no es necesariamente el que contiene
+		la coordenada.
+		"""
+		found = self.lookup(latitude, longitude)
+		if not (found.keys() & {KIND_ROAD, KIND_PLACE}):
+			return None
+
+		parts = []
+		for kind in (KIND_ROAD, KIND_PLACE):
+			if kind in found and found[kind][0] not in parts:
+				parts.append(found[kind][0])
+		parts.append(self.header.get("region", "Mendoza"))
+		parts.append(self.header.get("country", "Argentina"))
+		return ", ".join(parts)
+
+
+_gazetteers = {}
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer(path=None):
+	"""
+	Nomenclador compartido por proceso (None si el archivo no existe).
+
+	La ausencia no se cachea: el archivo puede generarse con el proceso
+	ya en marcha.
+	"""
+	path = str(path or settings.GAZETTEER_PATH)
+	gazetteer = _gazetteers.get(path)
+	if gazetteer is None:
+		with _gazetteer_lock:
+			gazetteer = _gazetteers.get(path)
+			if gazetteer is None:
+				try:
+					gazetteer = _gazetteers[path] = Gazetteer(path)
+				except FileNotFoundError:
+					logger.warning("Nomenclador no encontrado: %s (ejecutar construir_gazetteer)", path)
+	return gazetteer
+
+
+class GazetteerGeocoder(ReverseGeocoder):
+	"""Proveedor offline basado en el nomenclador local"""
+
+	name = "gazetteer"
+
+	def __init__(self, path=None):
+		self.path = path
+
+	def reverse(self, latitude, longitude):
+		gazetteer = get_gazetteer(self.path)
+		if gazetteer is None:
+			return None
+		return gazetteer.describe(float(latitude), float(longitude))
@@ -0,0 +1,207 @@
+"""
+Consultas espaciales sobre mediciones y perfiles de empresa.
+
+Si PostGIS está habilitado (``USE_POSTGIS=True`` y la extensión instalada),
+las tablas tienen una columna ``location`` (geography Point, SRID 4326)
+generada desde las columnas float/decimal y con índice GiST. Si no, los
+helpers caen a un filtro por bounding box sobre las columnas lat/lon y a
+la fórmula de haversine calculada en SQL.
+"""
+import math
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, F, FloatField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_M = 6371008.8
+
+# Columnas de coordenadas por modelo (app_label.model_name -> (lat, lon))
+SPATIAL_FIELDS = {
+	"web.medicion": ("captured_latitude", "captured_longitude"),
+	"web.empresaperfil": ("latitude", "longitude"),
+}
+
+_location_column_cache = {}
+
+
+def _spatial_fields(model):
+	try:
+		return SPATIAL_FIELDS[model._meta.label_lower]
+	except KeyError:
+		raise ValueError(f"El modelo {model._meta.label} no tiene columnas espaciales registradas")
+
+
+def install_spatial_columns(conn):
+	"""
+	Crear la extensión PostGIS, las columnas ``location`` generadas y sus
+	índices GiST. Idempotente; no hace nada fuera de PostgreSQL.
+	"""
+	if conn.vendor != "postgresql":
+		return False
+
+	with conn.cursor() as cursor:
+		cursor.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+		for label, (lat, lon) in SPATIAL_FIELDS.items():
+			table = f"{label.replace('.', '_')}"
+			cursor.execute(
+				f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS location geography(Point, 4326) '
+				f'GENERATED ALWAYS AS ('
+				f'CASE WHEN "{lat}" IS NULL OR "{lon}" IS NULL THEN NULL '
+				f'ELSE ST_SetSRID(ST_MakePoint("{lon}"::double precision, "{lat}"::double precision), 4326)::geography '
+				f'END) STORED'
+			)
+			cursor.execute(
+				f'CREATE INDEX IF NOT EXISTS "{table}_location_gist" ON "{table}" USING GIST (location)'
+			)
+	_location_column_cache.clear()
+	return True
+
+
+def uninstall_spatial_columns(conn):
+	"""Eliminar las columnas ``location`` (la extensión se conserva)."""
+	if conn.vendor != "postgresql":
+		return
+	with conn.cursor() as cursor:
+		for label in SPATIAL_FIELDS:
+			table = label.replace(".", "_")
+			cursor.execute(f'ALTER TABLE "{table}" DROP COLUMN IF EXISTS location')
+	_location_column_cache.clear()
+
+
+def postgis_enabled(model):
+	"""¿Puede ``model`` usar la columna geography con índice GiST?"""
+	if not getattr(settings, "USE_POSTGIS", False) or connection.vendor != "postgresql":
+		return False
+
+	table = model._meta.db_table
+	if table not in _location_column_cache:
+		with connection.cursor() as cursor:
+			cursor.execute(
+				"SELECT 1 FROM information_schema.columns "
+				"WHERE table_name = %s AND column_name = 'location'",
+				[table],
+			)
+			_location_column_cache[table] = cursor.fetchone() is not None
+	return _location_column_cache[table]
+
+
+def bounding_box(latitude, longitude, radius_m):
+	"""Bounding box (min_lat, min_lon, max_lat, max_lon) que contiene el círculo dado."""
+	delta_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+	cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+	delta_lon = math.degrees(radius_m / (EARTH_RADIUS_M * cos_lat))
+	return (
+		latitude - delta_lat,
+		longitude - delta_lon,
+		latitude + delta_lat,
+		longitude + delta_lon,
+	)
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+	"""Distancia en metros entre dos puntos (grados decimales)."""
+	phi1 = math.radians(lat1)
+	phi2 = math.radians(lat2)
+	d_phi = phi2 - phi1
+	d_lambda = math.radians(lon2 - lon1)
+	a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+	return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _haversine_expression(lat_field, lon_field, latitude, longitude):
+	"""Expresión SQL portable (PostgreSQL y SQLite) de la distancia haversine en metros."""
+	lat_col = Radians(Cast(F(lat_field), FloatField()))
+	lon_col = Radians(Cast(F(lon_field), FloatField()))
+	lat0 = Value(math.radians(latitude), output_field=FloatField())
+	lon0 = Value(math.radians(longitude), output_field=FloatField())
+	cos_lat0 = Value(math.cos(math.radians(latitude)), output_field=FloatField())
+
+	a = (
+		Power(Sin((lat_col - lat0) / 2), 2)
+		+ Cos(lat_col) * cos_lat0 * Power(Sin((lon_col - lon0) / 2), 2)
+	)
+	return Value(2 * EARTH_RADIUS_M, output_field=FloatField()) * ASin(Sqrt(a))
+
+
+def _point_sql(longitude, latitude):
+	return "ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography", [float(longitude), float(latitude)]
+
+
+def _location_column(model):
+	return f'"{model._meta.db_table}"."location"'
+
+
+def within_bbox(queryset, min_lat, min_lon, max_lat, max_lon):
+	"""Filtrar ``queryset`` a los registros dentro del rectángulo dado."""
+	model = queryset.model
+	if postgis_enabled(model):
+		condition = RawSQL(
+			f"{_location_column(model)} && ST_MakeEnvelope(%s, %s, %s, %s, 4326)::geography",
+			[float(min_lon), float(min_lat), float(max_lon), float(max_lat)],
+			output_field=BooleanField(),
+		)
+		return queryset.alias(_in_bbox=condition).filter(_in_bbox=True)
+
+	lat_field, lon_field = _spatial_fields(model)
+	return queryset.filter(**{
+		f"{lat_field}__gte": min_lat,
+		f"{lat_field}__lte": max_lat,
+		f"{lon_field}__gte": min_lon,
+		f"{lon_field}__lte": max_lon,
+	})
+
+
+def annotate_distance(queryset, latitude, longitude):
+	"""Anotar ``distance_m`` (metros) hasta el punto dado."""
+	model = queryset.model
+	if postgis_enabled(model):
+		point_sql, params = _point_sql(longitude, latitude)
+		distance = RawSQL(
+			f"ST_Distance({_location_column(model)}, {point_sql})",
+			params,
+			output_field=FloatField(),
+		)
+	else:
+		lat_field, lon_field = _spatial_fields(model)
+		distance = _haversine_expression(lat_field, lon_field, latitude, longitude)
+	return queryset.annotate(distance_m=distance)
+
+
+def within_radius(queryset, latitude, longitude, radius_m):
+	"""Registros a menos de ``radius_m`` metros del punto, anotados con ``distance_m``."""
+	model = queryset.model
+	if postgis_enabled(model):
+		point_sql, params = _point_sql(longitude, latitude)
+		condition = RawSQL(
+			f"ST_DWithin({_location_column(model)}, {point_sql}, %s)",
+			params + [float(radius_m)],
+			output_field=BooleanField(),
+		)
+		queryset = queryset.alias(_in_radius=condition).filter(_in_radius=True)
+		return annotate_distance(queryset, latitude, longitude)
+
+	# Fallback: el bounding box aprovecha el índice B-tree de lat/lon,
+	# la distancia exacta descarta las esquinas.
+	queryset = within_bbox(queryset, *bounding_box(latitude, longitude, radius_m))
+	return annotate_distance(queryset, latitude, longitude).filter(distance_m__lte=radius_m)
+
+
+def nearest(queryset, latitude, longitude, limit=1, max_distance_m=None):
+	"""Los ``limit`` registros más cercanos al punto, ordenados por ``distance_m``."""
+	model = queryset.model
+	lat_field, lon_field = _spatial_fields(model)
+	queryset = queryset.filter(**{f"{lat_field}__isnull": False, f"{lon_field}__isnull": False})
+
+	if max_distance_m is not None:
+		queryset = within_radius(queryset, latitude, longitude, max_distance_m)
+	else:
+		queryset = annotate_distance(queryset, latitude, longitude)
+
+	if postgis_enabled(model):
+		# Operador KNN: recorre el índice GiST en orden de distancia
+		point_sql, params = _point_sql(longitude, latitude)
+		knn = RawSQL(f"{_location_column(model)} <-> {point_sql}", params, output_field=FloatField())
+		return queryset.order_by(knn.asc())[:limit]
+	return queryset.order_by("distance_m")[:limit]
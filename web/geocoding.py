@@ -0,0 +1,219 @@
+"""
+Geocodificación inversa con proveedores intercambiables y caché persistente.
+
+El proveedor se elige con ``GEOCODER_BACKEND`` (ruta de la clase). Los
+resultados se guardan en ``GeocodeCache`` con las coordenadas redondeadas,
+así que perfiles en el mismo pozo nunca repiten la consulta externa.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# 4 decimales ≈ 11 m: suficiente para nombrar una ubicación
+CACHE_PRECISION = 4
+
+
+class ReverseGeocoder:
+	"""Interfaz de proveedor: ``reverse`` devuelve un texto legible o None."""
+
+	name = "base"
+
+	def reverse(self, latitude, longitude):
+		raise NotImplementedError
+
+	def reverse_with_provider(self, latitude, longitude):
+		"""(texto o None, nombre del proveedor que respondió)"""
+		return self.reverse(latitude, longitude), self.name
+
+
+class NominatimGeocoder(ReverseGeocoder):
+	"""Nominatim de OpenStreetMap (gratuito, sin API key, máx. 1 req/s)"""
+
+	name = "nominatim"
+	url = "https://nominatim.openstreetmap.org/reverse"
+
+	def __init__(self, timeout=5):
+		self.timeout = timeout
+
+	def reverse(self, latitude, longitude):
+		import requests
+
+		params = {
+			'lat': float(latitude),
+			'lon': float(longitude),
+			'format': 'json',
+			'addressdetails': 1,
+			'accept-language': 'es'
+		}
+		headers = {
+			'User-Agent': 'IrrigacionApp/1.0'
+		}
+
+		response = requests.get(self.url, params=params, headers=headers, timeout=self.timeout)
+		if response.status_code != 200:
+			return None
+
+		data = response.json()
+		address = data.get('address', {})
+
+		# Construir ubicación legible
+		parts = []
+		if address.get('road'):
+			parts.append(address['road'])
+		if address.get('city'):
+			parts.append(address['city'])
+		elif address.get('town'):
+			parts.append(address['town'])
+		elif address.get('village'):
+			parts.append(address['village'])
+		if address.get('state'):
+			parts.append(address['state'])
+		if address.get('country'):
+			parts.append(address['country'])
+
+		if parts:
+			return ', '.join(parts)
+		# Fallback: usar display_name
+		return data.get('display_name', f"{latitude}, {longitude}")
+
+
+class StubGeocoder(ReverseGeocoder):
+	"""Proveedor local determinístico para tests y desarrollo sin red"""
+
+	name = "stub"
+
+	def reverse(self, latitude, longitude):
+		return f"Ubicación {float(latitude):.4f}, {float(longitude):.4f}"
+
+
+class ChainGeocoder(ReverseGeocoder):
+	"""Prueba los proveedores de ``GEOCODER_CHAIN`` en orden hasta obtener resultado"""
+
+	name = "chain"
+
+	def __init__(self, backends=None):
+		backends = backends or getattr(settings, "GEOCODER_CHAIN", [])
+		self.geocoders = [import_string(backend)() for backend in backends]
+
+	def reverse(self, latitude, longitude):
+		return self.reverse_with_provider(latitude, longitude)[0]
+
+	def reverse_with_provider(self, latitude, longitude):
+		# La instancia es compartida entre hilos: el proveedor que respondió se devuelve, no se guarda
+		for geocoder in self.geocoders:
+			try:
+				ubicacion, provider = geocoder.reverse_with_provider(latitude, longitude)
+			except Exception as e:
+				logger.warning("Error en geocodificación inversa", extra={"error": str(e), "provider": geocoder.name})
+				continue
+			if ubicacion:
+				return ubicacion, provider
+		return None, self.name
+
+
+_geocoder = None
+
+
+def get_geocoder():
+	"""Instancia del proveedor configurado en ``GEOCODER_BACKEND``."""
+	global _geocoder
+	backend = getattr(settings, "GEOCODER_BACKEND", "web.geocoding.ChainGeocoder")
+	if _geocoder is None or _geocoder.__class__.__module__ + "." + _geocoder.__class__.__name__ != backend:
+		_geocoder = import_string(backend)()
+	return _geocoder
+
+
+def cache_key(latitude, longitude):
+	return round(float(latitude), CACHE_PRECISION), round(float(longitude), CACHE_PRECISION)
+
+
+def reverse_geocode(latitude, longitude, geocoder=None, use_cache=True):
+	"""
+	Geocodificación inversa pasando por la caché persistente.
+
+	Returns:
+		str: Ubicación legible o None si el proveedor falló
+	"""
+	from .models import GeocodeCache
+
+	lat_key, lon_key = cache_key(latitude, longitude)
+	if use_cache:
+		cached = GeocodeCache.objects.filter(lat_key=lat_key, lon_key=lon_key).values_list("ubicacion", flat=True).first()
+		if cached:
+			return cached
+
+	geocoder = geocoder or get_geocoder()
+	try:
+		ubicacion, provider = geocoder.reverse_with_provider(lat_key, lon_key)
+	except Exception as e:
+		logger.warning("Error en geocodificación inversa", extra={"error": str(e), "provider": geocoder.name})
+		return None
+
+	if ubicacion:
+		GeocodeCache.objects.update_or_create(
+			lat_key=lat_key,
+			lon_key=lon_key,
+			defaults={"ubicacion": ubicacion, "provider": provider},
+		)
+	return ubicacion
+
+
+def geocode_perfil(perfil_id, geocoder=None, use_cache=True):
+	"""
+	Tarea: completar ``ubicacion`` de un perfil desde sus coordenadas.
+
+	Solo escribe si las coordenadas no cambiaron mientras tanto.
+	"""
+	from .models import EmpresaPerfil
+
+	perfil = EmpresaPerfil.objects.filter(pk=perfil_id).only("id", "latitude", "longitude").first()
+	if perfil is None or perfil.latitude is None or perfil.longitude is None:
+		return None
+
+	ubicacion = reverse_geocode(perfil.latitude, perfil.longitude, geocoder=geocoder, use_cache=use_cache)
+	if ubicacion:
+		EmpresaPerfil.objects.filter(
+			pk=perfil.pk,
+			latitude=perfil.latitude,
+			longitude=perfil.longitude,
+		).update(ubicacion=ubicacion)
+	return ubicacion
+
+
+class RateLimiter:
+	"""Limitador thread-safe: como máximo ``rate`` llamadas por segundo."""
+
+	def __init__(self, rate):
+		self.interval = 1.0 / rate if rate > 0 else 0.0
+		self._lock = threading.Lock()
+		self._next_slot = 0.0
+
+	def wait(self):
+		with self._lock:
+			now = time.monotonic()
+			slot = max(now, self._next_slot)
+			self._next_slot = slot + self.interval
+		delay = slot - now
+		if delay > 0:
+			time.sleep(delay)
+
+
+class RateLimitedGeocoder(ReverseGeocoder):
+	"""Envuelve un proveedor aplicando un ``RateLimiter`` compartido."""
+
+	def __init__(self, geocoder, limiter):
+		self.geocoder = geocoder
+		self.limiter = limiter
+		self.name = geocoder.name
+
+	def reverse(self, latitude, longitude):
+		return self.reverse_with_provider(latitude, longitude)[0]
+
+	def reverse_with_provider(self, latitude, longitude):
+		self.limiter.wait()
+		return self.geocoder.reverse_with_provider(latitude, longitude)
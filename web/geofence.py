@@ -0,0 +1,117 @@
+"""
+Auditoría de geocerca: distancia entre la posición capturada y la posición
+objetivo (pozo) de cada medición, calculada en lote con NumPy.
+"""
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .changefeed import record_changes
+from .geo import EARTH_RADIUS_M
+from .stats import refresh_out_of_range
+
+logger = logging.getLogger(__name__)
+
+AUDIT_FIELDS = ("captured_latitude", "captured_longitude", "target_latitude", "target_longitude")
+
+
+def geofence_radius_m():
+	return float(getattr(settings, "GEOFENCE_RADIUS_M", 200))
+
+
+def haversine_vector(lat1, lon1, lat2, lon2):
+	"""
+	Distancia haversine en metros entre arrays de coordenadas (grados).
+
+	Las posiciones con NaN devuelven NaN.
+	"""
+	lat1 = np.radians(np.asarray(lat1, dtype=np.float64))
+	lon1 = np.radians(np.asarray(lon1, dtype=np.float64))
+	lat2 = np.radians(np.asarray(lat2, dtype=np.float64))
+	lon2 = np.radians(np.asarray(lon2, dtype=np.float64))
+
+	a = (
+		np.sin((lat2 - lat1) / 2.0) ** 2
+		+ np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+	)
+	return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _rows_to_arrays(rows):
+	ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+	coords = np.array(
+		[[np.nan if value is None else float(value) for value in row[1:]] for row in rows],
+		dtype=np.float64,
+	).reshape(len(rows), 4)
+	return ids, coords
+
+
+def _audit_batch(model, rows, radius_m):
+	ids, coords = _rows_to_arrays(rows)
+	distances = haversine_vector(coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3])
+	valid = ~np.isnan(distances)
+	out_of_range = valid & (distances > radius_m)
+
+	updates = [
+		model(
+			id=int(row_id),
+			geofence_distance_m=float(distance) if has_distance else None,
+			is_out_of_range=bool(flag),
+		)
+		for row_id, distance, has_distance, flag in zip(ids, distances, valid, out_of_range)
+	]
+	with transaction.atomic():
+		model.objects.bulk_update(updates, ["geofence_distance_m", "is_out_of_range"], batch_size=1000)
+		record_changes(ids.tolist())
+		refresh_out_of_range(ids.tolist())
+	return int(out_of_range.sum())
+
+
+def audit_mediciones(queryset=None, ids=None, radius_m=None, batch_size=5000):
+	"""
+	Calcular distancia y bandera fuera de rango para un conjunto de mediciones.
+
+	Args:
+		queryset: Mediciones a auditar (por defecto, todas)
+		ids: Alternativa a ``queryset`` con una lista de IDs
+		radius_m: Radio de la geocerca (default: settings.GEOFENCE_RADIUS_M)
+		batch_size: Filas leídas y actualizadas por lote
+
+	Returns:
+		dict: {'procesadas': int, 'fuera_de_rango': int}
+	"""
+	from .models import Medicion
+
+	if queryset is None:
+		queryset = Medicion.objects.all()
+	if ids is not None:
+		queryset = queryset.filter(id__in=ids)
+	if radius_m is None:
+		radius_m = geofence_radius_m()
+
+	rows_iter = queryset.order_by().values_list("id", *AUDIT_FIELDS).iterator(chunk_size=batch_size)
+
+	procesadas = 0
+	fuera_de_rango = 0
+	batch = []
+	for row in rows_iter:
+		batch.append(row)
+		if len(batch) >= batch_size:
+			fuera_de_rango += _audit_batch(Medicion, batch, radius_m)
+			procesadas += len(batch)
+			batch = []
+	if batch:
+		fuera_de_rango += _audit_batch(Medicion, batch, radius_m)
+		procesadas += len(batch)
+
+	return {"procesadas": procesadas, "fuera_de_rango": fuera_de_rango}
+
+
+def audit_medicion_on_commit(medicion_id):
+	"""Hook post-ingesta: auditar una medición recién guardada sin romper la carga."""
+	try:
+		audit_mediciones(ids=[medicion_id])
+	except Exception:
+		logger.exception("Error auditando geocerca", extra={"medicion_id": medicion_id})
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from web.geofence import audit_mediciones, geofence_radius_m
+from web.models import Medicion
+
+
+class Command(BaseCommand):
+	help = "Calcular en lote la distancia entre posición capturada y objetivo de las mediciones"
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--radio",
+			type=float,
+			default=None,
+			help="Radio de la geocerca en metros (default: GEOFENCE_RADIUS_M)",
+		)
+		parser.add_argument(
+			"--solo-pendientes",
+			action="store_true",
+			dest="solo_pendientes",
+			help="Procesar solo mediciones sin distancia calculada",
+		)
+		parser.add_argument(
+			"--usuario",
+			type=int,
+			default=None,
+			help="Limitar a las mediciones de un usuario (ID)",
+		)
+		parser.add_argument(
+			"--batch-size",
+			type=int,
+			default=5000,
+			help="Filas por lote",
+		)
+
+	def handle(self, *args, **options):
+		radius_m = options["radio"] if options["radio"] is not None else geofence_radius_m()
+
+		queryset = Medicion.objects.all()
+		if options["solo_pendientes"]:
+			queryset = queryset.filter(geofence_distance_m__isnull=True)
+		if options["usuario"]:
+			queryset = queryset.filter(user_id=options["usuario"])
+
+		start = time.monotonic()
+		result = audit_mediciones(queryset, radius_m=radius_m, batch_size=options["batch_size"])
+		elapsed = time.monotonic() - start
+
+		self.stdout.write(self.style.SUCCESS(
+			f"✓ {result['procesadas']} mediciones auditadas en {elapsed:.2f}s "
+			f"(radio {radius_m:.0f} m): {result['fuera_de_rango']} fuera de rango"
+		))
@@ -0,0 +1,64 @@
+import csv
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from web.gazetteer import DEFAULT_CELL_SIZE, KINDS, build_gazetteer
+
+
+class Command(BaseCommand):
+	help = "Generar el nomenclador binario (memory-mapped) para geocodificación inversa offline"
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--origen",
+			type=str,
+			default=str(settings.BASE_DIR / "data" / "gazetteer" / "mendoza.csv"),
+			help="CSV con columnas nombre,tipo,lat,lon (tipo: " + ", ".join(KINDS) + ")",
+		)
+		parser.add_argument(
+			"--destino",
+			type=str,
+			default=str(settings.GAZETTEER_PATH),
+			help="Archivo .gaz a generar",
+		)
+		parser.add_argument(
+			"--cell-size",
+			type=float,
+			default=DEFAULT_CELL_SIZE,
+			help="Lado de la celda de la grilla en grados",
+		)
+		parser.add_argument(
+			"--si-falta",
+			action="store_true",
+			dest="si_falta",
+			help="No regenerar si el destino es más nuevo que el origen",
+		)
+
+	def handle(self, *args, **options):
+		origen = Path(options["origen"])
+		destino = Path(options["destino"])
+
+		if not origen.exists():
+			raise CommandError(f"No existe el archivo de origen: {origen}")
+
+		if options["si_falta"] and destino.exists() and os.path.getmtime(destino) >= os.path.getmtime(origen):
+			self.stdout.write(f"Nomenclador al día: {destino}")
+			return
+
+		start = time.monotonic()
+		with open(origen, newline="", encoding="utf-8") as f:
+			reader = csv.DictReader(f)
+			try:
+				records = [(row["nombre"], row["tipo"], row["lat"], row["lon"]) for row in reader]
+				count = build_gazetteer(records, destino, cell_size=options["cell_size"])
+			except (KeyError, ValueError) as exc:
+				raise CommandError(f"Nomenclador inválido: {exc}")
+
+		elapsed = time.monotonic() - start
+		self.stdout.write(self.style.SUCCESS(
+			f"✓ {count} registros escritos en {destino} ({destino.stat().st_size / 1024:.1f} KB, {elapsed:.2f}s)"
+		))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from web.anomalies import run_scan
+
+
+class Command(BaseCommand):
+	help = "Detectar anomalías (retrocesos, picos, medidores sin cambios, huecos) en las empresas con datos nuevos"
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--usuario",
+			type=int,
+			action="append",
+			default=None,
+			help="Analizar este usuario (ID) aunque no tenga datos nuevos; se puede repetir",
+		)
+
+	def handle(self, *args, **options):
+		start = time.monotonic()
+		results = run_scan(options["usuario"])
+		for user_id, (flagged, updated) in results.items():
+			self.stdout.write(f"  Empresa {user_id}: {flagged} con anomalías ({updated} actualizadas)")
+		elapsed = time.monotonic() - start
+		self.stdout.write(self.style.SUCCESS(
+			f"✓ {len(results)} empresas analizadas en {elapsed:.2f}s"
+		))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from web.changefeed import DEFAULT_LIMIT, iter_changes, ndjson
+
+
+class Command(BaseCommand):
+	help = "Emitir en NDJSON los cambios de mediciones posteriores a un cursor (seq)"
+
+	def add_arguments(self, parser):
+		parser.add_argument("--desde", type=int, default=0, help="Último seq ya sincronizado (default: 0)")
+		parser.add_argument("--limite", type=int, default=DEFAULT_LIMIT, help="Máximo de cambios a emitir")
+		parser.add_argument("--usuario", type=int, default=None, help="Limitar a un usuario (ID)")
+		parser.add_argument("--salida", default="-", help="Archivo de salida (default: stdout)")
+
+	def handle(self, *args, **options):
+		changes = iter_changes(options["desde"], limit=options["limite"], user_id=options["usuario"])
+		if options["salida"] == "-":
+			for line in ndjson(changes):
+				self.stdout.write(line, ending="")
+			return
+		with open(options["salida"], "w", encoding="utf-8") as f:
+			f.writelines(ndjson(changes))
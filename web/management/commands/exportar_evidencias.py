@@ -0,0 +1,40 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from web.exports import evidence_bundle, normalize_export_params
+
+
+class Command(BaseCommand):
+	help = "Generar el ZIP de evidencias (CSV + fotos) de una empresa y período"
+
+	def add_arguments(self, parser):
+		parser.add_argument("usuario", type=int, help="ID del usuario (empresa)")
+		parser.add_argument("salida", help="Ruta del ZIP a generar")
+		parser.add_argument("--desde", default=None, help="Fecha inicial YYYY-MM-DD (inclusive)")
+		parser.add_argument("--hasta", default=None, help="Fecha final YYYY-MM-DD (inclusive)")
+
+	def handle(self, *args, **options):
+		if not User.objects.filter(id=options["usuario"]).exists():
+			raise CommandError(f"Usuario {options['usuario']} no encontrado")
+		try:
+			params = normalize_export_params(
+				user_id=options["usuario"],
+				start_date=options["desde"],
+				end_date=options["hasta"],
+			)
+		except ValueError as e:
+			raise CommandError(str(e))
+
+		start = time.monotonic()
+		bundle, _ = evidence_bundle(params)
+		with open(options["salida"], "wb") as f:
+			for chunk in bundle:
+				f.write(chunk)
+		elapsed = time.monotonic() - start
+
+		self.stdout.write(self.style.SUCCESS(
+			f"✓ {len(bundle.entries) - 1} fotos + CSV en {options['salida']} "
+			f"({bundle.size / (1024 * 1024):.1f} MB) en {elapsed:.2f}s"
+		))
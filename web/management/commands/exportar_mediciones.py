@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from web.exports import EXPORT_WRITERS, export_queryset, normalize_export_params
+
+
+class Command(BaseCommand):
+	help = "Exportar mediciones a un archivo local (Parquet, Arrow IPC o CSV comprimido)"
+
+	def add_arguments(self, parser):
+		parser.add_argument("salida", help="Ruta del archivo a generar")
+		parser.add_argument(
+			"--formato",
+			choices=sorted(EXPORT_WRITERS),
+			default="parquet",
+			help="Formato de salida (default: parquet)",
+		)
+		parser.add_argument("--usuario", type=int, default=None, help="Limitar a un usuario (ID)")
+		parser.add_argument("--desde", default=None, help="Fecha inicial YYYY-MM-DD (inclusive)")
+		parser.add_argument("--hasta", default=None, help="Fecha final YYYY-MM-DD (inclusive)")
+		parser.add_argument(
+			"--columnas",
+			default="",
+			help="Columnas separadas por coma (solo parquet/arrow; default: todas)",
+		)
+
+	def handle(self, *args, **options):
+		columns = [c.strip() for c in options["columnas"].split(",") if c.strip()]
+		if columns and options["formato"] == "csv":
+			raise CommandError("--columnas solo aplica a parquet y arrow")
+		try:
+			params = normalize_export_params(
+				user_id=options["usuario"],
+				start_date=options["desde"],
+				end_date=options["hasta"],
+				columns=columns,
+			)
+		except ValueError as e:
+			raise CommandError(str(e))
+
+		writer = EXPORT_WRITERS[options["formato"]]
+		queryset = export_queryset(params)
+		total = queryset.count()
+
+		start = time.monotonic()
+		with open(options["salida"], "wb") as f:
+			writer(queryset, f, lambda count: None, columns=params.get("columns"))
+		elapsed = time.monotonic() - start
+
+		self.stdout.write(self.style.SUCCESS(
+			f"✓ {total} mediciones exportadas a {options['salida']} ({options['formato']}) en {elapsed:.2f}s"
+		))
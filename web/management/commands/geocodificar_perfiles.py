@@ -0,0 +1,76 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from web.geocoding import RateLimitedGeocoder, RateLimiter, geocode_perfil, get_geocoder
+from web.models import EmpresaPerfil
+
+
+class Command(BaseCommand):
+	help = "Geocodificar (inversa) todos los perfiles de empresa con concurrencia limitada"
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--concurrencia",
+			type=int,
+			default=4,
+			help="Hilos concurrentes",
+		)
+		parser.add_argument(
+			"--rate",
+			type=float,
+			default=1.0,
+			help="Máximo de consultas por segundo al proveedor (Nominatim: 1)",
+		)
+		parser.add_argument(
+			"--todos",
+			action="store_true",
+			help="Incluir perfiles que ya tienen ubicación",
+		)
+		parser.add_argument(
+			"--sin-cache",
+			action="store_true",
+			dest="sin_cache",
+			help="Ignorar la caché persistente",
+		)
+
+	def handle(self, *args, **options):
+		queryset = EmpresaPerfil.objects.filter(latitude__isnull=False, longitude__isnull=False)
+		if not options["todos"]:
+			queryset = queryset.filter(ubicacion__isnull=True) | queryset.filter(ubicacion="")
+		perfil_ids = list(queryset.values_list("id", flat=True))
+
+		if not perfil_ids:
+			self.stdout.write(self.style.WARNING("No hay perfiles para geocodificar"))
+			return
+
+		geocoder = RateLimitedGeocoder(get_geocoder(), RateLimiter(options["rate"]))
+		use_cache = not options["sin_cache"]
+
+		def task(perfil_id):
+			close_old_connections()
+			try:
+				return perfil_id, geocode_perfil(perfil_id, geocoder=geocoder, use_cache=use_cache)
+			finally:
+				close_old_connections()
+
+		start = time.monotonic()
+		ok = 0
+		with ThreadPoolExecutor(max_workers=max(1, options["concurrencia"])) as executor:
+			futures = [executor.submit(task, perfil_id) for perfil_id in perfil_ids]
+			for future in as_completed(futures):
+				try:
+					perfil_id, ubicacion = future.result()
+				except Exception as exc:
+					self.stdout.write(self.style.ERROR(f"✗ Error: {exc}"))
+					continue
+				if ubicacion:
+					ok += 1
+					self.stdout.write(self.style.SUCCESS(f"✓ Perfil {perfil_id}: {ubicacion}"))
+				else:
+					self.stdout.write(self.style.WARNING(f"⚠ Perfil {perfil_id}: sin resultado"))
+
+		elapsed = time.monotonic() - start
+		self.stdout.write(self.style.SUCCESS(f"\n✓ {ok}/{len(perfil_ids)} perfiles geocodificados en {elapsed:.1f}s"))
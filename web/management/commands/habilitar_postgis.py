@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from web.geo import install_spatial_columns
+
+
+class Command(BaseCommand):
+	help = "Crear columnas geography (PostGIS) e índices GiST en mediciones y perfiles de empresa"
+
+	def handle(self, *args, **options):
+		if connection.vendor != "postgresql":
+			raise CommandError("PostGIS requiere PostgreSQL; con otro motor se usan las columnas lat/lon.")
+
+		try:
+			install_spatial_columns(connection)
+		except Exception as exc:
+			raise CommandError(f"No se pudo habilitar PostGIS: {exc}")
+
+		self.stdout.write(self.style.SUCCESS("Columnas 'location' e índices GiST listos"))
+		self.stdout.write("Recuerde definir USE_POSTGIS=True para que las consultas los utilicen.")
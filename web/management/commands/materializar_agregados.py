@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from web.buckets import GRANULARITIES, materialize
+from web.models import BucketWatermark, MedicionBucket
+
+
+class Command(BaseCommand):
+	help = "Materializar los agregados de consumo de los períodos cerrados (hora/día/semana/mes)"
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--granularidad",
+			choices=GRANULARITIES,
+			action="append",
+			default=None,
+			help="Granularidad a procesar; se puede repetir (default: todas)",
+		)
+		parser.add_argument(
+			"--reconstruir",
+			action="store_true",
+			help="Borrar lo materializado y recalcular desde cero",
+		)
+
+	def handle(self, *args, **options):
+		for granularity in options["granularidad"] or GRANULARITIES:
+			start = time.monotonic()
+			if options["reconstruir"]:
+				MedicionBucket.objects.filter(granularity=granularity).delete()
+				BucketWatermark.objects.filter(granularity=granularity).delete()
+			watermark = materialize(granularity)
+			elapsed = time.monotonic() - start
+			if watermark is None:
+				self.stdout.write(self.style.WARNING(f"• {granularity}: otro proceso está materializando, se omite"))
+				continue
+			total = MedicionBucket.objects.filter(granularity=granularity).count()
+			self.stdout.write(self.style.SUCCESS(
+				f"✓ {granularity}: {total} agregados hasta {watermark:%Y-%m-%d %H:%M} ({elapsed:.2f}s)"
+			))
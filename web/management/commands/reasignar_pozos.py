@@ -0,0 +1,75 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from web.changefeed import record_changes
+from web.models import Medicion
+from web.spatial_index import WellIndex
+
+
+class Command(BaseCommand):
+	help = "Asignar a cada medición el pozo (EmpresaPerfil) más cercano a su posición capturada"
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--solo-sin-asignar",
+			action="store_true",
+			dest="solo_sin_asignar",
+			help="Procesar solo mediciones sin pozo asignado",
+		)
+		parser.add_argument(
+			"--batch-size",
+			type=int,
+			default=5000,
+			help="Filas por lote",
+		)
+		parser.add_argument(
+			"--dry-run",
+			action="store_true",
+			dest="dry_run",
+			help="Mostrar qué se haría sin hacer cambios",
+		)
+
+	def handle(self, *args, **options):
+		batch_size = options["batch_size"]
+		dry_run = options["dry_run"]
+
+		# Un solo índice para todo el backfill: ninguna consulta por medición
+		index = WellIndex.from_database()
+		if not len(index):
+			self.stdout.write(self.style.WARNING("No hay perfiles de empresa con coordenadas"))
+			return
+
+		queryset = Medicion.objects.filter(
+			captured_latitude__isnull=False,
+			captured_longitude__isnull=False,
+		)
+		if options["solo_sin_asignar"]:
+			queryset = queryset.filter(matched_perfil__isnull=True)
+
+		rows = queryset.order_by().values_list("id", "captured_latitude", "captured_longitude")
+
+		start = time.monotonic()
+		procesadas = 0
+		batch = []
+		for medicion_id, lat, lon in rows.iterator(chunk_size=batch_size):
+			perfil_id, _, distance_m = index.nearest(lat, lon)
+			batch.append(Medicion(id=medicion_id, matched_perfil_id=perfil_id, matched_distance_m=distance_m))
+			if len(batch) >= batch_size:
+				procesadas += self._flush(batch, dry_run)
+				batch = []
+		procesadas += self._flush(batch, dry_run)
+
+		elapsed = time.monotonic() - start
+		prefix = "[DRY RUN] " if dry_run else ""
+		self.stdout.write(self.style.SUCCESS(
+			f"{prefix}✓ {procesadas} mediciones asignadas a {len(index)} pozos en {elapsed:.2f}s"
+		))
+
+	def _flush(self, batch, dry_run):
+		if batch and not dry_run:
+			with transaction.atomic():
+				Medicion.objects.bulk_update(batch, ["matched_perfil", "matched_distance_m"], batch_size=1000)
+				record_changes([medicion.id for medicion in batch])
+		return len(batch)
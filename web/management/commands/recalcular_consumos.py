@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from web.consumption import recalculate
+
+
+class Command(BaseCommand):
+	help = "Calcular el consumo (delta y caudal) entre lecturas validadas consecutivas de todo el historial"
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--usuario",
+			type=int,
+			action="append",
+			default=None,
+			help="Limitar a un usuario (ID); se puede repetir",
+		)
+
+	def handle(self, *args, **options):
+		start = time.monotonic()
+		actualizadas = recalculate(options["usuario"])
+		elapsed = time.monotonic() - start
+		self.stdout.write(self.style.SUCCESS(
+			f"✓ {actualizadas} mediciones actualizadas en {elapsed:.2f}s"
+		))
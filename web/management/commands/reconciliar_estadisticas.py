@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from web.models import EmpresaStats
+from web.stats import compute_stats, rebuild_stats
+
+COMPARED_FIELDS = ("total", "validadas", "pendientes", "fuera_de_rango", "value_sum", "minimo", "maximo", "primera_medicion", "ultima_medicion")
+
+
+class Command(BaseCommand):
+	help = "Reconstruir la tabla EmpresaStats desde las mediciones (y reportar diferencias)"
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--usuario",
+			type=int,
+			action="append",
+			default=None,
+			help="Limitar a un usuario (ID); se puede repetir",
+		)
+		parser.add_argument(
+			"--dry-run",
+			action="store_true",
+			dest="dry_run",
+			help="Solo reportar empresas con estadísticas desactualizadas",
+		)
+
+	def handle(self, *args, **options):
+		user_ids = options["usuario"]
+		start = time.monotonic()
+
+		computed = compute_stats(user_ids)
+		stored = EmpresaStats.objects.all()
+		if user_ids is not None:
+			stored = stored.filter(user_id__in=user_ids)
+		stored = {row["user_id"]: row for row in stored.values("user_id", *COMPARED_FIELDS)}
+
+		drift = []
+		for user_id in set(computed) | set(stored):
+			expected = computed.get(user_id)
+			actual = stored.get(user_id)
+			if expected is None or actual is None or any(expected[f] != actual[f] for f in COMPARED_FIELDS):
+				drift.append(user_id)
+		for user_id in sorted(drift):
+			self.stdout.write(self.style.WARNING(f"  Empresa {user_id}: estadísticas desactualizadas"))
+
+		if options["dry_run"]:
+			self.stdout.write(f"[DRY RUN] {len(drift)} empresas con diferencias")
+			return
+
+		escritas = rebuild_stats(user_ids)
+		elapsed = time.monotonic() - start
+		self.stdout.write(self.style.SUCCESS(
+			f"✓ {escritas} empresas reconstruidas en {elapsed:.2f}s ({len(drift)} tenían diferencias)"
+		))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from web.warmup import ACTIVE_DAYS, FAMILIES, warm
+
+
+class Command(BaseCommand):
+	help = "Precalentar las cachés más pedidas (dashboard, mapa semanal, empresas, rankings y gráficos)"
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--familia",
+			choices=list(FAMILIES),
+			action="append",
+			default=None,
+			help="Precalentar solo esta familia; se puede repetir (default: todas)",
+		)
+		parser.add_argument(
+			"--workers",
+			type=int,
+			default=4,
+			help="Hilos en paralelo (default: 4; 1 = secuencial)",
+		)
+		parser.add_argument(
+			"--dias-activos",
+			type=int,
+			default=ACTIVE_DAYS,
+			help=f"Usuarios con login en estos días se consideran activos (default: {ACTIVE_DAYS})",
+		)
+
+	def handle(self, *args, **options):
+		start = time.monotonic()
+		results = warm(options["familia"], workers=max(1, options["workers"]), active_days=options["dias_activos"])
+		errors = 0
+		for family, result in results.items():
+			errors += result["errors"]
+			line = f"  {family}: {result['entries']} entradas en {result['seconds']:.2f}s"
+			if result["errors"]:
+				line += f" ({result['errors']} con error)"
+			self.stdout.write(line)
+		elapsed = time.monotonic() - start
+		message = f"✓ Cachés precalentadas en {elapsed:.2f}s"
+		if errors:
+			self.stdout.write(self.style.WARNING(f"{message} con {errors} errores (ver log)"))
+		else:
+			self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:12
+
+from django.conf import settings
+from django.db import migrations
+
+
+def install_location_columns(apps, schema_editor):
+    # Solo con USE_POSTGIS activo; si se activa más tarde usar `habilitar_postgis`
+    if not getattr(settings, 'USE_POSTGIS', False):
+        return
+    from web.geo import install_spatial_columns
+    install_spatial_columns(schema_editor.connection)
+
+
+def remove_location_columns(apps, schema_editor):
+    from web.geo import uninstall_spatial_columns
+    uninstall_spatial_columns(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0007_empresaperfil_latitude_empresaperfil_longitude'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_location_columns, remove_location_columns),
+    ]
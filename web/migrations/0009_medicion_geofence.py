@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0008_spatial_location_columns'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicion',
+            name='geofence_distance_m',
+            field=models.FloatField(blank=True, help_text='Distancia en metros entre la posición capturada y la objetivo', null=True),
+        ),
+        migrations.AddField(
+            model_name='medicion',
+            name='is_out_of_range',
+            field=models.BooleanField(default=False, help_text='¿Se capturó fuera del radio de la geocerca?'),
+        ),
+        migrations.AddIndex(
+            model_name='medicion',
+            index=models.Index(condition=models.Q(('is_out_of_range', True)), fields=['user', '-timestamp'], name='web_medicion_fuera_rango_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-19 11:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0009_medicion_geofence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicion',
+            name='matched_distance_m',
+            field=models.FloatField(blank=True, help_text='Distancia en metros al pozo asignado', null=True),
+        ),
+        migrations.AddField(
+            model_name='medicion',
+            name='matched_perfil',
+            field=models.ForeignKey(blank=True, help_text='Pozo más cercano a la posición capturada', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mediciones_asignadas', to='web.empresaperfil'),
+        ),
+    ]
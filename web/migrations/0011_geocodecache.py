@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-19 11:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0010_medicion_matched_perfil'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lat_key', models.FloatField(help_text='Latitud redondeada')),
+                ('lon_key', models.FloatField(help_text='Longitud redondeada')),
+                ('ubicacion', models.CharField(max_length=300)),
+                ('provider', models.CharField(help_text='Proveedor que resolvió la ubicación', max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Geocodificación en caché',
+                'verbose_name_plural': 'Geocodificaciones en caché',
+                'constraints': [models.UniqueConstraint(fields=('lat_key', 'lon_key'), name='web_geocodecache_coords_uniq')],
+            },
+        ),
+    ]
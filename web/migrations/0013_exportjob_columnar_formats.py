@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0012_exportjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='format',
+            field=models.CharField(choices=[('csv', 'CSV comprimido (gzip)'), ('parquet', 'Parquet'), ('arrow', 'Arrow IPC')], default='csv', max_length=10),
+        ),
+    ]
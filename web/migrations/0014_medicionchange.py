@@ -0,0 +1,37 @@
+# Generated by Django 6.0.1 on 2026-10-19 15:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0013_exportjob_columnar_formats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicionChange',
+            fields=[
+                ('seq', models.BigAutoField(help_text='Secuencia monótona del cambio', primary_key=True, serialize=False)),
+                ('medicion_id', models.BigIntegerField(db_index=True)),
+                ('user_id', models.IntegerField(blank=True, null=True)),
+                ('op', models.CharField(choices=[('insert', 'Alta'), ('update', 'Modificación'), ('delete', 'Baja')], max_length=6)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Cambio de medición',
+                'verbose_name_plural': 'Cambios de mediciones',
+                'indexes': [models.Index(fields=['user_id', 'seq'], name='web_medicionchange_user_idx')],
+            },
+        ),
+        # Las mediciones existentes entran al feed como altas, en orden de id
+        migrations.RunSQL(
+            sql=(
+                "INSERT INTO web_medicionchange (medicion_id, user_id, op, changed_at) "
+                "SELECT id, user_id, 'insert', timestamp FROM web_medicion ORDER BY id"
+            ),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
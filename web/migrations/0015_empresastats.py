@@ -0,0 +1,56 @@
+# Generated by Django 6.0.1 on 2026-10-19 16:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def poblar_estadisticas(apps, schema_editor):
+    from django.db.models import Count, Max, Min, Q, Sum
+
+    Medicion = apps.get_model('web', 'Medicion')
+    EmpresaStats = apps.get_model('web', 'EmpresaStats')
+    rows = Medicion.objects.filter(user__isnull=False).order_by().values('user_id').annotate(
+        total=Count('id'),
+        validadas=Count('id', filter=Q(is_valid=True)),
+        pendientes=Count('id', filter=Q(is_valid=False)),
+        fuera_de_rango=Count('id', filter=Q(is_out_of_range=True)),
+        value_sum=Sum('value'),
+        minimo=Min('value'),
+        maximo=Max('value'),
+        primera_medicion=Min('timestamp'),
+        ultima_medicion=Max('timestamp'),
+    )
+    EmpresaStats.objects.bulk_create([EmpresaStats(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0014_medicionchange'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmpresaStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('validadas', models.PositiveIntegerField(default=0)),
+                ('pendientes', models.PositiveIntegerField(default=0)),
+                ('fuera_de_rango', models.PositiveIntegerField(default=0)),
+                ('value_sum', models.DecimalField(decimal_places=2, default=0, help_text='Suma de valores (para el promedio)', max_digits=18)),
+                ('minimo', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('maximo', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('primera_medicion', models.DateTimeField(blank=True, null=True)),
+                ('ultima_medicion', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Estadísticas de empresa',
+                'verbose_name_plural': 'Estadísticas de empresas',
+            },
+        ),
+        migrations.RunPython(poblar_estadisticas, migrations.RunPython.noop),
+    ]
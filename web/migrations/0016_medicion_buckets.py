@@ -0,0 +1,50 @@
+# Generated by Django 6.0.1 on 2026-10-19 16:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0015_empresastats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BucketWatermark',
+            fields=[
+                ('granularity', models.CharField(max_length=5, primary_key=True, serialize=False)),
+                ('closed_until', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Marca de agregados',
+                'verbose_name_plural': 'Marcas de agregados',
+            },
+        ),
+        migrations.CreateModel(
+            name='MedicionBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hora'), ('day', 'Día'), ('week', 'Semana'), ('month', 'Mes')], max_length=5)),
+                ('start', models.DateTimeField(help_text='Inicio del período (hora local truncada)')),
+                ('count', models.PositiveIntegerField()),
+                ('value_sum', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('minimo', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('maximo', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('first_at', models.DateTimeField()),
+                ('first_value', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('last_at', models.DateTimeField()),
+                ('last_value', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Agregado de mediciones',
+                'verbose_name_plural': 'Agregados de mediciones',
+                'indexes': [models.Index(fields=['granularity', 'start'], name='web_medicionbucket_start_idx')],
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'user', 'start'), name='web_medicionbucket_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0016_medicion_buckets'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicion',
+            name='consumption_rate',
+            field=models.FloatField(blank=True, help_text='Consumo por hora entre lecturas validadas consecutivas', null=True),
+        ),
+        migrations.AddField(
+            model_name='medicion',
+            name='delta_hours',
+            field=models.FloatField(blank=True, help_text='Horas transcurridas desde la lectura validada anterior', null=True),
+        ),
+        migrations.AddField(
+            model_name='medicion',
+            name='delta_value',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Volumen consumido desde la lectura validada anterior', max_digits=12, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='medicion',
+            index=models.Index(condition=models.Q(('is_valid', True)), fields=['user', 'timestamp'], name='web_medicion_validas_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicion',
+            index=models.Index(condition=models.Q(('delta_value__isnull', False)), fields=['timestamp'], name='web_medicion_consumo_idx'),
+        ),
+    ]
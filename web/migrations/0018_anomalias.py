@@ -0,0 +1,48 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0017_medicion_consumption'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomalyScan',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='anomaly_scan', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('last_seq', models.BigIntegerField(default=0, help_text='Último seq del feed de cambios incluido en el análisis')),
+                ('flagged', models.PositiveIntegerField(default=0, help_text='Mediciones con alguna anomalía')),
+                ('scanned_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Análisis de anomalías',
+                'verbose_name_plural': 'Análisis de anomalías',
+            },
+        ),
+        migrations.AddField(
+            model_name='medicion',
+            name='anomaly_flags',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Banderas de anomalía (bits de ANOMALIA_*)'),
+        ),
+        migrations.AddField(
+            model_name='medicion',
+            name='anomaly_reviewed',
+            field=models.BooleanField(default=False, help_text='¿La anomalía ya fue revisada?'),
+        ),
+        migrations.AddField(
+            model_name='medicion',
+            name='anomaly_score',
+            field=models.FloatField(blank=True, help_text='Severidad de la anomalía (1 = en el umbral)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='medicion',
+            index=models.Index(condition=models.Q(('anomaly_flags__gt', 0)), fields=['-timestamp'], name='web_medicion_anomalias_idx'),
+        ),
+    ]
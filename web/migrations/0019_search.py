@@ -0,0 +1,60 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:05
+
+from django.db import migrations
+
+# SQL copiado a mano (no importar web.search: la migración debe seguir
+# siendo válida aunque el código cambie).
+#
+# La columna generada STORED reescribe web_medicion bajo ACCESS EXCLUSIVE:
+# lecturas y escrituras quedan bloqueadas mientras dura, así que en una base
+# grande hay que aplicarla en una ventana de mantenimiento. Los índices se
+# crean CONCURRENTLY (por eso la migración no es atómica) y no bloquean
+# escrituras; si uno falla queda INVALID y hay que borrarlo antes de reintentar.
+CREATE_COLUMN = (
+    'ALTER TABLE "web_medicion" ADD COLUMN IF NOT EXISTS search_vector tsvector '
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('spanish', coalesce(\"ubicacion_manual\", '')), 'A') || "
+    "setweight(to_tsvector('spanish', coalesce(\"observation\", '')), 'B')"
+    ") STORED"
+)
+
+# (nombre del índice, tabla, expresión)
+INDEXES = (
+    ("web_medicion_search_gin", "web_medicion", "search_vector"),
+    ("auth_user_username_trgm", "auth_user", '"username" gin_trgm_ops'),
+    ("web_empresaperfil_ubicacion_trgm", "web_empresaperfil", '"ubicacion" gin_trgm_ops'),
+    ("web_medicion_ubicacion_manual_trgm", "web_medicion", '"ubicacion_manual" gin_trgm_ops'),
+)
+
+
+def install_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute(CREATE_COLUMN)
+        for name, table, expression in INDEXES:
+            cursor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" USING GIN ({expression})')
+
+
+def remove_search(apps, schema_editor):
+    # La extensión se conserva
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for name, table, expression in INDEXES:
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+        cursor.execute('ALTER TABLE "web_medicion" DROP COLUMN IF EXISTS search_vector')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('web', '0018_anomalias'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, remove_search),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0019_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicion',
+            index=models.Index(condition=models.Q(('is_valid', False)), fields=['user', '-timestamp'], name='web_medicion_pendientes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicion',
+            index=models.Index(condition=models.Q(('is_valid', False)), fields=['timestamp', 'id'], name='web_medicion_cola_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='medicion',
+            name='web_medicio_is_vali_949a15_idx',
+        ),
+    ]
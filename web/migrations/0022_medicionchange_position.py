@@ -0,0 +1,37 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:00
+
+from django.db import migrations, models
+
+
+def copy_seq(apps, schema_editor):
+    # Los cursores ya entregados (seq) siguen siendo válidos como posición
+    MedicionChange = apps.get_model('web', 'MedicionChange')
+    MedicionChange.objects.update(position=models.F('seq'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0021_exportjob_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicionchange',
+            name='position',
+            field=models.BigIntegerField(blank=True, help_text='Posición en el feed, en orden de confirmación', null=True, unique=True),
+        ),
+        migrations.RunPython(copy_seq, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='medicionchange',
+            index=models.Index(fields=['user_id', 'position'], name='web_medicionchange_userpos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicionchange',
+            index=models.Index(condition=models.Q(('position__isnull', True)), fields=['seq'], name='web_medicionchange_sinpos_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='medicionchange',
+            name='web_medicionchange_user_idx',
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:20
+
+from django.db import migrations, models
+
+
+def clear_buckets(apps, schema_editor):
+    # Los agregados existentes no tienen consumo: se vuelven a materializar desde cero
+    apps.get_model('web', 'MedicionBucket').objects.all().delete()
+    apps.get_model('web', 'BucketWatermark').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0022_medicionchange_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicionbucket',
+            name='consumo',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Consumo de las lecturas validadas del período (suma de delta_value)', max_digits=18),
+        ),
+        migrations.RunPython(clear_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Las posiciones existentes se copiaron de seq (0022): el valor guardado sigue valiendo
+
+    dependencies = [
+        ('web', '0023_medicionbucket_consumo'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='anomalyscan',
+            old_name='last_seq',
+            new_name='last_position',
+        ),
+        migrations.AlterField(
+            model_name='anomalyscan',
+            name='last_position',
+            field=models.BigIntegerField(default=0, help_text='Última posición del feed de cambios incluida en el análisis'),
+        ),
+    ]
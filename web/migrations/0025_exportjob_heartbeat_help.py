@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0024_anomalyscan_last_position'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Último latido del trabajo, encolado o en ejecución (detecta trabajos abandonados)', null=True),
+        ),
+    ]
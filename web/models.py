@@ -48,66 +48,62 @@ class EmpresaPerfil(models.Model):
 		return f"Perfil - {self.usuario.username}"
 	
 	def update_location_from_coordinates(self):
-		"""Actualizar ubicación en texto desde coordenadas GPS usando geocodificación inversa"""
+		"""Actualizar ubicación en texto desde coordenadas GPS usando geocodificación inversa (bloqueante)"""
 		if not self.latitude or not self.longitude:
 			return None
 		
-		try:
-			import requests
-			from time import sleep
-			
-			# Usar Nominatim de OpenStreetMap (gratuito, sin API key)
-			url = f"https://nominatim.openstreetmap.org/reverse"
-			params = {
-				'lat': float(self.latitude),
-				'lon': float(self.longitude),
-				'format': 'json',
-				'addressdetails': 1,
-				'accept-language': 'es'
-			}
-			headers = {
-				'User-Agent': 'IrrigacionApp/1.0'
-			}
-			
-			response = requests.get(url, params=params, headers=headers, timeout=5)
-			
-			if response.status_code == 200:
-				data = response.json()
-				address = data.get('address', {})
-				
-				# Construir ubicación legible
-				parts = []
-				if address.get('road'):
-					parts.append(address['road'])
-				if address.get('city'):
-					parts.append(address['city'])
-				elif address.get('town'):
-					parts.append(address['town'])
-				elif address.get('village'):
-					parts.append(address['village'])
-				if address.get('state'):
-					parts.append(address['state'])
-				if address.get('country'):
-					parts.append(address['country'])
-				
-				if parts:
-					self.ubicacion = ', '.join(parts)
-				else:
-					# Fallback: usar display_name
-					self.ubicacion = data.get('display_name', f"{self.latitude}, {self.longitude}")
-				
-				self.save()
-				return self.ubicacion
-			else:
-				return None
-				
-		except Exception as e:
-			print(f"Error en geocodificación inversa: {e}")
-			return None
+		from .geocoding import reverse_geocode
+		
+		ubicacion = reverse_geocode(self.latitude, self.longitude)
+		if ubicacion:
+			self.ubicacion = ubicacion
+			self.save(update_fields=['ubicacion', 'updated_at'])
+		return ubicacion
+	
+	def schedule_location_update(self):
+		"""Encolar la geocodificación inversa para después del commit (no bloquea la vista)"""
+		if not self.latitude or not self.longitude:
+			return
+		
+		from .geocoding import geocode_perfil
+		from .tasks import enqueue
+		
+		enqueue(geocode_perfil, self.pk)
+
+
+class GeocodeCache(models.Model):
+	"""Caché persistente de geocodificación inversa por coordenadas redondeadas"""
+	lat_key = models.FloatField(help_text="Latitud redondeada")
+	lon_key = models.FloatField(help_text="Longitud redondeada")
+	ubicacion = models.CharField(max_length=300)
+	provider = models.CharField(max_length=50, help_text="Proveedor que resolvió la ubicación")
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		verbose_name = "Geocodificación en caché"
+		verbose_name_plural = "Geocodificaciones en caché"
+		constraints = [
+			models.UniqueConstraint(fields=['lat_key', 'lon_key'], name='web_geocodecache_coords_uniq'),
+		]
+
+	def __str__(self):
+		return f"({self.lat_key}, {self.lon_key}) → {self.ubicacion}"
 
 
 class Medicion(models.Model):
 	"""Modelo de medición de caudalímetro con validaciones estrictas"""
+	# Banderas de anomalía (bits de ``anomaly_flags``, ver web/anomalies.py)
+	ANOMALIA_RETROCESO = 1
+	ANOMALIA_PICO = 2
+	ANOMALIA_SIN_CAMBIO = 4
+	ANOMALIA_HUECO = 8
+	ANOMALIA_CHOICES = [
+		(ANOMALIA_RETROCESO, "Retroceso del caudalímetro"),
+		(ANOMALIA_PICO, "Pico de consumo"),
+		(ANOMALIA_SIN_CAMBIO, "Medidor sin cambios"),
+		(ANOMALIA_HUECO, "Hueco de reporte"),
+	]
+
 	user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="mediciones", help_text="Usuario que cargó la medición")
 	value = models.DecimalField(max_digits=10, decimal_places=2, help_text="Valor del caudalímetro (m³/h)")
 	ubicacion_manual = models.CharField(max_length=200, null=True, blank=True, help_text="Para uso interno de operarios")
@@ -127,6 +123,24 @@ class Medicion(models.Model):
 	target_latitude = models.FloatField(null=True, blank=True, help_text="Latitud objetivo / esperada")
 	target_longitude = models.FloatField(null=True, blank=True, help_text="Longitud objetivo / esperada")
 
+	# Auditoría de geocerca (calculada en lote, ver web/geofence.py)
+	geofence_distance_m = models.FloatField(null=True, blank=True, help_text="Distancia en metros entre la posición capturada y la objetivo")
+	is_out_of_range = models.BooleanField(default=False, help_text="¿Se capturó fuera del radio de la geocerca?")
+	
+	# Pozo más cercano a la posición capturada (ver web/spatial_index.py)
+	matched_perfil = models.ForeignKey(EmpresaPerfil, on_delete=models.SET_NULL, null=True, blank=True, related_name="mediciones_asignadas", help_text="Pozo más cercano a la posición capturada")
+	matched_distance_m = models.FloatField(null=True, blank=True, help_text="Distancia en metros al pozo asignado")
+
+	# Consumo desde la lectura validada anterior (ver web/consumption.py)
+	delta_value = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, help_text="Volumen consumido desde la lectura validada anterior")
+	delta_hours = models.FloatField(null=True, blank=True, help_text="Horas transcurridas desde la lectura validada anterior")
+	consumption_rate = models.FloatField(null=True, blank=True, help_text="Consumo por hora entre lecturas validadas consecutivas")
+
+	# Detección de anomalías en lote (ver web/anomalies.py)
+	anomaly_flags = models.PositiveSmallIntegerField(default=0, help_text="Banderas de anomalía (bits de ANOMALIA_*)")
+	anomaly_score = models.FloatField(null=True, blank=True, help_text="Severidad de la anomalía (1 = en el umbral)")
+	anomaly_reviewed = models.BooleanField(default=False, help_text="¿La anomalía ya fue revisada?")
+
 	class Meta:
 		verbose_name = "Medición"
 		verbose_name_plural = "Mediciones"
@@ -135,12 +149,23 @@ class Medicion(models.Model):
 			models.Index(fields=['-timestamp']),
 			models.Index(fields=['user', '-timestamp']),
 			models.Index(fields=['captured_latitude', 'captured_longitude']),
-			models.Index(fields=['is_valid']),
+			# Pendientes de validación: pocas filas de una tabla que crece sin límite
+			models.Index(fields=['user', '-timestamp'], condition=models.Q(is_valid=False), name='web_medicion_pendientes_idx'),
+			models.Index(fields=['timestamp', 'id'], condition=models.Q(is_valid=False), name='web_medicion_cola_idx'),
+			models.Index(fields=['user', '-timestamp'], condition=models.Q(is_out_of_range=True), name='web_medicion_fuera_rango_idx'),
+			models.Index(fields=['user', 'timestamp'], condition=models.Q(is_valid=True), name='web_medicion_validas_idx'),
+			models.Index(fields=['timestamp'], condition=models.Q(delta_value__isnull=False), name='web_medicion_consumo_idx'),
+			models.Index(fields=['-timestamp'], condition=models.Q(anomaly_flags__gt=0), name='web_medicion_anomalias_idx'),
 		]
 
 	def __str__(self):
 		return f"{self.value} m³/h - {self.ubicacion_manual or 'Sin ubicación'} ({self.timestamp.strftime('%d/%m/%Y %H:%M')})"
 
+	@property
+	def anomaly_labels(self):
+		"""Descripciones de las anomalías marcadas"""
+		return [label for flag, label in self.ANOMALIA_CHOICES if self.anomaly_flags & flag]
+
 	@property
 	def maps_url(self):
 		"""
@@ -269,3 +294,205 @@ class Medicion(models.Model):
 				pass
 
 		super().save(*args, **kwargs)
+
+
+class ExportJob(models.Model):
+	"""Exportación pesada ejecutada en segundo plano (ver web/exports.py)"""
+	STATUS_PENDING = 'pending'
+	STATUS_RUNNING = 'running'
+	STATUS_DONE = 'done'
+	STATUS_FAILED = 'failed'
+	STATUS_CHOICES = [
+		(STATUS_PENDING, 'Pendiente'),
+		(STATUS_RUNNING, 'En proceso'),
+		(STATUS_DONE, 'Terminada'),
+		(STATUS_FAILED, 'Fallida'),
+	]
+	ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+
+	FORMAT_CSV = 'csv'
+	FORMAT_PARQUET = 'parquet'
+	FORMAT_ARROW = 'arrow'
+	FORMAT_CHOICES = [
+		(FORMAT_CSV, 'CSV comprimido (gzip)'),
+		(FORMAT_PARQUET, 'Parquet'),
+		(FORMAT_ARROW, 'Arrow IPC'),
+	]
+
+	params = models.JSONField(default=dict, help_text="Parámetros normalizados de la exportación")
+	params_hash = models.CharField(max_length=64, db_index=True, help_text="SHA-256 de formato + parámetros (deduplicación)")
+	format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default=FORMAT_CSV)
+	status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+	total_rows = models.PositiveIntegerField(null=True, blank=True)
+	processed_rows = models.PositiveIntegerField(default=0)
+	file = models.FileField(upload_to='exportaciones/%Y/%m/', null=True, blank=True)
+	error = models.TextField(blank=True, default='')
+	requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="exportaciones")
+	created_at = models.DateTimeField(auto_now_add=True)
+	started_at = models.DateTimeField(null=True, blank=True)
+	heartbeat_at = models.DateTimeField(null=True, blank=True, help_text="Último latido del trabajo, encolado o en ejecución (detecta trabajos abandonados)")
+	finished_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		verbose_name = "Exportación"
+		verbose_name_plural = "Exportaciones"
+		ordering = ["-created_at"]
+		constraints = [
+			# Un solo trabajo activo por conjunto de parámetros
+			models.UniqueConstraint(
+				fields=['params_hash'],
+				condition=models.Q(status__in=['pending', 'running']),
+				name='web_exportjob_activo_uniq',
+			),
+		]
+
+	def __str__(self):
+		return f"Exportación #{self.pk} ({self.get_status_display()})"
+
+	@property
+	def progress(self):
+		"""Porcentaje completado (0-100)"""
+		if self.status == self.STATUS_DONE:
+			return 100
+		if not self.total_rows:
+			return 0
+		return min(int(self.processed_rows * 100 / self.total_rows), 99)
+
+
+class MedicionChange(models.Model):
+	"""Registro de cambios de mediciones (feed incremental, ver web/changefeed.py)"""
+	OP_INSERT = 'insert'
+	OP_UPDATE = 'update'
+	OP_DELETE = 'delete'
+	OP_CHOICES = [
+		(OP_INSERT, 'Alta'),
+		(OP_UPDATE, 'Modificación'),
+		(OP_DELETE, 'Baja'),
+	]
+
+	seq = models.BigAutoField(primary_key=True, help_text="Secuencia monótona del cambio")
+	# Sin FK: las bajas (tombstones) deben sobrevivir a la medición
+	medicion_id = models.BigIntegerField(db_index=True)
+	user_id = models.IntegerField(null=True, blank=True)
+	op = models.CharField(max_length=6, choices=OP_CHOICES)
+	changed_at = models.DateTimeField(default=timezone.now)
+	# El cursor del feed: se asigna recién cuando el cambio es visible (confirmado), ver web/changefeed.py
+	position = models.BigIntegerField(null=True, blank=True, unique=True, help_text="Posición en el feed, en orden de confirmación")
+
+	class Meta:
+		verbose_name = "Cambio de medición"
+		verbose_name_plural = "Cambios de mediciones"
+		indexes = [
+			models.Index(fields=['user_id', 'position'], name='web_medicionchange_userpos_idx'),
+			# Cambios todavía sin posición: pocos, los busca cada lectura del feed
+			models.Index(fields=['seq'], condition=models.Q(position__isnull=True), name='web_medicionchange_sinpos_idx'),
+		]
+
+	def __str__(self):
+		return f"#{self.seq} {self.op} medición {self.medicion_id}"
+
+
+class EmpresaStats(models.Model):
+	"""Estadísticas acumuladas por empresa, mantenidas en cada alta/validación/baja (ver web/stats.py)"""
+	user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+	total = models.PositiveIntegerField(default=0)
+	validadas = models.PositiveIntegerField(default=0)
+	pendientes = models.PositiveIntegerField(default=0)
+	fuera_de_rango = models.PositiveIntegerField(default=0)
+	value_sum = models.DecimalField(max_digits=18, decimal_places=2, default=0, help_text="Suma de valores (para el promedio)")
+	minimo = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+	maximo = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+	primera_medicion = models.DateTimeField(null=True, blank=True)
+	ultima_medicion = models.DateTimeField(null=True, blank=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	class Meta:
+		verbose_name = "Estadísticas de empresa"
+		verbose_name_plural = "Estadísticas de empresas"
+
+	def __str__(self):
+		return f"Estadísticas de {self.user.username}"
+
+	@property
+	def promedio(self):
+		if not self.total:
+			return None
+		return self.value_sum / self.total
+
+	def as_dict(self):
+		"""Mismas claves que el ``aggregate()`` que reemplaza en el legajo"""
+		return {
+			'total': self.total,
+			'validadas': self.validadas,
+			'pendientes': self.pendientes,
+			'promedio': self.promedio,
+			'minimo': self.minimo,
+			'maximo': self.maximo,
+			'primera_medicion': self.primera_medicion,
+			'ultima_medicion': self.ultima_medicion,
+			'fuera_de_rango': self.fuera_de_rango,
+		}
+
+
+class MedicionBucket(models.Model):
+	"""Agregado materializado de mediciones por empresa y período cerrado (ver web/buckets.py)"""
+	GRANULARITY_CHOICES = [
+		('hour', 'Hora'),
+		('day', 'Día'),
+		('week', 'Semana'),
+		('month', 'Mes'),
+	]
+
+	granularity = models.CharField(max_length=5, choices=GRANULARITY_CHOICES)
+	user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="buckets")
+	start = models.DateTimeField(help_text="Inicio del período (hora local truncada)")
+	count = models.PositiveIntegerField()
+	value_sum = models.DecimalField(max_digits=18, decimal_places=2)
+	minimo = models.DecimalField(max_digits=10, decimal_places=2)
+	maximo = models.DecimalField(max_digits=10, decimal_places=2)
+	first_at = models.DateTimeField()
+	first_value = models.DecimalField(max_digits=10, decimal_places=2)
+	last_at = models.DateTimeField()
+	last_value = models.DecimalField(max_digits=10, decimal_places=2)
+	consumo = models.DecimalField(max_digits=18, decimal_places=2, default=0, help_text="Consumo de las lecturas validadas del período (suma de delta_value)")
+
+	class Meta:
+		verbose_name = "Agregado de mediciones"
+		verbose_name_plural = "Agregados de mediciones"
+		constraints = [
+			models.UniqueConstraint(fields=['granularity', 'user', 'start'], name='web_medicionbucket_uniq'),
+		]
+		indexes = [
+			models.Index(fields=['granularity', 'start'], name='web_medicionbucket_start_idx'),
+		]
+
+	def __str__(self):
+		return f"{self.user_id} {self.granularity} {self.start:%Y-%m-%d %H:%M}: {self.count}"
+
+
+class BucketWatermark(models.Model):
+	"""Hasta dónde están materializados los períodos cerrados de cada granularidad"""
+	granularity = models.CharField(max_length=5, primary_key=True)
+	closed_until = models.DateTimeField()
+
+	class Meta:
+		verbose_name = "Marca de agregados"
+		verbose_name_plural = "Marcas de agregados"
+
+	def __str__(self):
+		return f"{self.granularity} hasta {self.closed_until}"
+
+
+class AnomalyScan(models.Model):
+	"""Último análisis de anomalías de cada empresa (para reprocesar solo las que tienen datos nuevos)"""
+	user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="anomaly_scan")
+	last_position = models.BigIntegerField(default=0, help_text="Última posición del feed de cambios incluida en el análisis")
+	flagged = models.PositiveIntegerField(default=0, help_text="Mediciones con alguna anomalía")
+	scanned_at = models.DateTimeField(auto_now=True)
+
+	class Meta:
+		verbose_name = "Análisis de anomalías"
+		verbose_name_plural = "Análisis de anomalías"
+
+	def __str__(self):
+		return f"Anomalías de {self.user.username} (posición {self.last_position})"
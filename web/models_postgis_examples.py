@@ -2,6 +2,9 @@
 EJEMPLOS DE MODELOS CON POSTGIS - NO USAR DIRECTAMENTE
 Este archivo contiene ejemplos de referencia para implementar PostGIS
 en Django (GeoDjango) y SQLAlchemy (GeoAlchemy2).
+
+La implementación real (columna geography generada + índice GiST, activable
+con USE_POSTGIS) está en web/geo.py y no requiere GeoDjango.
 """
 
 # ============================================================================
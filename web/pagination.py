@@ -0,0 +1,162 @@
+"""
+Paginación por cursor (keyset) sobre (timestamp, id).
+
+A diferencia de ``Paginator``, no hace ``COUNT(*)`` ni ``OFFSET``: cada
+página es un rango del índice (user, -timestamp), así que la página 500
+cuesta lo mismo que la primera. Los cursores son opacos (base64 de JSON).
+"""
+import base64
+import binascii
+import json
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+NEXT = "n"
+PREVIOUS = "p"
+
+
+class InvalidCursor(ValueError):
+	pass
+
+
+def encode_cursor(timestamp, pk, direction=NEXT):
+	payload = json.dumps({"t": timestamp.isoformat(), "i": pk, "d": direction}, separators=(",", ":"))
+	return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+	"""Devuelve (timestamp, id, dirección) o lanza ``InvalidCursor``."""
+	try:
+		padded = cursor + "=" * (-len(cursor) % 4)
+		data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+		timestamp = parse_datetime(data["t"])
+		pk = int(data["i"])
+		direction = data.get("d", NEXT)
+	except (binascii.Error, ValueError, KeyError, TypeError):
+		raise InvalidCursor("Cursor inválido")
+	if timestamp is None or direction not in (NEXT, PREVIOUS):
+		raise InvalidCursor("Cursor inválido")
+	return timestamp, pk, direction
+
+
+def approximate_count(queryset, cap=1000):
+	"""
+	Total aproximado sin recorrer toda la tabla.
+
+	Cuenta exacto hasta ``cap`` filas; por encima usa la estimación del
+	planner en PostgreSQL (o devuelve ``cap``).
+
+	Returns:
+		tuple: (total, es_exacto)
+	"""
+	capped = queryset.order_by()[:cap + 1].count()
+	if capped <= cap:
+		return capped, True
+
+	if connection.vendor == "postgresql":
+		sql, params = queryset.order_by().query.sql_with_params()
+		with connection.cursor() as cursor:
+			cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+			plan = cursor.fetchone()[0]
+		if isinstance(plan, str):
+			plan = json.loads(plan)
+		estimate = int(plan[0]["Plan"]["Plan Rows"])
+		return max(estimate, cap + 1), False
+	return cap + 1, False
+
+
+class KeysetPage:
+	def __init__(self, object_list, next_cursor, previous_cursor, total=None, total_is_exact=True):
+		self.object_list = object_list
+		self.next_cursor = next_cursor
+		self.previous_cursor = previous_cursor
+		self.total = total
+		self.total_is_exact = total_is_exact
+
+	def __iter__(self):
+		return iter(self.object_list)
+
+	def __len__(self):
+		return len(self.object_list)
+
+	def __getitem__(self, index):
+		return self.object_list[index]
+
+	@property
+	def has_next(self):
+		return self.next_cursor is not None
+
+	@property
+	def has_previous(self):
+		return self.previous_cursor is not None
+
+	@property
+	def has_other_pages(self):
+		return self.has_next or self.has_previous
+
+
+class KeysetPaginator:
+	"""
+	Paginador por (``timestamp``, ``id``), descendente salvo ``ascending=True``
+	(colas de trabajo: la más antigua primero).
+
+	Funciona con querysets de modelos o de ``.values()``/``.values_list(named=True)``
+	mientras incluyan ``timestamp`` e ``id``.
+	"""
+
+	def __init__(self, queryset, per_page, time_field="timestamp", ascending=False):
+		self.queryset = queryset
+		self.per_page = per_page
+		self.time_field = time_field
+		self.ascending = ascending
+
+	def _key(self, row):
+		if isinstance(row, dict):
+			return row[self.time_field], row["id"]
+		return getattr(row, self.time_field), row.id
+
+	def get_page(self, cursor=None, with_total=False):
+		"""
+		Página a partir de ``cursor`` (None = la primera: la más reciente, o la más
+		antigua con ``ascending``).
+
+		Un cursor inválido devuelve la primera página.
+		"""
+		t = self.time_field
+		direction = NEXT
+		queryset = self.queryset
+		# (comparación, orden) para avanzar y para retroceder
+		forward, backward = ("lt", (f"-{t}", "-id")), ("gt", (t, "id"))
+		if self.ascending:
+			forward, backward = backward, forward
+
+		if cursor:
+			try:
+				timestamp, pk, direction = decode_cursor(cursor)
+			except InvalidCursor:
+				cursor = None
+
+		if cursor:
+			lookup, ordering = forward if direction == NEXT else backward
+			queryset = queryset.filter(Q(**{f"{t}__{lookup}": timestamp}) | Q(**{t: timestamp, f"id__{lookup}": pk}))
+			queryset = queryset.order_by(*ordering)
+		else:
+			queryset = queryset.order_by(*forward[1])
+
+		rows = list(queryset[:self.per_page + 1])
+		has_more = len(rows) > self.per_page
+		rows = rows[:self.per_page]
+
+		if direction == PREVIOUS and cursor:
+			rows.reverse()
+			has_newer, has_older = has_more, True
+		else:
+			has_newer, has_older = bool(cursor), has_more
+
+		next_cursor = encode_cursor(*self._key(rows[-1]), NEXT) if rows and has_older else None
+		previous_cursor = encode_cursor(*self._key(rows[0]), PREVIOUS) if rows and has_newer else None
+
+		total, exact = approximate_count(self.queryset) if with_total else (None, True)
+		return KeysetPage(rows, next_cursor, previous_cursor, total, exact)
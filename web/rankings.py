@@ -0,0 +1,160 @@
+"""
+Rankings entre empresas por período (top-N y percentil de cada una).
+
+El orden y el percentil se calculan en SQL con funciones de ventana
+(``RANK``/``PERCENT_RANK``) sobre los agregados ya materializados:
+``MedicionBucket`` para los períodos cerrados y ``EmpresaStats`` para el
+atraso de lecturas. Solo el período en curso (o uno cerrado que todavía
+no se materializó) se agrega en vivo.
+
+Cada ranking completo se cachea por métrica y período. Los períodos
+cerrados casi no cambian: se guardan por mucho tiempo y se invalidan
+cuando ``web.buckets`` recalcula uno de ellos. El período en curso se
+recalcula al vencer un TTL corto; ``web.singleflight`` evita que varios
+workers lo recalculen a la vez.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, F, Max, Q, Sum, Value, Window
+from django.db.models.functions import Coalesce, PercentRank, Rank
+from django.utils import timezone
+
+from . import singleflight
+from .buckets import SETTLE, next_start, truncate, watermark
+
+METRICS = {
+	'consumo': 'Mayor consumo del período',
+	'lecturas': 'Más lecturas en el período',
+	'atraso': 'Más tiempo sin reportar',
+}
+# Métricas calculadas desde los agregados por período
+PERIOD_METRICS = ('consumo', 'lecturas')
+RANKING_GRANULARITIES = ('day', 'week', 'month')
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+CLOSED_TIMEOUT = 60 * 60 * 24 * 30
+OPEN_TIMEOUT = 60
+
+
+def cache_key(metric, granularity=None, start=None):
+	if metric not in PERIOD_METRICS:
+		return f"ranking:{metric}"
+	return f"ranking:{metric}:{granularity}:{start.isoformat()}"
+
+
+def invalidate_period(granularity, start):
+	"""Descartar los rankings cacheados de un período cerrado que se recalculó."""
+	cache.delete_many([cache_key(metric, granularity, start) for metric in PERIOD_METRICS])
+
+
+def _ranked(queryset, expression, descending=True):
+	"""Anotar posición (1 = primero) y percentil (0-1, 1 = el más alto) con funciones de ventana."""
+	first = expression.desc(nulls_last=True) if descending else expression.asc(nulls_first=True)
+	last = expression.asc(nulls_first=True) if descending else expression.desc(nulls_last=True)
+	return queryset.annotate(
+		posicion=Window(Rank(), order_by=first),
+		percentil=Window(PercentRank(), order_by=last),
+	).order_by('posicion', 'user_id')
+
+
+def _period_rows(metric, granularity, start, materialized):
+	from .models import Medicion, MedicionBucket
+
+	if materialized:
+		queryset = MedicionBucket.objects.filter(granularity=granularity, start=start).annotate(
+			username=F('user__username'),
+			lecturas=F('count'),
+			ultima=F('last_at'),
+		)
+	else:
+		queryset = (
+			Medicion.objects.filter(user__isnull=False, timestamp__gte=start, timestamp__lt=next_start(start, granularity))
+			.order_by()
+			.values('user_id', username=F('user__username'))
+			.annotate(
+				# Mismo criterio que MedicionBucket.consumo: solo lecturas validadas
+				consumo=Coalesce(
+					Sum('delta_value', filter=Q(is_valid=True)), Value(0),
+					output_field=DecimalField(max_digits=18, decimal_places=2),
+				),
+				lecturas=Count('id'),
+				ultima=Max('timestamp'),
+			)
+		)
+	return _ranked(queryset, F(metric)).values('user_id', 'username', 'consumo', 'lecturas', 'ultima', 'posicion', 'percentil')
+
+
+def _lag_rows():
+	# Empresas sin ninguna lectura quedan primeras
+	queryset = User.objects.filter(is_staff=False, is_superuser=False).annotate(
+		user_id=F('id'),
+		ultima=F('stats__ultima_medicion'),
+		lecturas=F('stats__total'),
+	)
+	return _ranked(queryset, F('ultima'), descending=False).values('user_id', 'username', 'lecturas', 'ultima', 'posicion', 'percentil')
+
+
+def _serialize(row):
+	now = timezone.now()
+	ultima = row.get('ultima')
+	return {
+		'user_id': row['user_id'],
+		'username': row['username'],
+		'consumo': float(row['consumo']) if row.get('consumo') is not None else None,
+		'lecturas': row.get('lecturas') or 0,
+		'ultima': ultima.isoformat() if ultima else None,
+		'horas_sin_reportar': round((now - ultima).total_seconds() / 3600, 1) if ultima else None,
+		'posicion': row['posicion'],
+		'percentil': round(row['percentil'] * 100, 1),
+	}
+
+
+def ranking(metric, granularity='month', start=None, limit=DEFAULT_LIMIT):
+	"""
+	Ranking de empresas para ``metric`` en el período que contiene ``start`` (default: el actual).
+
+	Returns:
+		dict: metric, granularity, start, end, closed, total y results (top ``limit``)
+	"""
+	if metric not in METRICS:
+		raise ValueError(f"Métrica inválida: {metric}")
+	if granularity not in RANKING_GRANULARITIES:
+		raise ValueError(f"Granularidad inválida: {granularity}")
+	limit = max(1, min(int(limit), MAX_LIMIT))
+
+	if metric in PERIOD_METRICS:
+		start = truncate(start or timezone.now(), granularity)
+		end = next_start(start, granularity)
+		# Mismo criterio que materialize(): sin consultar la marca en cada lectura de caché
+		closed = end <= truncate(timezone.now() - SETTLE, granularity)
+	else:
+		start = end = None
+		closed = False
+	live = []
+
+	def compute():
+		if metric not in PERIOD_METRICS:
+			return list(_lag_rows())
+		# Un período cerrado que el proceso de fondo todavía no materializó se agrega en vivo
+		materialized = closed and end <= watermark(granularity)
+		if not materialized:
+			live.append(True)
+		return list(_period_rows(metric, granularity, start, materialized))
+
+	key = cache_key(metric, granularity, start)
+	rows = singleflight.get_or_set(key, compute, CLOSED_TIMEOUT if closed else OPEN_TIMEOUT)
+	if closed and live:
+		# Hasta que se materialice no le llegan las invalidaciones de web.buckets: TTL corto
+		singleflight.store(key, rows, OPEN_TIMEOUT)
+
+	return {
+		'metric': metric,
+		'granularity': granularity if metric in PERIOD_METRICS else None,
+		'start': start.isoformat() if start else None,
+		'end': end.isoformat() if end else None,
+		'closed': closed,
+		'total': len(rows),
+		'results': [_serialize(row) for row in rows[:limit]],
+	}
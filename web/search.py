@@ -0,0 +1,169 @@
+"""
+Búsqueda de texto sobre mediciones y empresas.
+
+En PostgreSQL la migración ``0019_search`` crea:
+
+- una columna ``search_vector`` (tsvector, configuración ``spanish``)
+  generada desde ``ubicacion_manual`` (peso A) y ``observation`` (peso B),
+  con índice GIN;
+- índices trigram (``pg_trgm``, GIN) sobre ``auth_user.username``,
+  ``web_empresaperfil.ubicacion`` y ``web_medicion.ubicacion_manual``.
+
+Las palabras se buscan por texto completo (con raíces: "pérdida" encuentra
+"pérdidas") y los nombres de empresa y de pozo también por similitud
+trigram, que tolera errores de tipeo y acelera los ``ILIKE '%...%'``.
+Las columnas no están en los modelos, como las de ``web.geo``; las
+consultas las usan solo si existen, con expresiones que respetan el alias
+de cada tabla (el admin usa la búsqueda como subconsulta, donde
+``auth_user`` pasa a llamarse ``U0``).
+
+En SQLite (desarrollo) todo cae a ``icontains``.
+"""
+from django.db import connection
+from django.db.models import BooleanField, Expression, F, FloatField, Func, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import Coalesce, Greatest
+
+# Debe coincidir con la configuración usada en la migración 0019_search
+SEARCH_CONFIG = "spanish"
+
+_search_column_cache = {}
+
+
+def search_enabled():
+	"""¿Están instaladas la columna ``search_vector`` y ``pg_trgm``?"""
+	if connection.vendor != "postgresql":
+		return False
+	if "enabled" not in _search_column_cache:
+		with connection.cursor() as cursor:
+			cursor.execute(
+				"SELECT 1 FROM information_schema.columns "
+				"WHERE table_name = 'web_medicion' AND column_name = 'search_vector'"
+			)
+			_search_column_cache["enabled"] = cursor.fetchone() is not None
+	return _search_column_cache["enabled"]
+
+
+class _MigrationColumn(Expression):
+	"""
+	Columna de la tabla base creada por la migración y ausente del modelo.
+
+	Como ``Col``, guarda el alias de la tabla y se reetiqueta con la consulta,
+	así que sigue siendo válida dentro de una subconsulta.
+	"""
+
+	def __init__(self, column, alias=None, output_field=None):
+		super().__init__(output_field=output_field or TextField())
+		self.column = column
+		self.alias = alias
+
+	def resolve_expression(self, query=None, allow_joins=True, reuse=None, summarize=False, for_save=False):
+		return _MigrationColumn(self.column, query.get_initial_alias(), self.output_field)
+
+	def relabeled_clone(self, change_map):
+		return _MigrationColumn(self.column, change_map.get(self.alias, self.alias), self.output_field)
+
+	def as_sql(self, compiler, connection):
+		return f"{compiler.quote_name_unless_alias(self.alias)}.{connection.ops.quote_name(self.column)}", []
+
+
+class _TrigramMatch(Func):
+	"""``a % b``: similitud trigram sobre ``pg_trgm.similarity_threshold``."""
+	arg_joiner = " %% "
+	template = "(%(expressions)s)"
+	output_field = BooleanField()
+
+
+class _ILike(Func):
+	arg_joiner = " ILIKE "
+	template = "(%(expressions)s)"
+	output_field = BooleanField()
+
+
+class _TextMatch(Func):
+	"""``tsvector @@ websearch_to_tsquery(texto)``"""
+	arg_joiner = " @@ "
+	template = "(%(expressions)s)"
+	output_field = BooleanField()
+
+
+class _WebSearchQuery(Func):
+	function = "websearch_to_tsquery"
+	template = f"%(function)s('{SEARCH_CONFIG}', %(expressions)s)"
+	output_field = TextField()
+
+
+class _Similarity(Func):
+	function = "similarity"
+	output_field = FloatField()
+
+
+def _like(text):
+	# Comodines literales dentro del texto buscado
+	escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+	return f"%{escaped}%"
+
+
+def _fuzzy(expression, text):
+	"""Similitud trigram o subcadena; ambas usan el índice gin_trgm_ops."""
+	return Q(_TrigramMatch(expression, Value(text))) | Q(_ILike(expression, Value(_like(text))))
+
+
+def _fuzzy_user_ids(text):
+	from django.contrib.auth.models import User
+
+	return User.objects.filter(_fuzzy(F('username'), text)).values('id')
+
+
+def search_mediciones(queryset, text):
+	"""
+	Filtrar mediciones por ``text`` en ubicación, observaciones o nombre de la empresa.
+
+	No cambia el orden del queryset (las vistas paginan por fecha).
+	"""
+	text = (text or "").strip()
+	if not text:
+		return queryset
+	if not search_enabled():
+		return queryset.filter(
+			Q(ubicacion_manual__icontains=text)
+			| Q(observation__icontains=text)
+			| Q(user__username__icontains=text)
+		)
+
+	return queryset.filter(
+		Q(_TextMatch(_MigrationColumn("search_vector"), _WebSearchQuery(Value(text))))
+		| _fuzzy(F('ubicacion_manual'), text)
+		| Q(user_id__in=_fuzzy_user_ids(text))
+	)
+
+
+def search_empresas(queryset, text):
+	"""
+	Filtrar empresas (``User``) por ``text`` en el nombre o en la ubicación del pozo.
+
+	En PostgreSQL anota ``search_similarity`` (0-1) y ordena por ella: primero
+	las más parecidas, así un nombre mal tipeado igual aparece arriba.
+	"""
+	from .models import EmpresaPerfil
+
+	text = (text or "").strip()
+	if not text:
+		return queryset
+	if not search_enabled():
+		return queryset.filter(
+			Q(username__icontains=text) | Q(empresa_perfil__ubicacion__icontains=text)
+		).annotate(search_similarity=Value(None, output_field=FloatField()))
+
+	perfiles = EmpresaPerfil.objects.filter(_fuzzy(F('ubicacion'), text)).values('usuario_id')
+	ubicacion_similarity = Subquery(
+		EmpresaPerfil.objects.filter(usuario_id=OuterRef('pk')).annotate(
+			similarity=_Similarity(F('ubicacion'), Value(text))
+		).values('similarity')[:1],
+		output_field=FloatField(),
+	)
+	return queryset.filter(_fuzzy(F('username'), text) | Q(pk__in=perfiles)).annotate(
+		search_similarity=Greatest(
+			_Similarity(F('username'), Value(text)),
+			Coalesce(ubicacion_similarity, Value(0.0)),
+		),
+	).order_by('-search_similarity', 'username')
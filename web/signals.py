@@ -0,0 +1,75 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import buckets, consumption, dashboard, stats
+from .auth_backends import invalidate_user
+from .changefeed import record_change
+from .models import EmpresaPerfil, Medicion, MedicionChange
+from .spatial_index import invalidate_well_index
+
+
+def _invalidate_dashboard(*user_ids):
+	"""Invalidar al confirmar: antes, otra petición volvería a cachear los datos viejos con la versión nueva"""
+	transaction.on_commit(lambda: dashboard.invalidate(*user_ids))
+
+
+@receiver(post_save, sender=EmpresaPerfil)
+@receiver(post_delete, sender=EmpresaPerfil)
+def empresa_perfil_changed(sender, instance, **kwargs):
+	"""Reconstruir el índice de pozos cuando cambian las coordenadas de un perfil"""
+	_invalidate_dashboard(instance.usuario_id)
+	update_fields = kwargs.get("update_fields")
+	if update_fields is not None and not {"latitude", "longitude"} & set(update_fields):
+		return
+	transaction.on_commit(invalidate_well_index)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+	"""El dashboard muestra el nombre de usuario de cada medición"""
+	invalidate_user(instance.pk)
+	update_fields = kwargs.get("update_fields")
+	if update_fields is not None and set(update_fields) <= {"last_login"}:
+		# login() guarda solo last_login: no cambia nada visible
+		return
+	_invalidate_dashboard(instance.pk)
+
+
+@receiver(pre_save, sender=Medicion)
+def medicion_before_save(sender, instance, **kwargs):
+	"""Guardar el estado previo para actualizar las estadísticas de la empresa"""
+	instance._stats_previous = None
+	if not instance._state.adding and instance.pk:
+		previous = Medicion.objects.filter(pk=instance.pk).values(*stats.TRACKED_FIELDS).first()
+		if previous and previous['user_id'] is not None:
+			instance._stats_previous = previous
+
+
+@receiver(post_save, sender=Medicion)
+def medicion_saved(sender, instance, created, **kwargs):
+	"""Registrar altas y modificaciones en el feed de cambios y en las estadísticas"""
+	record_change(instance, MedicionChange.OP_INSERT if created else MedicionChange.OP_UPDATE)
+	previous = getattr(instance, '_stats_previous', None)
+	_invalidate_dashboard(instance.user_id, previous and previous['user_id'])
+	current = stats.snapshot(instance)
+	stats.apply_change(previous, current)
+	if previous:
+		# Las altas caen en el período abierto; solo las modificaciones tocan períodos cerrados
+		buckets.apply_change(previous, current)
+	if current and consumption.apply_change(previous, current, instance.pk):
+		# Evitar que un save() posterior de esta instancia pise el consumo calculado
+		instance.refresh_from_db(fields=consumption.DERIVED_FIELDS)
+
+
+@receiver(post_delete, sender=Medicion)
+def medicion_deleted(sender, instance, **kwargs):
+	"""Registrar la baja (tombstone) en el feed de cambios y en las estadísticas"""
+	record_change(instance, MedicionChange.OP_DELETE)
+	_invalidate_dashboard(instance.user_id)
+	previous = stats.snapshot(instance)
+	stats.apply_change(previous, None)
+	buckets.apply_change(previous, None)
+	consumption.apply_change(previous, None, instance.pk)
@@ -0,0 +1,155 @@
+"""
+Recalcular cada entrada de caché una sola vez aunque muchos la pidan a la vez.
+
+Cuando vence (o se invalida) una entrada cara, todos los workers que la
+piden en ese momento repetirían la misma consulta. ``get_or_set`` deja
+que solo uno la recalcule:
+
+- El que recalcula toma un lock por clave: primero uno local del proceso
+  (coalesce los hilos del mismo worker) y después el lock de Redis
+  (``cache.lock`` de django_redis) para el resto de los workers. Si la
+  caché no tiene locks (locmem en desarrollo) o Redis falla, alcanza con
+  el lock local.
+- Los demás devuelven la copia vencida si todavía existe o esperan un
+  momento a que aparezca el valor nuevo. Si no aparece, lo calculan ellos.
+- Expiración temprana probabilística (XFetch): cada lectura puede decidir
+  recalcular antes de que venza, con más probabilidad cuanto más cerca del
+  vencimiento y cuanto más caro fue el cálculo. Así los refrescos se
+  reparten en el tiempo en lugar de concentrarse en el instante del TTL.
+
+Las entradas se guardan como ``(valor, duración del cálculo, vencimiento)``
+y quedan en la caché el doble del TTL para poder servirse vencidas.
+"""
+import logging
+import math
+import random
+import threading
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+LOCK_PREFIX = "lock:"
+# Si el proceso que tiene el lock muere, se libera solo
+LOCK_TIMEOUT = 30
+# Cuánto espera un pedido sin copia vencida antes de calcular por su cuenta
+WAIT_TIMEOUT = 2.0
+POLL_INTERVAL = 0.05
+# >1 refresca antes, <1 más cerca del vencimiento
+BETA = 1.0
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def _local_lock(key):
+	with _local_locks_guard:
+		lock = _local_locks.get(key)
+		if lock is None:
+			lock = _local_locks[key] = threading.Lock()
+		return lock
+
+
+def _release_local(key, lock):
+	with _local_locks_guard:
+		# Las claves versionadas no se repiten: no acumular un lock por cada una
+		if _local_locks.get(key) is lock:
+			del _local_locks[key]
+	lock.release()
+
+
+def _acquire(key):
+	"""Tomar el lock de ``key`` sin bloquear; devuelve la función para liberarlo o None."""
+	local = _local_lock(key)
+	if not local.acquire(blocking=False):
+		return None
+
+	def release_local():
+		_release_local(key, local)
+
+	factory = getattr(cache, "lock", None)
+	if factory is None:
+		return release_local
+	try:
+		distributed = factory(LOCK_PREFIX + key, timeout=LOCK_TIMEOUT)
+		acquired = distributed.acquire(blocking=False)
+	except Exception:
+		logger.warning("Lock distribuido no disponible para %s; se usa solo el local", key, exc_info=True)
+		return release_local
+	if not acquired:
+		release_local()
+		return None
+
+	def release():
+		try:
+			distributed.release()
+		except Exception:
+			# Venció el LOCK_TIMEOUT mientras se calculaba: ya lo tiene otro
+			logger.warning("No se pudo liberar el lock de %s", key, exc_info=True)
+		finally:
+			release_local()
+
+	return release
+
+
+def _should_refresh(entry, beta):
+	_, delta, expires_at = entry
+	# XFetch: -log(U) es exponencial, así que a veces adelanta el refresco unos segundos
+	return time.time() - delta * beta * math.log(random.random() or 1e-12) >= expires_at
+
+
+def store(key, value, timeout, delta=0.0):
+	"""Guardar ``value`` como entrada de ``get_or_set`` (``delta``: segundos que costó calcularlo)."""
+	cache.set(key, (value, delta, time.time() + timeout), timeout * 2)
+
+
+def _compute_and_store(key, compute, timeout):
+	started = time.monotonic()
+	value = compute()
+	store(key, value, timeout, time.monotonic() - started)
+	return value
+
+
+def _wait_for(key):
+	deadline = time.monotonic() + WAIT_TIMEOUT
+	while time.monotonic() < deadline:
+		time.sleep(POLL_INTERVAL)
+		entry = cache.get(key)
+		if entry is not None:
+			return entry
+	return None
+
+
+def get_or_set(key, compute, timeout, beta=BETA):
+	"""
+	Valor cacheado de ``key``; si falta o está por vencer, ``compute()`` lo recalcula una sola vez.
+
+	Args:
+		key: clave de caché
+		compute: función sin argumentos que devuelve el valor (puede ser None)
+		timeout: segundos de validez del valor
+		beta: agresividad de la expiración temprana (0 la desactiva)
+	"""
+	entry = cache.get(key)
+	if entry is not None and not _should_refresh(entry, beta):
+		return entry[0]
+
+	release = _acquire(key)
+	if release is None:
+		# Otro está recalculando
+		if entry is not None:
+			return entry[0]
+		entry = _wait_for(key)
+		if entry is not None:
+			return entry[0]
+		return _compute_and_store(key, compute, timeout)
+
+	try:
+		current = cache.get(key)
+		if current is not None and (entry is None or current[2] != entry[2]) and current[2] > time.time():
+			# Otro terminó de recalcular entre la lectura y el lock
+			return current[0]
+		return _compute_and_store(key, compute, timeout)
+	finally:
+		release()
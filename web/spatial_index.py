@@ -0,0 +1,185 @@
+"""
+Índice espacial en memoria de los pozos (coordenadas de EmpresaPerfil).
+
+KD-tree sobre vectores unitarios 3D: la distancia euclídea (cuerda) es
+monótona con la distancia sobre la esfera, así que el vecino más cercano
+por cuerda es el más cercano en metros. Cada proceso mantiene su copia y
+la reconstruye cuando cambia la versión global (guardada en la caché y
+aumentada por las señales de EmpresaPerfil).
+"""
+import math
+import threading
+import time
+
+import numpy as np
+from django.core.cache import cache
+
+from .geo import EARTH_RADIUS_M
+
+VERSION_CACHE_KEY = "well_index_version"
+# Cada cuánto (segundos) se consulta la versión global en la caché compartida
+VERSION_CHECK_INTERVAL = 30
+
+_LEAF_SIZE = 8
+
+
+def _to_unit_vectors(latitudes, longitudes):
+	lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+	lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+	cos_lat = np.cos(lat)
+	return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def _chord_to_meters(chord):
+	return 2.0 * EARTH_RADIUS_M * math.asin(min(1.0, chord / 2.0))
+
+
+class WellIndex:
+	"""KD-tree inmutable sobre (perfil_id, usuario_id, lat, lon)."""
+
+	def __init__(self, perfil_ids, usuario_ids, latitudes, longitudes):
+		self.perfil_ids = np.asarray(perfil_ids, dtype=np.int64)
+		self.usuario_ids = np.asarray(usuario_ids, dtype=np.int64)
+		self.points = _to_unit_vectors(latitudes, longitudes)
+		# Nodos: (inicio, fin, eje, valor de corte, hijo izq, hijo der)
+		self._order = np.arange(len(self.perfil_ids))
+		self._nodes = []
+		if len(self.perfil_ids):
+			self._build(0, len(self._order))
+		self._points_sorted = [tuple(p) for p in self.points[self._order]]
+
+	def __len__(self):
+		return len(self.perfil_ids)
+
+	def _build(self, start, end):
+		node_id = len(self._nodes)
+		self._nodes.append(None)
+
+		if end - start <= _LEAF_SIZE:
+			self._nodes[node_id] = (start, end, -1, 0.0, -1, -1)
+			return node_id
+
+		segment = self._order[start:end]
+		coords = self.points[segment]
+		axis = int(np.argmax(coords.max(axis=0) - coords.min(axis=0)))
+		sorted_segment = segment[np.argsort(coords[:, axis], kind="stable")]
+		self._order[start:end] = sorted_segment
+		mid = start + (end - start) // 2
+		split = float(self.points[self._order[mid], axis])
+
+		left = self._build(start, mid)
+		right = self._build(mid, end)
+		self._nodes[node_id] = (start, end, axis, split, left, right)
+		return node_id
+
+	def nearest(self, latitude, longitude):
+		"""
+		Pozo más cercano al punto.
+
+		Returns:
+			tuple: (perfil_id, usuario_id, distancia_m) o None si el índice está vacío
+		"""
+		if not self._nodes:
+			return None
+
+		lat = math.radians(latitude)
+		lon = math.radians(longitude)
+		query = (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+		best_sq = math.inf
+		best_pos = -1
+		# (nodo, cota inferior de la distancia² al punto)
+		stack = [(0, 0.0)]
+		while stack:
+			node_id, bound_sq = stack.pop()
+			if bound_sq >= best_sq:
+				continue
+			start, end, axis, split, left, right = self._nodes[node_id]
+			if axis < 0:
+				for pos in range(start, end):
+					px, py, pz = self._points_sorted[pos]
+					dist_sq = (px - query[0]) ** 2 + (py - query[1]) ** 2 + (pz - query[2]) ** 2
+					if dist_sq < best_sq:
+						best_sq = dist_sq
+						best_pos = pos
+				continue
+
+			diff = query[axis] - split
+			near, far = (left, right) if diff < 0 else (right, left)
+			# Visitar primero el lado cercano (se apila último)
+			stack.append((far, diff * diff))
+			stack.append((near, 0.0))
+
+		index = self._order[best_pos]
+		return (
+			int(self.perfil_ids[index]),
+			int(self.usuario_ids[index]),
+			_chord_to_meters(math.sqrt(best_sq)),
+		)
+
+	@classmethod
+	def from_database(cls):
+		from .models import EmpresaPerfil
+
+		rows = list(
+			EmpresaPerfil.objects.filter(latitude__isnull=False, longitude__isnull=False)
+			.values_list("id", "usuario_id", "latitude", "longitude")
+		)
+		return cls(
+			[row[0] for row in rows],
+			[row[1] for row in rows],
+			[float(row[2]) for row in rows],
+			[float(row[3]) for row in rows],
+		)
+
+
+_lock = threading.Lock()
+_state = {"index": None, "version": None, "checked_at": 0.0}
+
+
+def _global_version():
+	version = cache.get(VERSION_CACHE_KEY)
+	if version is None:
+		# Arrancar desde el reloj (como web.dashboard): si la versión se perdió, un
+		# worker con un índice viejo no debe reconocer el número nuevo como propio
+		cache.add(VERSION_CACHE_KEY, time.time_ns(), None)
+		version = cache.get(VERSION_CACHE_KEY)
+	return version
+
+
+def get_well_index():
+	"""Índice del proceso, reconstruido si otro worker invalidó la versión."""
+	now = time.monotonic()
+	index = _state["index"]
+	if index is not None and now - _state["checked_at"] < VERSION_CHECK_INTERVAL:
+		return index
+
+	version = _global_version()
+	with _lock:
+		if _state["index"] is None or _state["version"] != version:
+			_state["index"] = WellIndex.from_database()
+			_state["version"] = version
+		_state["checked_at"] = now
+		return _state["index"]
+
+
+def invalidate_well_index():
+	"""
+	Forzar reconstrucción en este proceso y en los demás workers.
+
+	Llamar después del commit (``transaction.on_commit``): una reconstrucción
+	anterior leería los perfiles viejos y quedaría con la versión nueva.
+	"""
+	try:
+		cache.incr(VERSION_CACHE_KEY)
+	except ValueError:
+		cache.add(VERSION_CACHE_KEY, time.time_ns(), None)
+	with _lock:
+		_state["index"] = None
+
+
+def nearest_well(latitude, longitude):
+	"""(perfil_id, usuario_id, distancia_m) del pozo más cercano, o None."""
+	if latitude is None or longitude is None:
+		return None
+	return get_well_index().nearest(float(latitude), float(longitude))
@@ -127,7 +127,9 @@ async function sendToServer(formData) {
         
         if (!response.ok) {
             console.log('Server returned HTTP error!');
-            throw new Error(`HTTP error! status: ${response.status}`);
+            const error = new Error(`HTTP error! status: ${response.status}`);
+            error.status = response.status;
+            throw error;
         }
         
         // Intentar parsear como JSON
@@ -401,11 +403,20 @@ async function handleFormSubmit(event, form) {
             console.error('Upload failed:', error);
             
             // If server fails but we're "online", queue it anyway
-            showNotification(
-                'Error de servidor',
-                'Se guardará en cola para reintentar',
-                'warning'
-            );
+            if (error.status === 503) {
+                // Base de datos en mantenimiento: se reintenta sola con la cola offline
+                showNotification(
+                    'Servidor en mantenimiento',
+                    'La medición quedó guardada en el dispositivo y se enviará automáticamente',
+                    'info'
+                );
+            } else {
+                showNotification(
+                    'Error de servidor',
+                    'Se guardará en cola para reintentar',
+                    'warning'
+                );
+            }
             
             await addToQueue(formData, fileBlob);
             await updatePendingBadge();
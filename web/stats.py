@@ -0,0 +1,196 @@
+"""
+Estadísticas por empresa mantenidas de forma incremental.
+
+Las vistas de staff leen ``EmpresaStats`` (una fila por empresa) en lugar
+de agregar todo el historial en cada visita. Las señales de ``Medicion``
+aplican cada alta, modificación o baja con actualizaciones ``F()`` dentro
+de la misma transacción. Mínimo, máximo, primera y última medición solo
+se recalculan cuando se quita la fila que tenía ese extremo.
+
+``manage.py reconciliar_estadisticas`` reconstruye la tabla desde cero.
+"""
+from django.db import transaction
+from django.db.models import Count, DecimalField, DateTimeField, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+
+# Campos de la medición que afectan a las estadísticas
+TRACKED_FIELDS = ('user_id', 'value', 'is_valid', 'is_out_of_range', 'timestamp')
+
+
+def snapshot(medicion):
+	"""Estado relevante de una medición (o None si no pertenece a un usuario)."""
+	if medicion is None or medicion.user_id is None:
+		return None
+	return {field: getattr(medicion, field) for field in TRACKED_FIELDS}
+
+
+def _counters(row, sign):
+	return {
+		'total': F('total') + sign,
+		'validadas': F('validadas') + (sign if row['is_valid'] else 0),
+		'pendientes': F('pendientes') + (0 if row['is_valid'] else sign),
+		'fuera_de_rango': F('fuera_de_rango') + (sign if row['is_out_of_range'] else 0),
+	}
+
+
+def _add(row):
+	from .models import EmpresaStats
+
+	EmpresaStats.objects.get_or_create(user_id=row['user_id'])
+	value = Value(row['value'], output_field=DecimalField(max_digits=10, decimal_places=2))
+	timestamp = Value(row['timestamp'], output_field=DateTimeField())
+	EmpresaStats.objects.filter(user_id=row['user_id']).update(
+		**_counters(row, 1),
+		value_sum=F('value_sum') + value,
+		minimo=Least(Coalesce(F('minimo'), value), value),
+		maximo=Greatest(Coalesce(F('maximo'), value), value),
+		primera_medicion=Least(Coalesce(F('primera_medicion'), timestamp), timestamp),
+		ultima_medicion=Greatest(Coalesce(F('ultima_medicion'), timestamp), timestamp),
+	)
+
+
+def _remove(row):
+	"""Descontar una medición; devuelve True si tenía algún extremo."""
+	from .models import EmpresaStats
+
+	stats = EmpresaStats.objects.filter(user_id=row['user_id']).values('minimo', 'maximo', 'primera_medicion', 'ultima_medicion').first()
+	if stats is None:
+		return False
+	EmpresaStats.objects.filter(user_id=row['user_id']).update(
+		**_counters(row, -1),
+		value_sum=F('value_sum') - Value(row['value'], output_field=DecimalField(max_digits=10, decimal_places=2)),
+	)
+	return row['value'] in (stats['minimo'], stats['maximo']) or row['timestamp'] in (stats['primera_medicion'], stats['ultima_medicion'])
+
+
+def _recompute_extremes(user_id):
+	from .models import EmpresaStats, Medicion
+
+	extremes = Medicion.objects.filter(user_id=user_id).aggregate(
+		minimo=Min('value'),
+		maximo=Max('value'),
+		primera_medicion=Min('timestamp'),
+		ultima_medicion=Max('timestamp'),
+	)
+	EmpresaStats.objects.filter(user_id=user_id).update(**extremes)
+
+
+def apply_change(old, new):
+	"""
+	Aplicar a las estadísticas el paso de ``old`` a ``new`` (snapshots o None).
+
+	Alta: (None, new). Baja: (old, None). Modificación: (old, new).
+	"""
+	if old == new:
+		return
+	with transaction.atomic():
+		if old and new and all(old[f] == new[f] for f in ('user_id', 'value', 'timestamp')):
+			# Validación u otra bandera: solo contadores
+			from .models import EmpresaStats
+
+			delta = {}
+			if old['is_valid'] != new['is_valid']:
+				step = 1 if new['is_valid'] else -1
+				delta['validadas'] = F('validadas') + step
+				delta['pendientes'] = F('pendientes') - step
+			if old['is_out_of_range'] != new['is_out_of_range']:
+				delta['fuera_de_rango'] = F('fuera_de_rango') + (1 if new['is_out_of_range'] else -1)
+			if delta:
+				EmpresaStats.objects.filter(user_id=new['user_id']).update(**delta)
+			return
+
+		stale = old and _remove(old)
+		if new:
+			_add(new)
+		if stale:
+			_recompute_extremes(old['user_id'])
+
+
+def refresh_out_of_range(medicion_ids):
+	"""Recontar ``fuera_de_rango`` de las empresas afectadas por un ``bulk_update``."""
+	from .models import EmpresaStats, Medicion
+
+	user_ids = set(Medicion.objects.filter(id__in=list(medicion_ids), user__isnull=False).values_list('user_id', flat=True).distinct())
+	for user_id in user_ids:
+		count = Medicion.objects.filter(user_id=user_id, is_out_of_range=True).count()
+		EmpresaStats.objects.filter(user_id=user_id).update(fuera_de_rango=count)
+
+
+def compute_stats(user_ids=None):
+	"""Estadísticas calculadas desde cero: {user_id: dict} en una sola consulta agrupada."""
+	from .models import Medicion
+
+	queryset = Medicion.objects.filter(user__isnull=False)
+	if user_ids is not None:
+		queryset = queryset.filter(user_id__in=list(user_ids))
+	rows = queryset.order_by().values('user_id').annotate(
+		total=Count('id'),
+		validadas=Count('id', filter=Q(is_valid=True)),
+		pendientes=Count('id', filter=Q(is_valid=False)),
+		fuera_de_rango=Count('id', filter=Q(is_out_of_range=True)),
+		value_sum=Sum('value'),
+		minimo=Min('value'),
+		maximo=Max('value'),
+		primera_medicion=Min('timestamp'),
+		ultima_medicion=Max('timestamp'),
+	)
+	return {row.pop('user_id'): row for row in rows}
+
+
+def rebuild_stats(user_ids=None):
+	"""
+	Reconstruir ``EmpresaStats`` (todas o solo ``user_ids``).
+
+	Returns:
+		int: filas escritas
+	"""
+	from .models import EmpresaStats
+
+	computed = compute_stats(user_ids)
+	objects = [EmpresaStats(user_id=user_id, **values) for user_id, values in computed.items()]
+	with transaction.atomic():
+		stale = EmpresaStats.objects.exclude(user_id__in=list(computed))
+		if user_ids is not None:
+			stale = stale.filter(user_id__in=list(user_ids))
+		stale.delete()
+		EmpresaStats.objects.bulk_create(
+			objects,
+			batch_size=1000,
+			update_conflicts=True,
+			unique_fields=['user'],
+			update_fields=['total', 'validadas', 'pendientes', 'fuera_de_rango', 'value_sum', 'minimo', 'maximo', 'primera_medicion', 'ultima_medicion'],
+		)
+	return len(objects)
+
+
+OVERVIEW_TIMEOUT = 60 * 10
+
+
+def company_queryset():
+	"""Empresas (usuarios no staff) con total de mediciones y última lectura desde ``EmpresaStats``."""
+	from django.contrib.auth.models import User
+
+	# Lee la tabla EmpresaStats (un join 1:1) en lugar de agregar todas las mediciones
+	return User.objects.filter(
+		is_staff=False,
+		is_superuser=False
+	).select_related('empresa_perfil').annotate(
+		total_mediciones=Coalesce(F('stats__total'), 0),
+		latest_measurement=F('stats__ultima_medicion')
+	).order_by('-latest_measurement')
+
+
+def company_overview():
+	"""
+	``company_queryset`` completo, para la lista de staff.
+
+	Cacheada con la versión de staff del dashboard (cambia con cada medición, usuario
+	o perfil) y con última copia buena si la base no responde (ver ``web.degraded``).
+
+	Returns:
+		tuple: (lista de ``User`` anotados, fecha de la copia vieja o None)
+	"""
+	from . import dashboard, degraded
+
+	version = dashboard.data_version(dashboard.STAFF_SCOPE)
+	return degraded.read(f"empresas:{version}", lambda: list(company_queryset()), OVERVIEW_TIMEOUT, "empresas")
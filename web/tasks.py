@@ -0,0 +1,59 @@
+"""
+Ejecución de tareas en segundo plano dentro del proceso.
+
+Las tareas se encolan al confirmar la transacción y se ejecutan en un
+pool de hilos propio de cada worker, para que las vistas no esperen a
+servicios externos. Con ``BACKGROUND_TASKS_EAGER=True`` (tests) se
+ejecutan en línea.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+	global _executor
+	if _executor is None:
+		with _executor_lock:
+			if _executor is None:
+				_executor = ThreadPoolExecutor(
+					max_workers=getattr(settings, "BACKGROUND_TASK_WORKERS", 2),
+					thread_name_prefix="web-task",
+				)
+	return _executor
+
+
+def _call(func, args, kwargs):
+	try:
+		return func(*args, **kwargs)
+	except Exception:
+		logger.exception("Error en tarea en segundo plano", extra={"task": getattr(func, "__name__", repr(func))})
+
+
+def _run_in_thread(func, args, kwargs):
+	# Cada hilo usa su propia conexión: cerrarla si quedó obsoleta
+	close_old_connections()
+	try:
+		return _call(func, args, kwargs)
+	finally:
+		close_old_connections()
+
+
+def run_in_background(func, *args, **kwargs):
+	"""Ejecutar ``func`` ya mismo en el pool (o en línea si es modo eager)."""
+	if getattr(settings, "BACKGROUND_TASKS_EAGER", False):
+		return _call(func, args, kwargs)
+	return _get_executor().submit(_run_in_thread, func, args, kwargs)
+
+
+def enqueue(func, *args, **kwargs):
+	"""Encolar ``func`` para cuando se confirme la transacción actual."""
+	transaction.on_commit(lambda: run_in_background(func, *args, **kwargs))
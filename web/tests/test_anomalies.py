@@ -0,0 +1,90 @@
+from datetime import timedelta
+from io import StringIO
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from web.anomalies import detect, run_scan
+from web.models import AnomalyScan, Medicion, MedicionChange
+
+
+class DetectTests(TestCase):
+	def test_flags_each_anomaly_type(self):
+		hours = np.arange(60, dtype=np.float64) * 24
+		values = np.arange(60, dtype=np.float64) * 10
+		values[20:] += 400            # pico de consumo en la lectura 20
+		values[30] = values[29] - 50  # retroceso
+		values[40:44] = values[39]    # medidor sin cambios
+		values[44:] -= 40
+		hours[50:] += 24 * 10         # hueco de reporte antes de la lectura 50
+
+		flags, score = detect(hours * 3600, values)
+
+		self.assertTrue(flags[20] & Medicion.ANOMALIA_PICO)
+		self.assertTrue(flags[30] & Medicion.ANOMALIA_RETROCESO)
+		# Tercera lectura idéntica seguida (39, 40, 41)
+		self.assertFalse(flags[40] & Medicion.ANOMALIA_SIN_CAMBIO)
+		self.assertTrue(flags[41] & Medicion.ANOMALIA_SIN_CAMBIO)
+		self.assertTrue(flags[50] & Medicion.ANOMALIA_HUECO)
+		self.assertEqual(flags[5], 0)
+		self.assertTrue(np.isnan(score[5]))
+		self.assertGreaterEqual(score[20], 1)
+
+
+class AnomalyScanTests(TestCase):
+	def setUp(self):
+		self.empresa = User.objects.create_user(username="empresa", password="test1234")
+		self.staff = User.objects.create_user(username="admin", password="test1234", is_staff=True)
+		base = timezone.now() - timedelta(days=30)
+		for day, value in enumerate([10, 20, 30, 25, 35, 45]):
+			medicion = Medicion.objects.create(user=self.empresa, value=value)
+			Medicion.objects.filter(pk=medicion.pk).update(timestamp=base + timedelta(days=day))
+		self.retroceso = Medicion.objects.get(user=self.empresa, value=25)
+
+	def test_scan_writes_flags_and_skips_unchanged_companies(self):
+		self.assertEqual(run_scan(), {self.empresa.id: (1, 1)})
+		self.retroceso.refresh_from_db()
+		self.assertEqual(self.retroceso.anomaly_flags, Medicion.ANOMALIA_RETROCESO)
+		self.assertEqual(AnomalyScan.objects.get(user=self.empresa).flagged, 1)
+
+		# Sin cambios en el feed no se vuelve a procesar
+		self.assertEqual(run_scan(), {})
+
+		Medicion.objects.create(user=self.empresa, value=50)
+		self.assertIn(self.empresa.id, run_scan())
+
+	def test_late_commit_with_lower_seq_triggers_a_new_scan(self):
+		# El primer cambio todavía no estaba confirmado durante el análisis
+		tardio = MedicionChange.objects.order_by("seq").first()
+		tardio.delete()
+		run_scan()
+
+		MedicionChange.objects.create(seq=tardio.seq, medicion_id=tardio.medicion_id, user_id=tardio.user_id, op=tardio.op)
+		self.assertIn(self.empresa.id, run_scan())
+
+	def test_review_queue_filters_and_review(self):
+		out = StringIO()
+		call_command("detectar_anomalias", stdout=out)
+		self.assertIn("1 empresas analizadas", out.getvalue())
+		self.client.login(username="admin", password="test1234")
+
+		response = self.client.get(reverse("admin_anomalias"), {"tipo": Medicion.ANOMALIA_RETROCESO})
+		self.assertEqual([m.id for m in response.context["mediciones"]], [self.retroceso.id])
+		response = self.client.get(reverse("admin_anomalias"), {"tipo": Medicion.ANOMALIA_HUECO})
+		self.assertEqual(list(response.context["mediciones"]), [])
+
+		response = self.client.post(reverse("admin_revisar_anomalia", args=[self.retroceso.id]))
+		self.assertRedirects(response, reverse("admin_anomalias"))
+		response = self.client.get(reverse("admin_anomalias"))
+		self.assertEqual(list(response.context["mediciones"]), [])
+		response = self.client.get(reverse("admin_anomalias"), {"estado": "revisadas"})
+		self.assertEqual(len(response.context["mediciones"].object_list), 1)
+
+		# Un nuevo análisis con las mismas banderas no la devuelve a la cola
+		run_scan([self.empresa.id])
+		self.retroceso.refresh_from_db()
+		self.assertTrue(self.retroceso.anomaly_reviewed)
@@ -0,0 +1,84 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from web.buckets import bucket_stats, materialize, refresh_bucket, truncate
+from web.models import BucketWatermark, MedicionBucket, Medicion
+
+
+class BucketStatsTests(TestCase):
+	def setUp(self):
+		self.empresa = User.objects.create_user(username="empresa", password="test1234")
+		self.otra = User.objects.create_user(username="otra", password="test1234")
+		self.staff = User.objects.create_user(username="admin", password="test1234", is_staff=True)
+		self.hoy = truncate(timezone.now(), "day")
+		# Dos días atrás: cerrado aunque se corra justo después de medianoche
+		self.ayer = self.hoy - timedelta(days=2)
+		self.mediciones = {}
+		for usuario, offset_h, valor in [
+			(self.empresa, 1, 10), (self.empresa, 5, 30), (self.otra, 3, 50),
+		]:
+			medicion = Medicion.objects.create(user=usuario, value=valor)
+			Medicion.objects.filter(pk=medicion.pk).update(timestamp=self.ayer + timedelta(hours=offset_h))
+			self.mediciones[(usuario.username, valor)] = medicion.pk
+		# Una medición en el período abierto (hoy)
+		Medicion.objects.create(user=self.empresa, value=20)
+
+	def test_closed_buckets_are_materialized_and_open_is_live(self):
+		materialize("day")
+		self.assertEqual(MedicionBucket.objects.filter(granularity="day").count(), 2)
+
+		filas = bucket_stats("day", user_id=self.empresa.id, start=self.ayer)
+		self.assertEqual([f["start"] for f in filas], [self.ayer, self.hoy])
+		ayer = filas[0]
+		self.assertEqual((ayer["count"], ayer["avg"], ayer["minimo"], ayer["maximo"]), (2, Decimal("20"), Decimal("10"), Decimal("30")))
+		self.assertEqual((ayer["first_value"], ayer["last_value"]), (Decimal("10"), Decimal("30")))
+		self.assertEqual(filas[1]["count"], 1)
+		self.assertFalse(MedicionBucket.objects.filter(start=self.hoy).exists())
+
+		# Todas las empresas: ayer combina ambas
+		total = bucket_stats("day", start=self.ayer)
+		self.assertEqual((total[0]["count"], total[0]["maximo"], total[0]["last_value"]), (3, Decimal("50"), Decimal("30")))
+
+	def test_reads_never_materialize(self):
+		# Sin marca: todo en vivo y nada escrito
+		filas = bucket_stats("day", user_id=self.empresa.id, start=self.ayer)
+		self.assertEqual([f["count"] for f in filas], [2, 1])
+		self.assertFalse(MedicionBucket.objects.exists())
+		self.assertFalse(BucketWatermark.objects.exists())
+
+		materialize("day")
+		self.assertEqual(bucket_stats("day", user_id=self.empresa.id, start=self.ayer), filas)
+
+	def test_edit_in_closed_bucket_refreshes_only_that_bucket(self):
+		materialize("day")
+		medicion = Medicion.objects.get(pk=self.mediciones[("empresa", 30)])
+		medicion.value = Decimal("40")
+		medicion.save()
+		bucket = MedicionBucket.objects.get(granularity="day", user=self.empresa, start=self.ayer)
+		self.assertEqual((bucket.maximo, bucket.value_sum), (Decimal("40"), Decimal("50")))
+
+		Medicion.objects.get(pk=self.mediciones[("otra", 50)]).delete()
+		self.assertFalse(MedicionBucket.objects.filter(user=self.otra).exists())
+
+	def test_refresh_waits_for_the_watermark_lock(self):
+		materialize("day")
+		with mock.patch.object(QuerySet, "select_for_update", autospec=True, side_effect=lambda qs, **kwargs: qs) as bloqueo:
+			refresh_bucket(self.empresa.id, self.ayer + timedelta(hours=1))
+		# Bloqueante: sin skip_locked, espera a que materialize() confirme la marca nueva
+		self.assertEqual([c.kwargs for c in bloqueo.call_args_list], [{}])
+
+	def test_api_scopes_operarios(self):
+		self.client.login(username="empresa", password="test1234")
+		data = self.client.get(reverse("api_consumo"), {"granularity": "day", "user": self.otra.id}).json()
+		self.assertEqual(data["user"], self.empresa.id)
+		self.assertEqual(sum(b["count"] for b in data["buckets"]), 3)
+
+		self.assertEqual(self.client.get(reverse("api_consumo"), {"granularity": "año"}).status_code, 400)
+		self.assertEqual(self.client.get(reverse("api_consumo"), {"granularity": "hour", "start_date": "2020-01-01"}).status_code, 400)
@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from web.cache_backends import TwoTierCache
+
+
+@override_settings(CACHES={
+	"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+	"l2": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "two-tier-tests"},
+})
+class TwoTierCacheTests(SimpleTestCase):
+	def setUp(self):
+		caches["l2"].clear()
+		self.cache = self._make()
+
+	def _make(self):
+		return TwoTierCache("", {"TIMEOUT": 60, "OPTIONS": {"L2": "l2", "L1_EXCLUDE": ["rl:"]}})
+
+	def test_second_read_is_served_from_l1(self):
+		caches["l2"].set("clave", {"a": 1})
+		self.assertEqual(self.cache.get("clave"), {"a": 1})
+		self.assertEqual(self.cache.get("clave"), {"a": 1})
+		stats = self.cache.stats()
+		self.assertEqual((stats["l1_hits"], stats["l1_misses"], stats["l2_hits"]), (1, 1, 1))
+
+	def test_l1_returns_copies(self):
+		self.cache.set("lista", [1])
+		self.cache.get("lista").append(2)
+		self.assertEqual(self.cache.get("lista"), [1])
+
+	def test_writes_from_other_process_apply_on_invalidation(self):
+		# Otro worker comparte L2 pero tiene su propio L1
+		other = self._make()
+		self.cache.set("clave", "vieja")
+		self.assertEqual(other.get("clave"), "vieja")
+
+		self.cache.set("clave", "nueva")
+		self.assertEqual(other.get("clave"), "vieja")
+		other.handle_invalidation(other.make_key("clave").encode())
+		self.assertEqual(other.get("clave"), "nueva")
+
+		self.cache.delete("clave")
+		other.handle_invalidation("*")
+		self.assertIsNone(other.get("clave"))
+
+	def test_excluded_prefixes_always_read_l2(self):
+		self.cache.add("rl:ip:1", 0, 60)
+		self.cache.incr("rl:ip:1")
+		caches["l2"].incr("rl:ip:1")
+		self.assertEqual(self.cache.get("rl:ip:1"), 2)
+		self.assertEqual(self.cache.stats()["l1_entries"], 0)
+
+	def test_incr_and_delete_drop_local_copy(self):
+		self.cache.set("version", 1)
+		self.assertEqual(self.cache.get("version"), 1)
+		self.assertEqual(self.cache.incr("version"), 2)
+		self.assertEqual(self.cache.get("version"), 2)
+		self.cache.delete("version")
+		self.assertIsNone(self.cache.get("version"))
+
+	def test_get_many_mixes_tiers(self):
+		self.cache.set("a", 1)
+		caches["l2"].set("b", 2)
+		self.assertEqual(self.cache.get_many(["a", "b", "c"]), {"a": 1, "b": 2})
+		self.assertEqual(self.cache.stats()["l2_misses"], 1)
+
+	def test_invalidation_during_l2_read_is_not_cached(self):
+		caches["l2"].set("clave", "vieja")
+		l2_get = caches["l2"].get
+
+		def get_then_invalidate(*args, **kwargs):
+			value = l2_get(*args, **kwargs)
+			# Otro worker escribe y su invalidación llega antes de llenar L1
+			caches["l2"].set("clave", "nueva")
+			self.cache.handle_invalidation(self.cache.make_key("clave"))
+			return value
+
+		with mock.patch.object(caches["l2"], "get", side_effect=get_then_invalidate):
+			self.assertEqual(self.cache.get("clave"), "vieja")
+		self.assertEqual(self.cache.get("clave"), "nueva")
+
+	def test_l1_copy_does_not_outlive_l2(self):
+		caches["l2"].set("clave", 1)
+		with mock.patch.object(caches["l2"], "ttl", create=True, return_value=0):
+			self.cache.get("clave")
+			self.cache.get_many(["clave"])
+		self.assertEqual(self.cache.stats()["l1_entries"], 0)
@@ -0,0 +1,75 @@
+import json
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from web.changefeed import iter_changes
+from web.models import Medicion, MedicionChange
+
+
+class ChangeFeedTests(TestCase):
+	def setUp(self):
+		self.empresa = User.objects.create_user(username="empresa", password="test1234")
+		self.otra = User.objects.create_user(username="otra", password="test1234")
+		self.staff = User.objects.create_user(username="admin", password="test1234", is_staff=True)
+
+	def test_insert_validate_delete_in_order(self):
+		medicion = Medicion.objects.create(user=self.empresa, value=10)
+		borrada = Medicion.objects.create(user=self.empresa, value=11)
+		medicion.is_valid = True
+		medicion.save()
+		borrada_id = borrada.id
+		borrada.delete()
+
+		items = list(iter_changes(0))
+		end = items.pop()
+		# El alta de la medición borrada se omite: su baja llega después
+		self.assertEqual([(i["op"], i["id"]) for i in items], [
+			("insert", medicion.id), ("update", medicion.id), ("delete", borrada_id),
+		])
+		self.assertTrue(items[1]["data"]["is_valid"])
+		self.assertNotIn("data", items[2])
+		self.assertEqual(end["cursor"], MedicionChange.objects.order_by("-position").first().position)
+
+		# Desde el cursor no hay nada nuevo
+		self.assertEqual(list(iter_changes(end["cursor"])), [{"op": "end", "cursor": end["cursor"], "has_more": False}])
+
+	def test_late_commit_is_not_skipped(self):
+		Medicion.objects.create(user=self.empresa, value=1)
+		Medicion.objects.create(user=self.empresa, value=2)
+		# El primer cambio todavía no está confirmado cuando se lee el feed
+		tardio = MedicionChange.objects.order_by("seq").first()
+		tardio.delete()
+		cursor = list(iter_changes(0))[-1]["cursor"]
+
+		MedicionChange.objects.create(seq=tardio.seq, medicion_id=tardio.medicion_id, user_id=tardio.user_id, op=tardio.op)
+		items = list(iter_changes(cursor))
+		self.assertEqual([(i["op"], i["id"]) for i in items[:-1]], [("insert", tardio.medicion_id)])
+		self.assertGreater(items[-1]["cursor"], cursor)
+
+	def test_limit_reports_has_more(self):
+		for i in range(3):
+			Medicion.objects.create(user=self.empresa, value=i)
+		items = list(iter_changes(0, limit=2))
+		self.assertEqual(len(items), 3)
+		self.assertTrue(items[-1]["has_more"])
+		resto = list(iter_changes(items[-1]["cursor"], limit=2))
+		self.assertEqual(len(resto), 2)
+		self.assertFalse(resto[-1]["has_more"])
+
+	def test_endpoint_scopes_operarios_and_command_emits_ndjson(self):
+		Medicion.objects.create(user=self.empresa, value=1)
+		Medicion.objects.create(user=self.otra, value=2)
+
+		self.client.login(username="empresa", password="test1234")
+		response = self.client.get(reverse("api_cambios"))
+		self.assertEqual(response["Content-Type"], "application/x-ndjson")
+		lineas = [json.loads(l) for l in b"".join(response.streaming_content).decode().splitlines()]
+		self.assertEqual([l["data"]["username"] for l in lineas[:-1]], ["empresa"])
+
+		out = StringIO()
+		call_command("exportar_cambios", stdout=out)
+		self.assertEqual(len(out.getvalue().splitlines()), 3)
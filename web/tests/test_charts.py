@@ -0,0 +1,60 @@
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from web.charts import lttb
+from web.models import Medicion
+
+
+class LttbTests(TestCase):
+	def test_keeps_endpoints_budget_and_spikes(self):
+		x = np.arange(10000, dtype=np.float64)
+		y = np.sin(x / 500.0)
+		y[4321] = 25.0
+		indices = lttb(x, y, 200)
+		self.assertEqual(len(indices), 200)
+		self.assertEqual((indices[0], indices[-1]), (0, 9999))
+		self.assertTrue(np.all(np.diff(indices) > 0))
+		self.assertIn(4321, indices)
+
+	def test_small_series_untouched(self):
+		self.assertEqual(list(lttb(np.arange(5.0), np.arange(5.0), 300)), [0, 1, 2, 3, 4])
+
+
+class ChartEndpointTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.empresa = User.objects.create_user(username="empresa", password="test1234")
+		User.objects.create_user(username="admin", password="test1234", is_staff=True)
+		for i in range(30):
+			Medicion.objects.create(user=self.empresa, value=i)
+		self.url = reverse("admin_grafico_empresa", args=[self.empresa.id])
+		self.client.login(username="admin", password="test1234")
+
+	def test_downsampled_and_cached_per_version(self):
+		data = self.client.get(self.url, {"points": 10}).json()
+		self.assertEqual((len(data["values"]), data["total"]), (10, 30))
+		self.assertEqual((data["values"][0], data["values"][-1]), (0.0, 29.0))
+
+		# Misma versión (de la caché): solo la empresa (sesión y usuario también salen de la caché)
+		with self.assertNumQueries(1):
+			self.client.get(self.url, {"points": 10})
+
+		with self.captureOnCommitCallbacks(execute=True):
+			Medicion.objects.create(user=self.empresa, value=100)
+		self.assertEqual(self.client.get(self.url, {"points": 10}).json()["total"], 31)
+
+	def test_moving_a_reading_invalidates_the_previous_company(self):
+		otra = User.objects.create_user(username="otra", password="test1234")
+		self.assertEqual(self.client.get(self.url, {"points": 10}).json()["total"], 30)
+		medicion = Medicion.objects.filter(user=self.empresa).first()
+		medicion.user = otra
+		with self.captureOnCommitCallbacks(execute=True):
+			medicion.save()
+		self.assertEqual(self.client.get(self.url, {"points": 10}).json()["total"], 29)
+
+	def test_requires_staff(self):
+		self.client.login(username="empresa", password="test1234")
+		self.assertEqual(self.client.get(self.url).status_code, 403)
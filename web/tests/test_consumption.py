@@ -0,0 +1,82 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from web.consumption import DERIVED_FIELDS
+from web.models import Medicion
+
+
+class ConsumptionTests(TestCase):
+	def setUp(self):
+		self.empresa = User.objects.create_user(username="empresa", password="test1234")
+		self.base = timezone.now() - timedelta(days=3)
+
+	def _create(self, hours, value, is_valid=True):
+		# timestamp es auto_now_add: se fija por update() y la validación pasa por save()
+		medicion = Medicion.objects.create(user=self.empresa, value=value)
+		Medicion.objects.filter(pk=medicion.pk).update(timestamp=self.base + timedelta(hours=hours))
+		medicion.refresh_from_db()
+		if is_valid:
+			medicion.is_valid = True
+			medicion.save()
+		return medicion
+
+	def _derived(self, medicion):
+		return tuple(Medicion.objects.filter(pk=medicion.pk).values_list(*DERIVED_FIELDS).get())
+
+	def test_delta_and_rate_between_valid_readings(self):
+		first = self._create(0, 100)
+		pending = self._create(1, 500, is_valid=False)
+		second = self._create(4, 160)
+
+		self.assertEqual(self._derived(first), (None, None, None))
+		self.assertEqual(self._derived(pending), (None, None, None))
+		self.assertEqual(self._derived(second), (Decimal("60.00"), 4.0, 15.0))
+
+	def test_changes_update_only_affected_readings(self):
+		first = self._create(0, 100)
+		middle = self._create(2, 120)
+		last = self._create(4, 160)
+		self.assertEqual(self._derived(middle), (Decimal("20.00"), 2.0, 10.0))
+		self.assertEqual(self._derived(last), (Decimal("40.00"), 2.0, 20.0))
+
+		# La instancia en memoria queda al día: un save() posterior no pisa el consumo
+		last.observation = "revisada"
+		last.save()
+		self.assertEqual(self._derived(last), (Decimal("40.00"), 2.0, 20.0))
+
+		middle.delete()
+		self.assertEqual(self._derived(last), (Decimal("60.00"), 4.0, 15.0))
+
+		first.delete()
+		self.assertEqual(self._derived(last), (None, None, None))
+
+	def test_moving_a_reading_forward_refreshes_both_positions(self):
+		readings = [self._create(hours, value) for hours, value in ((0, 10), (1, 15), (2, 20), (3, 30), (4, 40))]
+		movida = readings[1]
+		movida.timestamp = self.base + timedelta(hours=5)
+		movida.value = 50
+		movida.save()
+
+		# Incremental igual a recalcular todo el historial
+		incremental = [self._derived(m) for m in readings]
+		call_command("recalcular_consumos", stdout=StringIO())
+		self.assertEqual([self._derived(m) for m in readings], incremental)
+		self.assertEqual(self._derived(readings[2])[0], Decimal("10.00"))
+		self.assertEqual(self._derived(movida)[0], Decimal("10.00"))
+
+	def test_recalculate_command_matches_incremental(self):
+		readings = [self._create(hours, value) for hours, value in ((0, 10), (1, 15), (3, 25))]
+		self.assertEqual(self._derived(readings[2]), (Decimal("10.00"), 2.0, 5.0))
+		expected = [self._derived(m) for m in readings]
+		Medicion.objects.update(delta_value=None, delta_hours=None, consumption_rate=None)
+
+		out = StringIO()
+		call_command("recalcular_consumos", stdout=out)
+		self.assertIn("2 mediciones actualizadas", out.getvalue())
+		self.assertEqual([self._derived(m) for m in readings], expected)
@@ -0,0 +1,61 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from web.models import Medicion
+
+
+class DashboardCacheTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.empresa = User.objects.create_user(username="empresa", password="test1234")
+		self.staff = User.objects.create_user(username="admin", password="test1234", is_staff=True)
+		Medicion.objects.create(user=self.empresa, value=10)
+
+	def _get_dashboard(self):
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.get(reverse("dashboard"))
+		medicion_queries = [q["sql"] for q in queries if "web_medicion" in q["sql"]]
+		return response, medicion_queries
+
+	def test_recent_list_is_cached_until_a_measurement_changes(self):
+		self.client.login(username="empresa", password="test1234")
+		response, queries = self._get_dashboard()
+		self.assertEqual(len(queries), 1)
+		self.assertEqual([m.value for m in response.context["mediciones"]], [10])
+
+		response, queries = self._get_dashboard()
+		self.assertEqual(queries, [])
+
+		with self.captureOnCommitCallbacks(execute=True):
+			Medicion.objects.create(user=self.empresa, value=20)
+			# Hasta el commit otra petición no ve el alta: la copia cacheada sigue vigente
+			response, queries = self._get_dashboard()
+			self.assertEqual(queries, [])
+		response, queries = self._get_dashboard()
+		self.assertEqual(len(queries), 1)
+		self.assertEqual(len(response.context["mediciones"]), 2)
+
+	def test_staff_list_follows_changes_and_username(self):
+		self.client.login(username="admin", password="test1234")
+		response, _ = self._get_dashboard()
+		self.assertEqual(response.context["mediciones"][0].username, "empresa")
+
+		# Un login (solo last_login) no invalida
+		self.client.login(username="admin", password="test1234")
+		_, queries = self._get_dashboard()
+		self.assertEqual(queries, [])
+
+		self.empresa.username = "renombrada"
+		with self.captureOnCommitCallbacks(execute=True):
+			self.empresa.save()
+		response, _ = self._get_dashboard()
+		self.assertContains(response, "renombrada")
+
+		with self.captureOnCommitCallbacks(execute=True):
+			Medicion.objects.get(user=self.empresa).delete()
+		response, _ = self._get_dashboard()
+		self.assertEqual(response.context["mediciones"], [])
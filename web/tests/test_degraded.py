@@ -0,0 +1,95 @@
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from web import degraded
+from web.auth_backends import user_cache_key
+from web.models import Medicion
+
+
+def failing():
+	raise OperationalError("connection refused")
+
+
+class DegradedReadTests(SimpleTestCase):
+	def setUp(self):
+		cache.clear()
+
+	def test_serves_last_known_good_on_database_error(self):
+		self.assertEqual(degraded.read("clave:1", lambda: "bueno", 60, "clave"), ("bueno", None))
+		value, stale_as_of = degraded.read("clave:2", failing, 60, "clave")
+		self.assertEqual(value, "bueno")
+		self.assertIsNotNone(stale_as_of)
+
+	def test_without_copy_the_error_propagates(self):
+		with self.assertRaises(degraded.Unavailable):
+			degraded.read("clave:1", failing, 60, "clave")
+
+	@override_settings(DB_READ_BUDGET=0.05)
+	def test_slow_query_serves_copy_and_refreshes_in_background(self):
+		degraded.read("clave:1", lambda: "viejo", 60, "clave")
+
+		def slow():
+			time.sleep(0.3)
+			return "nuevo"
+
+		value, stale_as_of = degraded.read("clave:2", slow, 60, "clave")
+		self.assertEqual(value, "viejo")
+		self.assertIsNotNone(stale_as_of)
+		# Mientras sigue calculando no se lanza otro
+		self.assertEqual(degraded.read("clave:2", slow, 60, "clave")[0], "viejo")
+
+		time.sleep(0.5)
+		self.assertEqual(degraded.read("clave:2", failing, 60, "clave"), ("nuevo", None))
+
+
+class DegradedViewTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(username="operario", password="test1234")
+		Medicion.objects.create(user=self.user, value=10, captured_latitude=-32.9, captured_longitude=-68.8)
+		self.client.login(username="operario", password="test1234")
+
+	def test_dashboard_shows_saved_list_when_database_fails(self):
+		self.client.get(reverse("dashboard"))
+		with self.captureOnCommitCallbacks(execute=True):
+			Medicion.objects.create(user=self.user, value=20)
+		with mock.patch("web.dashboard._rows", side_effect=OperationalError("timeout")):
+			response = self.client.get(reverse("dashboard"))
+		self.assertEqual([m.value for m in response.context["mediciones"]], [10])
+		self.assertContains(response, "La base de datos no responde")
+
+	def test_weekly_route_marks_stale_or_answers_503(self):
+		with mock.patch("web.weekly.build_geojson", side_effect=OperationalError("timeout")):
+			response = self.client.get(reverse("weekly_route_data"))
+		self.assertEqual(response.status_code, 503)
+		self.assertIn("Retry-After", response)
+
+		self.client.get(reverse("weekly_route_data"))
+		with self.captureOnCommitCallbacks(execute=True):
+			Medicion.objects.create(user=self.user, value=20)
+		with mock.patch("web.weekly.build_geojson", side_effect=OperationalError("timeout")):
+			response = self.client.get(reverse("weekly_route_data"))
+		self.assertEqual(response.status_code, 200)
+		self.assertTrue(response.json()["properties"]["stale"])
+		self.assertIn("X-Data-Stale", response)
+
+	def test_health_check_reports_degraded_when_only_cache_works(self):
+		with mock.patch("web.views.connection.cursor", side_effect=OperationalError("down")):
+			response = self.client.get("/health/")
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.json()["status"], "degraded")
+
+	def test_deactivated_user_is_dropped_again_on_commit(self):
+		key = user_cache_key(self.user.id)
+		with self.captureOnCommitCallbacks(execute=True):
+			self.user.is_active = False
+			self.user.save()
+			# Un pedido concurrente vuelve a cachear la fila vieja antes del commit
+			cache.set(key, User(id=self.user.id, username="operario", is_active=True))
+		self.assertIsNone(cache.get(key))
@@ -0,0 +1,267 @@
+import gzip
+import io
+import tempfile
+import zipfile
+import zlib
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from web import columnar, exports
+from web.exports import _evidence_storage, _save_manifest, evidence_bundle, expire_stale_jobs, export_params_hash, normalize_export_params, request_export
+from web.models import ExportJob, Medicion
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True, MEDIA_ROOT=tempfile.mkdtemp())
+class ExportJobTests(TestCase):
+	def setUp(self):
+		self.staff = User.objects.create_user(username="admin", password="test1234", is_staff=True)
+		self.empresa = User.objects.create_user(username="empresa", password="test1234")
+		for i in range(3):
+			Medicion.objects.create(user=self.empresa, value=10 + i)
+
+	def test_job_writes_gzip_csv(self):
+		params = normalize_export_params(user_id=self.empresa.id)
+		with self.captureOnCommitCallbacks(execute=True):
+			job, created = request_export(params, user=self.staff)
+		self.assertTrue(created)
+
+		job.refresh_from_db()
+		self.assertEqual(job.status, ExportJob.STATUS_DONE)
+		self.assertEqual((job.total_rows, job.progress), (3, 100))
+		with job.file.open("rb") as f:
+			lineas = gzip.decompress(f.read()).decode("utf-8").strip().splitlines()
+		self.assertTrue(lineas[0].startswith("\ufeffTimestamp,"))
+		self.assertEqual(len(lineas), 4)
+
+	def test_identical_params_share_job(self):
+		params = normalize_export_params(user_id=self.empresa.id, start_date="2026-01-01")
+		primero, creado = request_export(params, user=self.staff)
+		segundo, creado_otra_vez = request_export(dict(params), user=self.empresa)
+		self.assertTrue(creado)
+		self.assertFalse(creado_otra_vez)
+		self.assertEqual(primero.pk, segundo.pk)
+
+		otro, _ = request_export(normalize_export_params(user_id=self.empresa.id), user=self.staff)
+		self.assertNotEqual(otro.pk, primero.pk)
+
+	def test_abandoned_job_is_expired_and_replaced(self):
+		params = normalize_export_params(user_id=self.empresa.id)
+		viejo, _ = request_export(params, user=self.staff)
+		# El worker que lo tomó se recicló: quedó "en proceso" sin latido
+		hace_rato = timezone.now() - timedelta(hours=1)
+		ExportJob.objects.filter(pk=viejo.pk).update(status=ExportJob.STATUS_RUNNING, heartbeat_at=hace_rato)
+
+		nuevo, creado = request_export(params, user=self.staff)
+		self.assertTrue(creado)
+		self.assertNotEqual(nuevo.pk, viejo.pk)
+		viejo.refresh_from_db()
+		self.assertEqual(viejo.status, ExportJob.STATUS_FAILED)
+
+	def test_queued_job_is_kept_alive_by_running_jobs(self):
+		hace_rato = timezone.now() - timedelta(hours=1)
+		# Encolado detrás de otro trabajo del mismo pool
+		with mock.patch("web.exports.enqueue"), self.captureOnCommitCallbacks(execute=True):
+			esperando, _ = request_export(normalize_export_params(user_id=self.empresa.id), user=self.staff)
+		self.addCleanup(exports._queued_jobs.discard, esperando.pk)
+		ExportJob.objects.filter(pk=esperando.pk).update(created_at=hace_rato, heartbeat_at=hace_rato)
+
+		with mock.patch.dict("web.exports.EXPORT_WRITERS", {"csv": self._writer_with_progress}), self.captureOnCommitCallbacks(execute=True):
+			request_export(normalize_export_params(user_id=self.staff.id), user=self.staff)
+		self.assertEqual(expire_stale_jobs(), 0)
+		esperando.refresh_from_db()
+		self.assertEqual(esperando.status, ExportJob.STATUS_PENDING)
+		self.assertGreater(esperando.heartbeat_at, hace_rato)
+
+	def test_job_expired_while_running_is_not_marked_done(self):
+		with mock.patch.dict("web.exports.EXPORT_WRITERS", {"csv": self._writer_that_gets_expired}), self.captureOnCommitCallbacks(execute=True):
+			job, _ = request_export(normalize_export_params(user_id=self.empresa.id), user=self.staff)
+		job.refresh_from_db()
+		self.assertEqual(job.status, ExportJob.STATUS_FAILED)
+		self.assertFalse(job.file)
+
+	@staticmethod
+	def _writer_with_progress(queryset, fileobj, on_progress, columns=None):
+		on_progress(1)
+		fileobj.write(b"x")
+		return "csv.gz"
+
+	@staticmethod
+	def _writer_that_gets_expired(queryset, fileobj, on_progress, columns=None):
+		# Mientras escribe, otra petición lo da por abandonado
+		ExportJob.objects.filter(status=ExportJob.STATUS_RUNNING).update(status=ExportJob.STATUS_FAILED)
+		fileobj.write(b"x")
+		return "csv.gz"
+
+	def test_concurrent_winner_already_finished(self):
+		params = normalize_export_params(user_id=self.empresa.id)
+		create = ExportJob.objects.create
+
+		@contextmanager
+		def atomic():
+			# El INSERT choca con el de otra petición, que termina antes de que se busque de nuevo
+			try:
+				yield
+			except IntegrityError:
+				create(params=params, params_hash=export_params_hash('csv', params), status=ExportJob.STATUS_DONE, finished_at=timezone.now())
+				raise
+
+		with mock.patch("web.exports.transaction.atomic", atomic), \
+				mock.patch.object(ExportJob.objects, "create", side_effect=IntegrityError("web_exportjob_activo_uniq")):
+			job, creado = request_export(params, user=self.staff)
+		self.assertFalse(creado)
+		self.assertEqual(job.status, ExportJob.STATUS_DONE)
+
+	def test_views_scope_and_download(self):
+		self.client.login(username="empresa", password="test1234")
+		with self.captureOnCommitCallbacks(execute=True):
+			# El operario no puede pedir datos de otro usuario
+			response = self.client.post(reverse("crear_exportacion"), {"user_id": self.staff.id}, HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+		self.assertEqual(response.status_code, 202)
+		job = ExportJob.objects.get(pk=response.json()["id"])
+		self.assertEqual(job.params["user_id"], self.empresa.id)
+
+		estado = self.client.get(reverse("estado_exportacion", args=[job.pk]), {"format": "json"}).json()
+		self.assertEqual(estado["status"], "done")
+		descarga = self.client.get(estado["download_url"])
+		self.assertEqual(descarga.status_code, 200)
+		descarga.close()
+
+		User.objects.create_user(username="otra", password="test1234")
+		self.client.login(username="otra", password="test1234")
+		self.assertEqual(self.client.get(reverse("estado_exportacion", args=[job.pk])).status_code, 404)
+
+	@skipUnless(columnar.available(), "pyarrow no instalado")
+	def test_parquet_keeps_types_and_projection(self):
+		import pyarrow.parquet as pq
+
+		params = normalize_export_params(user_id=self.empresa.id, columns=["value", "timestamp", "id"])
+		self.assertEqual(params["columns"], ["id", "timestamp", "value"])
+		with self.captureOnCommitCallbacks(execute=True):
+			job, _ = request_export(params, user=self.staff, export_format="parquet")
+
+		job.refresh_from_db()
+		self.assertEqual(job.status, ExportJob.STATUS_DONE)
+		with job.file.open("rb") as f:
+			table = pq.read_table(f)
+		self.assertEqual(table.column_names, ["id", "timestamp", "value"])
+		self.assertEqual(str(table.schema.field("value").type), "decimal128(10, 2)")
+		self.assertEqual(sorted(v.as_py() for v in table.column("value")), [Decimal("10"), Decimal("11"), Decimal("12")])
+
+	def test_columns_rejected_for_csv(self):
+		with self.assertRaises(ValueError):
+			request_export(normalize_export_params(columns=["id"]), user=self.staff)
+		with self.assertRaises(ValueError):
+			normalize_export_params(columns=["password"])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class EvidenceZipTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.staff = User.objects.create_user(username="admin", password="test1234", is_staff=True)
+		self.empresa = User.objects.create_user(username="empresa", password="test1234")
+		storage = Medicion._meta.get_field("photo").storage
+		self.fotos = {}
+		for i in range(3):
+			medicion = Medicion.objects.create(user=self.empresa, value=i)
+			contenido = bytes([i]) * (70000 + i)
+			nombre = storage.save(f"evidencias/2026/1/{self.empresa.id}/foto_{i}.jpg", ContentFile(contenido))
+			Medicion.objects.filter(pk=medicion.pk).update(photo=nombre)
+			self.fotos[nombre] = contenido
+		self.url = reverse("admin_evidencias_empresa", args=[self.empresa.id])
+		self.client.login(username="admin", password="test1234")
+
+	def _get(self, **headers):
+		response = self.client.get(self.url, **headers)
+		return response, b"".join(response.streaming_content) if response.streaming else response.content
+
+	def test_zip_contains_csv_and_stored_photos(self):
+		response, contenido = self._get()
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(int(response["Content-Length"]), len(contenido))
+		with zipfile.ZipFile(io.BytesIO(contenido)) as zf:
+			self.assertIsNone(zf.testzip())
+			self.assertEqual(zf.namelist()[0], "mediciones.csv")
+			for info in zf.infolist()[1:]:
+				self.assertEqual(info.compress_type, zipfile.ZIP_STORED)
+				self.assertEqual(zf.read(info), self.fotos[info.filename])
+
+	def test_range_resume_matches_full_download(self):
+		_, completo = self._get()
+		response, _ = self._get()
+		etag = response["ETag"]
+
+		# Cortar en medio de una foto y retomar
+		corte = len(completo) // 2
+		primera, parte1 = self._get(HTTP_RANGE=f"bytes=0-{corte - 1}")
+		segunda, parte2 = self._get(HTTP_RANGE=f"bytes={corte}-", HTTP_IF_RANGE=etag)
+		self.assertEqual((primera.status_code, segunda.status_code), (206, 206))
+		self.assertEqual(segunda["Content-Range"], f"bytes {corte}-{len(completo) - 1}/{len(completo)}")
+		self.assertEqual(parte1 + parte2, completo)
+
+		# Sufijo (solo el directorio central) y ETag viejo
+		_, cola = self._get(HTTP_RANGE="bytes=-100")
+		self.assertEqual(cola, completo[-100:])
+		self.assertEqual(self._get(HTTP_RANGE="bytes=10-", HTTP_IF_RANGE='"viejo"')[0].status_code, 200)
+		self.assertEqual(self._get(HTTP_RANGE=f"bytes={len(completo)}-")[0].status_code, 416)
+
+	def test_bundle_is_built_once_per_data_version(self):
+		_, completo = self._get()
+		abiertos = []
+		abrir = FileSystemStorage.open
+
+		def abrir_registrando(storage, name, *args, **kwargs):
+			abiertos.append(name)
+			return abrir(storage, name, *args, **kwargs)
+
+		# Con el paquete guardado, el directorio central no consulta mediciones ni lee fotos
+		with CaptureQueriesContext(connection) as queries, \
+				mock.patch.object(FileSystemStorage, "size") as size, \
+				mock.patch.object(FileSystemStorage, "open", abrir_registrando):
+			response, cola = self._get(HTTP_RANGE="bytes=-100")
+		self.assertEqual(cola, completo[-100:])
+		self.assertFalse([q for q in queries if "web_medicion" in q["sql"]])
+		self.assertFalse(size.called)
+		self.assertFalse(set(abiertos) & set(self.fotos))
+
+		# Una modificación confirmada cambia el ETag y el contenido
+		medicion = Medicion.objects.filter(user=self.empresa).first()
+		medicion.observation = "corregida"
+		with self.captureOnCommitCallbacks(execute=True):
+			medicion.save()
+		nueva, contenido = self._get()
+		self.assertNotEqual(nueva["ETag"], response["ETag"])
+		with zipfile.ZipFile(io.BytesIO(contenido)) as zf:
+			self.assertIn("corregida", zf.read("mediciones.csv").decode("utf-8"))
+
+	def test_interrupted_download_keeps_crcs_of_sent_photos(self):
+		bundle, _ = evidence_bundle(normalize_export_params(user_id=self.empresa.id))
+		primera = bundle.entries[1]
+		# El cliente corta a mitad de la segunda foto
+		descarga = bundle.iter_bytes()
+		enviados = 0
+		while enviados < bundle.entries[2].offset + 1000:
+			enviados += len(next(descarga))
+		descarga.close()
+
+		bundle, _ = evidence_bundle(normalize_export_params(user_id=self.empresa.id))
+		self.assertEqual(bundle.entries[1].crc, zlib.crc32(self.fotos[primera.name]))
+		self.assertIsNone(bundle.entries[2].crc)
+
+	def test_concurrent_builds_keep_a_single_manifest(self):
+		storage = _evidence_storage()
+		self.assertTrue(_save_manifest(storage, "exportaciones/evidencias/x/abc.json", {"a": 1}))
+		self.assertFalse(_save_manifest(storage, "exportaciones/evidencias/x/abc.json", {"a": 2}))
+		self.assertEqual(storage.listdir("exportaciones/evidencias/x")[1], ["abc.json"])
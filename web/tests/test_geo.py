@@ -0,0 +1,84 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from web import geo
+from web.models import EmpresaPerfil, Medicion
+
+
+class GeoFallbackTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username="operario", password="test1234")
+		self.cerca = Medicion.objects.create(user=self.user, value=10, captured_latitude=-35.4700, captured_longitude=-69.5800)
+		self.lejos = Medicion.objects.create(user=self.user, value=11, captured_latitude=-35.9000, captured_longitude=-69.9000)
+
+	def test_haversine_m(self):
+		distancia = geo.haversine_m(-35.0, -69.0, -36.0, -69.0)
+		self.assertAlmostEqual(distancia, 111195, delta=100)
+
+	def test_within_radius(self):
+		resultado = list(geo.within_radius(Medicion.objects.all(), -35.4695, -69.5797, 1000))
+		self.assertEqual([m.id for m in resultado], [self.cerca.id])
+		self.assertLess(resultado[0].distance_m, 1000)
+
+	def test_within_bbox(self):
+		qs = geo.within_bbox(Medicion.objects.all(), -36.0, -70.0, -35.8, -69.8)
+		self.assertEqual(list(qs), [self.lejos])
+
+	def test_nearest_empresa(self):
+		otra = User.objects.create_user(username="empresa2", password="test1234")
+		EmpresaPerfil.objects.create(usuario=self.user, latitude="-35.469500", longitude="-69.579700")
+		EmpresaPerfil.objects.create(usuario=otra, latitude="-35.000000", longitude="-69.000000")
+		resultado = list(geo.nearest(EmpresaPerfil.objects.all(), -35.47, -69.58))
+		self.assertEqual(resultado[0].usuario, self.user)
+
+
+class GeofenceAuditTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username="operario", password="test1234")
+
+	def test_audit_flags_out_of_range(self):
+		from web.geofence import audit_mediciones
+
+		cerca = Medicion.objects.create(
+			user=self.user, value=10,
+			captured_latitude=-35.4695, captured_longitude=-69.5797,
+			target_latitude=-35.4696, target_longitude=-69.5798,
+		)
+		lejos = Medicion.objects.create(
+			user=self.user, value=11,
+			captured_latitude=-35.4800, captured_longitude=-69.5797,
+			target_latitude=-35.4695, target_longitude=-69.5797,
+		)
+		sin_coords = Medicion.objects.create(user=self.user, value=12)
+
+		resultado = audit_mediciones(radius_m=200)
+		self.assertEqual(resultado, {"procesadas": 3, "fuera_de_rango": 1})
+
+		cerca.refresh_from_db()
+		lejos.refresh_from_db()
+		sin_coords.refresh_from_db()
+		self.assertFalse(cerca.is_out_of_range)
+		self.assertTrue(lejos.is_out_of_range)
+		self.assertAlmostEqual(lejos.geofence_distance_m, 1167, delta=5)
+		self.assertIsNone(sin_coords.geofence_distance_m)
+
+
+class WellIndexTests(TestCase):
+	def test_nearest_well_rebuilds_on_profile_change(self):
+		from web.spatial_index import nearest_well
+
+		norte = User.objects.create_user(username="norte", password="test1234")
+		sur = User.objects.create_user(username="sur", password="test1234")
+		with self.captureOnCommitCallbacks(execute=True):
+			perfil_norte = EmpresaPerfil.objects.create(usuario=norte, latitude="-35.000000", longitude="-69.500000")
+
+		perfil_id, usuario_id, distancia = nearest_well(-35.9, -69.5)
+		self.assertEqual((perfil_id, usuario_id), (perfil_norte.id, norte.id))
+
+		with self.captureOnCommitCallbacks(execute=True):
+			perfil_sur = EmpresaPerfil.objects.create(usuario=sur, latitude="-36.000000", longitude="-69.500000")
+			# Sin commit el índice no se invalida
+			self.assertEqual(nearest_well(-35.9, -69.5)[0], perfil_norte.id)
+		perfil_id, usuario_id, distancia = nearest_well(-35.9, -69.5)
+		self.assertEqual(perfil_id, perfil_sur.id)
+		self.assertAlmostEqual(distancia, 11120, delta=20)
@@ -0,0 +1,107 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from web.geocoding import RateLimiter, ReverseGeocoder, reverse_geocode
+from web.models import EmpresaPerfil, GeocodeCache
+
+
+class CountingGeocoder(ReverseGeocoder):
+	name = "contador"
+
+	def __init__(self):
+		self.calls = 0
+
+	def reverse(self, latitude, longitude):
+		self.calls += 1
+		return f"Pozo {latitude}, {longitude}"
+
+
+@override_settings(GEOCODER_BACKEND="web.geocoding.StubGeocoder", BACKGROUND_TASKS_EAGER=True)
+class GeocodingTests(TestCase):
+	def test_reverse_geocode_uses_persistent_cache(self):
+		geocoder = CountingGeocoder()
+		primero = reverse_geocode(-35.469512, -69.579701, geocoder=geocoder)
+		segundo = reverse_geocode(-35.469498, -69.579698, geocoder=geocoder)
+		self.assertEqual(primero, segundo)
+		self.assertEqual(geocoder.calls, 1)
+		self.assertEqual(GeocodeCache.objects.count(), 1)
+
+	def test_rate_limiter_spaces_calls(self):
+		limiter = RateLimiter(rate=4)
+		with mock.patch("web.geocoding.time.monotonic", return_value=100.0), mock.patch("web.geocoding.time.sleep") as sleep:
+			limiter.wait()
+			sleep.assert_not_called()
+			limiter.wait()
+			sleep.assert_called_once_with(0.25)
+			limiter.wait()
+		self.assertEqual(sleep.call_args.args[0], 0.5)
+
+	def test_profile_edit_geocodes_in_background(self):
+		admin = User.objects.create_superuser(username="admin", password="test1234")
+		empresa = User.objects.create_user(username="empresa", password="test1234")
+		perfil = EmpresaPerfil.objects.create(usuario=empresa)
+		self.client.force_login(admin)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			response = self.client.post(
+				reverse("admin_editar_perfil_empresa", args=[empresa.id]),
+				{"username": "empresa", "email": "", "latitude": "-35.4695", "longitude": "-69.5797"},
+			)
+		self.assertEqual(response.status_code, 302)
+
+		perfil.refresh_from_db()
+		self.assertEqual(perfil.ubicacion, "Ubicación -35.4695, -69.5797")
+
+
+class GazetteerTests(TestCase):
+	def setUp(self):
+		import tempfile
+		from pathlib import Path
+
+		from web.gazetteer import build_gazetteer
+
+		self.tmpdir = tempfile.TemporaryDirectory()
+		self.path = Path(self.tmpdir.name) / "test.gaz"
+		build_gazetteer([
+			("Malargüe", "departamento", -35.4750, -69.5850),
+			("Malargüe", "lugar", -35.4750, -69.5850),
+			("San Rafael", "lugar", -34.6177, -68.3301),
+			("Ruta Nacional 40", "calle", -35.4760, -69.5840),
+		], self.path)
+
+	def tearDown(self):
+		self.tmpdir.cleanup()
+
+	def test_describe_nearest_by_kind(self):
+		from web.gazetteer import Gazetteer
+
+		gazetteer = Gazetteer(self.path)
+		self.assertEqual(len(gazetteer), 4)
+		self.assertEqual(gazetteer.describe(-35.47, -69.58), "Ruta Nacional 40, Malargüe, Mendoza, Argentina")
+		self.assertIsNone(gazetteer.describe(-20.0, -60.0))
+		# Solo el departamento a menos de 150 km: no alcanza para describir
+		self.assertIsNone(gazetteer.describe(-35.0, -69.0))
+
+	def test_missing_gazetteer_is_not_cached(self):
+		from web.gazetteer import build_gazetteer, get_gazetteer
+
+		faltante = self.path.with_name("faltante.gaz")
+		self.assertIsNone(get_gazetteer(faltante))
+		build_gazetteer([("Malargüe", "lugar", -35.4750, -69.5850)], faltante)
+		self.assertEqual(len(get_gazetteer(faltante)), 1)
+
+	def test_chain_falls_back_when_gazetteer_has_no_result(self):
+		from web.geocoding import ChainGeocoder
+
+		with self.settings(GAZETTEER_PATH=str(self.path)):
+			chain = ChainGeocoder(["web.gazetteer.GazetteerGeocoder", "web.geocoding.StubGeocoder"])
+			self.assertEqual(chain.reverse(-34.62, -68.33), "San Rafael, Mendoza, Argentina")
+			self.assertEqual(chain.reverse(-20.0, -60.0), "Ubicación -20.0000, -60.0000")
+			self.assertEqual(chain.reverse_with_provider(-20.0, -60.0)[1], "stub")
+			self.assertEqual(chain.reverse_with_provider(-34.62, -68.33)[1], "gazetteer")
+
+			reverse_geocode(-20.0, -60.0, geocoder=chain)
+			self.assertEqual(GeocodeCache.objects.get().provider, "stub")
@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from web.models import Medicion
+from web.pagination import KeysetPaginator, approximate_count
+
+
+class KeysetPaginatorTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username="empresa", password="test1234")
+		ahora = timezone.now()
+		for i in range(7):
+			medicion = Medicion.objects.create(user=self.user, value=10 + i)
+			# Dos mediciones con el mismo timestamp para probar el desempate por id
+			Medicion.objects.filter(pk=medicion.pk).update(timestamp=ahora - timedelta(hours=min(i, 5)))
+		self.ids = list(Medicion.objects.order_by("-timestamp", "-id").values_list("id", flat=True))
+
+	def test_walk_forward_and_back(self):
+		paginator = KeysetPaginator(Medicion.objects.filter(user=self.user), 3)
+
+		primera = paginator.get_page()
+		self.assertEqual([m.id for m in primera], self.ids[:3])
+		self.assertFalse(primera.has_previous)
+
+		segunda = paginator.get_page(primera.next_cursor)
+		tercera = paginator.get_page(segunda.next_cursor)
+		self.assertEqual([m.id for m in segunda], self.ids[3:6])
+		self.assertEqual([m.id for m in tercera], self.ids[6:])
+		self.assertFalse(tercera.has_next)
+
+		volver = paginator.get_page(tercera.previous_cursor)
+		self.assertEqual([m.id for m in volver], self.ids[3:6])
+		self.assertTrue(volver.has_previous)
+
+	def test_ascending_walk(self):
+		paginator = KeysetPaginator(Medicion.objects.all(), 3, ascending=True)
+		oldest = self.ids[::-1]
+
+		primera = paginator.get_page()
+		segunda = paginator.get_page(primera.next_cursor)
+		tercera = paginator.get_page(segunda.next_cursor)
+		self.assertEqual([m.id for page in (primera, segunda, tercera) for m in page], oldest)
+		self.assertFalse(tercera.has_next)
+		self.assertEqual([m.id for m in paginator.get_page(tercera.previous_cursor)], oldest[3:6])
+
+	def test_invalid_cursor_returns_first_page(self):
+		paginator = KeysetPaginator(Medicion.objects.all(), 3)
+		self.assertEqual([m.id for m in paginator.get_page("no-es-un-cursor")], self.ids[:3])
+
+	def test_approximate_count_caps(self):
+		self.assertEqual(approximate_count(Medicion.objects.all()), (7, True))
+		self.assertEqual(approximate_count(Medicion.objects.all(), cap=5), (6, False))
+
+	def test_company_measurements_view(self):
+		staff = User.objects.create_user(username="staff", password="test1234", is_staff=True)
+		self.client.force_login(staff)
+		response = self.client.get(reverse("admin_mediciones_empresa", args=[self.user.id]))
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.context["mediciones"].total, 7)
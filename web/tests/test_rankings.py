@@ -0,0 +1,80 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from web.buckets import materialize, truncate
+from web.models import BucketWatermark, Medicion, MedicionBucket
+from web.rankings import cache_key, ranking
+
+
+class RankingTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.alta = User.objects.create_user(username="alta", password="test1234")
+		self.baja = User.objects.create_user(username="baja", password="test1234")
+		self.sin_datos = User.objects.create_user(username="sin_datos", password="test1234")
+		self.staff = User.objects.create_user(username="admin", password="test1234", is_staff=True)
+		# Mes anterior (cerrado): consumo validado 90 vs 10
+		self.mes_anterior = truncate(truncate(timezone.now(), "month") - timedelta(days=1), "month")
+		for usuario, valores in ((self.alta, (10, 100)), (self.baja, (5, 15))):
+			for dia, valor in enumerate(valores):
+				medicion = Medicion.objects.create(user=usuario, value=valor, is_valid=True)
+				Medicion.objects.filter(pk=medicion.pk).update(timestamp=self.mes_anterior + timedelta(days=dia + 1))
+		# Lectura sin validar: no suma consumo hasta que se valide
+		self.pendiente = Medicion.objects.create(user=self.baja, value=1000)
+		Medicion.objects.filter(pk=self.pendiente.pk).update(timestamp=self.mes_anterior + timedelta(days=3))
+		# Lo que hace materializar_agregados / warm_caches
+		materialize("month")
+
+	def test_closed_period_is_ranked_and_cached(self):
+		resultado = ranking("consumo", "month", start=self.mes_anterior)
+		self.assertTrue(resultado["closed"])
+		self.assertEqual([(f["username"], f["posicion"], f["consumo"], f["percentil"]) for f in resultado["results"]], [
+			("alta", 1, 90.0, 100.0),
+			("baja", 2, 10.0, 0.0),
+		])
+		self.assertIsNotNone(cache.get(cache_key("consumo", "month", self.mes_anterior)))
+		with self.assertNumQueries(0):
+			ranking("consumo", "month", start=self.mes_anterior, limit=1)
+
+	def test_editing_closed_period_invalidates_ranking(self):
+		ranking("consumo", "month", start=self.mes_anterior)
+		medicion = Medicion.objects.get(user=self.baja, value=15)
+		medicion.value = 500
+		medicion.save()
+		resultado = ranking("consumo", "month", start=self.mes_anterior)
+		self.assertEqual(resultado["results"][0]["username"], "baja")
+
+	def test_validating_closed_reading_refreshes_consumo(self):
+		ranking("consumo", "month", start=self.mes_anterior)
+		self.pendiente.refresh_from_db()
+		self.pendiente.is_valid = True
+		self.pendiente.save()
+		resultado = ranking("consumo", "month", start=self.mes_anterior)
+		self.assertEqual([(f["username"], f["consumo"]) for f in resultado["results"]], [("baja", 995.0), ("alta", 90.0)])
+
+		# Mismo resultado calculado en vivo, sin los agregados
+		MedicionBucket.objects.all().delete()
+		BucketWatermark.objects.all().delete()
+		cache.clear()
+		self.assertEqual(ranking("consumo", "month", start=self.mes_anterior)["results"][0]["consumo"], 995.0)
+
+	def test_lag_ranking_and_endpoint(self):
+		self.client.login(username="alta", password="test1234")
+		self.assertEqual(self.client.get(reverse("api_rankings")).status_code, 403)
+
+		self.client.login(username="admin", password="test1234")
+		response = self.client.get(reverse("api_rankings"), {"metric": "atraso"})
+		self.assertEqual(response.status_code, 200)
+		resultados = response.json()["results"]
+		# La empresa que nunca reportó encabeza el atraso
+		self.assertEqual(resultados[0]["username"], "sin_datos")
+		self.assertIsNone(resultados[0]["horas_sin_reportar"])
+
+		self.assertEqual(self.client.get(reverse("api_rankings"), {"metric": "otra"}).status_code, 400)
+		response = self.client.get(reverse("admin_rankings"), {"period": self.mes_anterior.date().isoformat()})
+		self.assertContains(response, "Alta")
@@ -0,0 +1,84 @@
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from web.models import EmpresaPerfil, Medicion
+from web.search import search_empresas, search_enabled, search_mediciones
+
+
+class SearchTests(TestCase):
+	"""Búsqueda con el fallback ``icontains`` (SQLite); en PostgreSQL usa tsvector y pg_trgm."""
+
+	def setUp(self):
+		self.petro = User.objects.create_user(username="petrosur", password="test1234")
+		self.aguas = User.objects.create_user(username="aguasandinas", password="test1234")
+		self.staff = User.objects.create_user(username="admin", password="test1234", is_staff=True)
+		EmpresaPerfil.objects.create(usuario=self.aguas, ubicacion="Pozo Bardas Blancas")
+		self.pozo = Medicion.objects.create(user=self.petro, value=10, ubicacion_manual="Pozo Norte 3")
+		self.perdida = Medicion.objects.create(user=self.aguas, value=20, observation="Pérdida en la válvula")
+
+	def test_migration_installs_search_only_on_postgres(self):
+		self.assertEqual(search_enabled(), connection.vendor == "postgresql")
+
+	@skipUnless(connection.vendor == "postgresql", "tsvector y pg_trgm solo existen en PostgreSQL")
+	def test_postgres_full_text_and_trigram(self):
+		queryset = Medicion.objects.all()
+		# Raíces en español y errores de tipeo
+		self.assertEqual(list(search_mediciones(queryset, "pérdidas")), [self.perdida])
+		self.assertEqual(list(search_mediciones(queryset, "Pozo Nrte")), [self.pozo])
+		empresas = search_empresas(User.objects.filter(is_staff=False), "petrosr")
+		self.assertEqual(list(empresas), [self.petro])
+		self.assertGreater(empresas[0].search_similarity, 0)
+
+	def test_search_mediciones(self):
+		queryset = Medicion.objects.all()
+		self.assertEqual(list(search_mediciones(queryset, "norte")), [self.pozo])
+		self.assertEqual(list(search_mediciones(queryset, "válvula")), [self.perdida])
+		self.assertEqual(list(search_mediciones(queryset, "petro")), [self.pozo])
+		self.assertEqual(search_mediciones(queryset, "  ").count(), 2)
+
+	def test_search_empresas_by_name_or_ubicacion(self):
+		queryset = User.objects.filter(is_staff=False)
+		self.assertEqual(list(search_empresas(queryset, "petro")), [self.petro])
+		self.assertEqual(list(search_empresas(queryset, "bardas")), [self.aguas])
+
+	def test_api_mediciones_q(self):
+		self.client.login(username="admin", password="test1234")
+		response = self.client.get(reverse("api_mediciones"), {"q": "norte", "fields": "id"})
+		self.assertEqual(response.json()["results"], [{"id": self.pozo.id}])
+
+	def test_api_empresas(self):
+		self.client.login(username="petrosur", password="test1234")
+		self.assertEqual(self.client.get(reverse("api_empresas"), {"q": "petro"}).status_code, 403)
+
+		self.client.login(username="admin", password="test1234")
+		self.assertEqual(self.client.get(reverse("api_empresas")).status_code, 400)
+		results = self.client.get(reverse("api_empresas"), {"q": "bardas"}).json()["results"]
+		self.assertEqual([r["username"] for r in results], ["aguasandinas"])
+		self.assertEqual((results[0]["ubicacion"], results[0]["total_mediciones"]), ("Pozo Bardas Blancas", 1))
+
+	def test_admin_empresas_q(self):
+		self.client.login(username="admin", password="test1234")
+		response = self.client.get(reverse("admin_empresas"), {"q": "petro"})
+		self.assertEqual([e.username for e in response.context["empresas"]], ["petrosur"])
+
+	def test_django_admin_search(self):
+		User.objects.create_superuser(username="root", password="test1234")
+		self.client.login(username="root", password="test1234")
+		response = self.client.get(reverse("admin:web_medicion_changelist"), {"q": "norte"})
+		self.assertEqual([m.id for m in response.context["cl"].result_list], [self.pozo.id])
+		response = self.client.get(reverse("admin:web_empresaperfil_changelist"), {"q": "bardas"})
+		self.assertEqual(response.context["cl"].result_count, 1)
+
+	def test_postgres_conditions_follow_subquery_aliases(self):
+		# Solo se compila el SQL: el admin usa la búsqueda como subconsulta, donde auth_user pasa a ser V0
+		with mock.patch("web.search.search_enabled", return_value=True):
+			empresas = EmpresaPerfil.objects.filter(usuario_id__in=search_empresas(User.objects.all(), "petro").values("id"))
+			mediciones = Medicion.objects.filter(id__in=search_mediciones(Medicion.objects.all(), "norte").values("id"))
+			sql = [qs.query.sql_with_params()[0] for qs in (empresas, mediciones)]
+		self.assertNotIn('"auth_user"."', sql[0])
+		self.assertIn('V0."username" %%', sql[0])
+		self.assertIn('V0."search_vector" @@', sql[1])
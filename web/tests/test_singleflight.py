@@ -0,0 +1,60 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from web import singleflight
+
+
+class SingleFlightTests(SimpleTestCase):
+	def setUp(self):
+		cache.clear()
+
+	def test_concurrent_misses_compute_once(self):
+		calls = []
+		started = threading.Event()
+
+		def compute():
+			calls.append(1)
+			started.set()
+			time.sleep(0.2)
+			return "valor"
+
+		results = []
+		threads = [threading.Thread(target=lambda: results.append(singleflight.get_or_set("clave", compute, 60))) for _ in range(5)]
+		threads[0].start()
+		started.wait()
+		for thread in threads[1:]:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(len(calls), 1)
+		self.assertEqual(results, ["valor"] * 5)
+
+	def test_stale_value_served_while_another_refreshes(self):
+		singleflight.get_or_set("clave", lambda: "viejo", 60)
+		# Vencido lógicamente pero todavía en la caché
+		cache.set("clave", ("viejo", 0.1, time.time() - 1), 60)
+		release = singleflight._acquire("clave")
+		try:
+			self.assertEqual(singleflight.get_or_set("clave", lambda: "nuevo", 60), "viejo")
+		finally:
+			release()
+		self.assertEqual(singleflight.get_or_set("clave", lambda: "nuevo", 60), "nuevo")
+
+	def test_early_expiration_is_probabilistic(self):
+		singleflight.get_or_set("clave", lambda: "viejo", 60)
+		cache.set("clave", ("viejo", 5.0, time.time() + 10), 120)
+		with mock.patch("web.singleflight.random.random", return_value=0.9):
+			self.assertEqual(singleflight.get_or_set("clave", lambda: "nuevo", 60), "viejo")
+		# -5 * log(0.01) ≈ 23 s de adelanto: supera los 10 s que le quedan
+		with mock.patch("web.singleflight.random.random", return_value=0.01):
+			self.assertEqual(singleflight.get_or_set("clave", lambda: "nuevo", 60), "nuevo")
+
+	def test_none_is_cached(self):
+		calls = []
+		for _ in range(2):
+			self.assertIsNone(singleflight.get_or_set("vacio", lambda: calls.append(1), 60))
+		self.assertEqual(len(calls), 1)
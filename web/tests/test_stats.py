@@ -0,0 +1,59 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from web.models import EmpresaStats, Medicion
+from web.stats import compute_stats
+
+
+class EmpresaStatsTests(TestCase):
+	def setUp(self):
+		self.empresa = User.objects.create_user(username="empresa", password="test1234")
+		self.staff = User.objects.create_user(username="admin", password="test1234", is_staff=True)
+
+	def assertStatsMatch(self):
+		stored = EmpresaStats.objects.get(user=self.empresa)
+		expected = compute_stats([self.empresa.id])[self.empresa.id]
+		for field, value in expected.items():
+			self.assertEqual(getattr(stored, field), value, field)
+
+	def test_incremental_insert_validate_delete(self):
+		mediciones = [Medicion.objects.create(user=self.empresa, value=v) for v in (10, 30, 20)]
+		self.assertStatsMatch()
+		self.assertEqual(EmpresaStats.objects.get(user=self.empresa).promedio, Decimal("20"))
+
+		mediciones[0].is_valid = True
+		mediciones[0].save()
+		self.assertStatsMatch()
+
+		# Borrar la que tenía el máximo y la última fecha
+		mediciones[1].delete()
+		mediciones[2].delete()
+		self.assertStatsMatch()
+		stats = EmpresaStats.objects.get(user=self.empresa)
+		self.assertEqual((stats.total, stats.maximo, stats.validadas), (1, Decimal("10"), 1))
+
+	def test_views_read_rollup(self):
+		Medicion.objects.create(user=self.empresa, value=5)
+		self.client.login(username="admin", password="test1234")
+
+		with self.assertNumQueries(2):
+			# usuario (después, desde la caché) + listado con join a EmpresaStats
+			response = self.client.get(reverse("admin_empresas"))
+		self.assertEqual(response.context["empresas"][0].total_mediciones, 1)
+
+		response = self.client.get(reverse("admin_empresa_legajo", args=[self.empresa.id]))
+		self.assertEqual(response.context["stats"]["total"], 1)
+
+	def test_reconcile_command_fixes_drift(self):
+		Medicion.objects.create(user=self.empresa, value=5)
+		EmpresaStats.objects.filter(user=self.empresa).update(total=99)
+
+		out = StringIO()
+		call_command("reconciliar_estadisticas", stdout=out)
+		self.assertIn("1 tenían diferencias", out.getvalue())
+		self.assertStatsMatch()
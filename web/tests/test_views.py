@@ -1,6 +1,10 @@
+from datetime import timedelta
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
 
 from web.models import Medicion
 
@@ -31,3 +35,132 @@ class ViewTests(TestCase):
 		response = self.client.get(reverse("exportar_csv"))
 		self.assertEqual(response.status_code, 200)
 		self.assertIn("text/csv", response.get("Content-Type", ""))
+
+	def test_exportar_csv_streams_without_per_row_queries(self):
+		staff = User.objects.create_user(username="admin", password="test1234", is_staff=True)
+		self.client.login(username="admin", password="test1234")
+		for usuario in (self.user, staff):
+			Medicion.objects.create(user=usuario, value=5, photo="mediciones/2026/01/01/a.jpg")
+		response = self.client.get(reverse("exportar_csv"))
+		self.assertTrue(response.streaming)
+		with self.assertNumQueries(1):
+			contenido = b"".join(response.streaming_content).decode("utf-8")
+		self.assertTrue(contenido.startswith("\ufeffTimestamp,"))
+		self.assertIn("/media/mediciones/2026/01/01/a.jpg", contenido)
+		self.assertEqual(len(contenido.strip().splitlines()), 3)
+
+
+class ApiMedicionesTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username="operario", password="test1234")
+		self.otro = User.objects.create_user(username="otro", password="test1234")
+		self.staff = User.objects.create_user(username="admin", password="test1234", is_staff=True)
+		for i in range(5):
+			Medicion.objects.create(user=self.user, value=i, is_valid=i % 2 == 0)
+		Medicion.objects.create(user=self.otro, value=99)
+
+	def test_requires_login(self):
+		response = self.client.get(reverse("api_mediciones"))
+		self.assertEqual(response.status_code, 302)
+
+	def test_operario_only_sees_own_rows(self):
+		self.client.login(username="operario", password="test1234")
+		data = self.client.get(reverse("api_mediciones"), {"user": self.otro.id}).json()
+		self.assertEqual(data["count"], 5)
+		self.assertTrue(all(r["username"] == "operario" for r in data["results"]))
+
+	def test_cursor_fields_and_filters(self):
+		self.client.login(username="admin", password="test1234")
+		url = reverse("api_mediciones")
+
+		data = self.client.get(url, {"fields": "id,value", "limit": 2, "user": self.user.id}).json()
+		self.assertEqual(set(data["results"][0]), {"id", "value"})
+		siguiente = self.client.get(url, {"fields": "id", "limit": 2, "user": self.user.id, "cursor": data["next_cursor"]}).json()
+		self.assertEqual(len(siguiente["results"]), 2)
+		self.assertFalse({r["id"] for r in data["results"]} & {r["id"] for r in siguiente["results"]})
+
+		validas = self.client.get(url, {"is_valid": "false", "user": self.user.id}).json()
+		self.assertEqual(validas["count"], 2)
+
+		hoy = timezone.localdate().isoformat()
+		self.assertEqual(self.client.get(url, {"end_date": hoy}).json()["count"], 6)
+
+	def test_invalid_params(self):
+		self.client.login(username="admin", password="test1234")
+		self.assertEqual(self.client.get(reverse("api_mediciones"), {"fields": "password"}).status_code, 400)
+		self.assertEqual(self.client.get(reverse("api_mediciones"), {"start_date": "ayer"}).status_code, 400)
+
+
+class WeeklyRouteCacheTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username="operario", password="test1234")
+
+	def test_weekly_route_data_is_cached_until_a_measurement_changes(self):
+		cache.clear()
+		self.client.login(username="operario", password="test1234")
+		Medicion.objects.create(user=self.user, value=10, captured_latitude=-32.9, captured_longitude=-68.8)
+		Medicion.objects.create(user=self.user, value=11)
+		with self.assertNumQueries(2):  # usuario y una sola consulta de mediciones
+			data = self.client.get(reverse("weekly_route_data")).json()
+		self.assertEqual(data["properties"]["count"], 1)
+		self.assertEqual(data["features"][0]["properties"]["operator_name"], "operario")
+
+		with self.assertNumQueries(0):
+			self.client.get(reverse("weekly_route_data"))
+
+		with self.captureOnCommitCallbacks(execute=True):
+			Medicion.objects.create(user=self.user, value=12, target_latitude=-33.0, target_longitude=-68.9)
+		data = self.client.get(reverse("weekly_route_data")).json()
+		self.assertEqual(data["properties"]["count"], 2)
+
+
+class ValidationQueueTests(TestCase):
+	def setUp(self):
+		self.staff = User.objects.create_user(username="staff", password="test1234", is_staff=True)
+		self.empresas = [User.objects.create_user(username=f"empresa{i}", password="test1234") for i in range(2)]
+		inicio = timezone.now() - timedelta(days=1)
+		self.pendientes = []
+		for i in range(5):
+			medicion = Medicion.objects.create(
+				user=self.empresas[i % 2], value=10 + i, photo=f"mediciones/2026/01/01/{i}.jpg"
+			)
+			Medicion.objects.filter(pk=medicion.pk).update(timestamp=inicio + timedelta(hours=i))
+			self.pendientes.append(medicion.id)
+		Medicion.objects.create(user=self.empresas[0], value=1, is_valid=True)
+
+	def test_api_walks_oldest_first_with_next_photos(self):
+		self.client.force_login(self.staff)
+		primera = self.client.get(reverse("api_validacion"), {"limit": 2}).json()
+		self.assertEqual([r["id"] for r in primera["results"]], self.pendientes[:2])
+		self.assertEqual(primera["pendientes"], 5)
+		self.assertEqual(primera["next_photos"], ["/media/mediciones/2026/01/01/2.jpg", "/media/mediciones/2026/01/01/3.jpg"])
+
+		segunda = self.client.get(reverse("api_validacion"), {"limit": 2, "cursor": primera["next_cursor"]}).json()
+		self.assertEqual([r["id"] for r in segunda["results"]], self.pendientes[2:4])
+
+		filtrada = self.client.get(reverse("api_validacion"), {"user": self.empresas[1].id}).json()
+		self.assertEqual([r["id"] for r in filtrada["results"]], self.pendientes[1::2])
+		self.assertEqual(filtrada["pendientes"], 2)
+
+	def test_queue_skips_readings_without_empresa(self):
+		Medicion.objects.bulk_create([Medicion(user=None, value=3)])  # sin validación del modelo
+		self.client.force_login(self.staff)
+		data = self.client.get(reverse("api_validacion")).json()
+		self.assertEqual([r["id"] for r in data["results"]], self.pendientes)
+		self.assertEqual(data["pendientes"], 5)
+
+	def test_api_requires_staff(self):
+		self.client.force_login(self.empresas[0])
+		self.assertEqual(self.client.get(reverse("api_validacion")).status_code, 403)
+
+	def test_validating_keeps_queue_position(self):
+		self.client.force_login(self.staff)
+		response = self.client.get(reverse("admin_validacion"))
+		self.assertEqual([m.id for m in response.context["mediciones"]], self.pendientes)
+		self.assertNotContains(response, 'rel="prefetch"')
+
+		url = reverse("admin_validacion")
+		self.client.post(reverse("admin_validar_medicion", args=[self.pendientes[0]]), {"next": url})
+		response = self.client.get(url)
+		self.assertEqual([m.id for m in response.context["mediciones"]], self.pendientes[1:])
+		self.assertEqual(response.context["pendientes"], 4)
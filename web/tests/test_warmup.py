@@ -0,0 +1,42 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from web.models import Medicion
+from web.warmup import warm
+
+
+class WarmCachesTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.empresa = User.objects.create_user(username="empresa", password="test1234", last_login=timezone.now())
+		self.staff = User.objects.create_user(username="admin", password="test1234", is_staff=True)
+		Medicion.objects.create(user=self.empresa, value=10, captured_latitude=-32.9, captured_longitude=-68.8)
+
+	def test_warm_fills_what_the_views_read(self):
+		results = warm(workers=1)
+		self.assertEqual(results["dashboard"]["entries"], 2)  # staff + empresa activa
+		self.assertEqual(results["empresas"]["entries"], 1)
+		self.assertEqual(results["graficos"]["entries"], 1)
+		self.assertFalse(any(result["errors"] for result in results.values()))
+
+		self.client.login(username="admin", password="test1234")
+		for url in (reverse("dashboard"), reverse("weekly_route_data"), reverse("admin_empresas")):
+			with CaptureQueriesContext(connection) as queries:
+				self.client.get(url)
+			self.assertEqual([q["sql"] for q in queries if "web_medicion" in q["sql"] or "web_empresastats" in q["sql"]], [], url)
+
+	def test_command_reports_each_family(self):
+		out = StringIO()
+		call_command("warm_caches", "--workers", "1", "--familia", "mapa", "--familia", "rankings", stdout=out)
+		output = out.getvalue()
+		self.assertIn("mapa: 2 entradas", output)
+		self.assertIn("rankings: 7 entradas", output)
+		self.assertNotIn("dashboard", output)
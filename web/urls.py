@@ -9,9 +9,18 @@ urlpatterns = [
     path("cargar/", views.cargar_medicion, name="cargar"),
     path("sw.js", views.service_worker, name="service_worker"),
     path("api/weekly-route/", views.get_weekly_route_data, name="weekly_route_data"),
+    path("api/mediciones/", views.api_mediciones, name="api_mediciones"),
+    path("api/empresas/", views.api_empresas, name="api_empresas"),
+    path("api/cambios/", views.api_cambios, name="api_cambios"),
+    path("api/consumo/", views.api_consumo, name="api_consumo"),
+    path("api/rankings/", views.api_rankings, name="api_rankings"),
+    path("api/validacion/", views.api_validacion, name="api_validacion"),
     path("mapa/", views.weekly_route, name="weekly_route"),
     path("api/docs/", views.api_docs, name="api_docs"),
     path("exportar/", views.exportar_csv, name="exportar_csv"),
+    path("exportar/trabajos/", views.crear_exportacion, name="crear_exportacion"),
+    path("exportar/trabajos/<int:job_id>/", views.estado_exportacion, name="estado_exportacion"),
+    path("exportar/trabajos/<int:job_id>/descargar/", views.descargar_exportacion, name="descargar_exportacion"),
     
     # Admin Panel (Custom UI)
     path("gestion/usuarios/", views.admin_usuarios_view, name="admin_usuarios"),
@@ -20,8 +29,14 @@ urlpatterns = [
     path("gestion/usuarios/<int:user_id>/eliminar/", views.admin_eliminar_usuario_view, name="admin_eliminar_usuario"),
     path("gestion/empresas/", views.admin_empresas_view, name="admin_empresas"),
     path("gestion/empresas/<int:user_id>/legajo/", views.admin_empresa_legajo_view, name="admin_empresa_legajo"),
+    path("gestion/empresas/<int:user_id>/grafico/", views.admin_grafico_empresa_view, name="admin_grafico_empresa"),
     path("gestion/empresas/<int:user_id>/editar-perfil/", views.admin_editar_perfil_empresa_view, name="admin_editar_perfil_empresa"),
     path("gestion/empresas/<int:user_id>/mediciones/", views.admin_mediciones_empresa_view, name="admin_mediciones_empresa"),
+    path("gestion/empresas/<int:user_id>/evidencias.zip", views.admin_evidencias_empresa_view, name="admin_evidencias_empresa"),
+    path("gestion/rankings/", views.admin_rankings_view, name="admin_rankings"),
+    path("gestion/anomalias/", views.admin_anomalias_view, name="admin_anomalias"),
+    path("gestion/validacion/", views.admin_validacion_view, name="admin_validacion"),
     path("gestion/mediciones/<int:medicion_id>/validar/", views.admin_validar_medicion_view, name="admin_validar_medicion"),
+    path("gestion/mediciones/<int:medicion_id>/revisar-anomalia/", views.admin_revisar_anomalia_view, name="admin_revisar_anomalia"),
     path("gestion/mediciones/<int:medicion_id>/eliminar/", views.admin_eliminar_medicion_view, name="admin_eliminar_medicion"),
 ]
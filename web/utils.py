@@ -7,7 +7,11 @@ from datetime import datetime
 from io import BytesIO
 import uuid
 import os
+from urllib.parse import urljoin
+
+from django.conf import settings
 from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
 
 
 def extract_exif_metadata(image_file):
@@ -227,3 +231,21 @@ def latlon_to_point_wkt(latitude, longitude):
     # WKT format: POINT(longitude latitude)
     # IMPORTANTE: PostGIS espera (lon, lat), no (lat, lon)
     return f"POINT({longitude} {latitude})"
+
+
+def media_url(name):
+    """
+    URL pública de un archivo guardado en MEDIA_ROOT a partir de su nombre.
+    
+    Equivale a ``FieldFile.url`` con FileSystemStorage pero sin instanciar
+    el storage ni el modelo (útil al iterar ``values_list``).
+    
+    Args:
+        name: Nombre almacenado en el ImageField/FileField (puede ser vacío)
+        
+    Returns:
+        str: URL o None si no hay archivo
+    """
+    if not name:
+        return None
+    return urljoin(settings.MEDIA_URL, filepath_to_uri(name))
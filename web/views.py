@@ -1,10 +1,9 @@
 from pathlib import Path
 from datetime import timedelta
 import logging
-import json
-import csv
 from datetime import datetime
 import uuid
+from decimal import Decimal, InvalidOperation
 
 from django.conf import settings
 from django.contrib import messages
@@ -13,55 +12,88 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import UserPassesTestMixin
 from django.contrib.auth.models import User
 from django.db import models, transaction
-from django.db.models import Max
-from django.http import FileResponse, HttpResponse, HttpResponseNotFound, JsonResponse
+from django.http import FileResponse, HttpResponse, HttpResponseNotFound, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.utils import timezone
 from django.views.generic import DetailView, ListView
 from django.views.decorators.cache import cache_page
+from django.views.decorators.http import require_POST
 from django.core.files.base import ContentFile
 from django.core.files.storage import FileSystemStorage
 from django.db import connection
 from django_ratelimit.decorators import ratelimit
 
-from .models import Medicion
-from .utils import extract_exif_metadata, compress_and_resize_image
+from .models import EmpresaStats, ExportJob, Medicion
+from .utils import extract_exif_metadata, compress_and_resize_image, media_url
+from .geofence import audit_medicion_on_commit
+from .spatial_index import nearest_well
+from .pagination import KeysetPaginator
+from .exports import evidence_bundle, expire_stale_jobs, normalize_export_params, request_export, stream_medicion_csv
+from .zipstream import parse_range
+from .buckets import GRANULARITIES, bucket_stats
+from .charts import DEFAULT_POINTS as DEFAULT_CHART_POINTS, downsampled_series
+from .changefeed import DEFAULT_LIMIT, iter_changes, ndjson
+from .dashboard import recent_mediciones
+from .search import search_empresas, search_mediciones
+from .stats import company_overview, company_queryset
+from . import degraded, weekly
+from .rankings import DEFAULT_LIMIT as RANKING_DEFAULT_LIMIT, METRICS as RANKING_METRICS, RANKING_GRANULARITIES, ranking
 
 logger = logging.getLogger(__name__)
 
+# Segundos sugeridos a los clientes para reintentar si la base no está disponible
+DB_RETRY_AFTER = 30
+
 
 def health_check(request):
-	"""Health check endpoint para monitoring y load balancers"""
+	"""
+	Health check endpoint para monitoring y load balancers.
+
+	Con la base caída pero la caché disponible responde 200 con estado
+	``degraded``: las lecturas se sirven desde la última copia buena
+	(web/degraded.py) y las cargas quedan en la cola offline del dispositivo.
+	"""
+	from django.core.cache import cache
+
+	# Verificar conexión a la base de datos
+	database_error = None
 	try:
-		# Verificar conexión a la base de datos
 		with connection.cursor() as cursor:
 			cursor.execute("SELECT 1")
-		
-		# Verificar que Redis esté disponible (si está configurado)
-		cache_status = 'not_configured'
-		try:
-			from django.core.cache import cache
-			cache.set('health_check', 'ok', 10)
-			if cache.get('health_check') == 'ok':
-				cache_status = 'connected'
-			else:
-				cache_status = 'error'
-		except Exception:
-			cache_status = 'unavailable'
-		
-		return JsonResponse({
-			'status': 'healthy',
-			'database': 'connected',
-			'cache': cache_status,
-			'timestamp': timezone.now().isoformat()
-		})
 	except Exception as e:
 		logger.exception("Health check failed")
-		return JsonResponse({
-			'status': 'unhealthy',
-			'error': str(e),
-			'timestamp': timezone.now().isoformat()
-		}, status=503)
+		database_error = str(e)
+	
+	# Verificar que Redis esté disponible (si está configurado)
+	cache_status = 'not_configured'
+	try:
+		cache.set('health_check', 'ok', 10)
+		if cache.get('health_check') == 'ok':
+			cache_status = 'connected'
+		else:
+			cache_status = 'error'
+	except Exception:
+		cache_status = 'unavailable'
+	
+	if database_error is None:
+		status = 'healthy'
+	elif cache_status == 'connected':
+		status = 'degraded'
+	else:
+		status = 'unhealthy'
+	payload = {
+		'status': status,
+		'database': 'connected' if database_error is None else 'unavailable',
+		'cache': cache_status,
+		'timestamp': timezone.now().isoformat()
+	}
+	if database_error is not None:
+		payload['error'] = database_error
+	# Aciertos por nivel de la caché en dos niveles (solo de este worker)
+	if hasattr(cache, 'stats'):
+		payload['cache_tiers'] = cache.stats()
+	return JsonResponse(payload, status=503 if status == 'unhealthy' else 200)
 
 
 @ratelimit(key='ip', rate='5/m', block=True)
@@ -77,9 +109,6 @@ def login_view(request):
 		user = authenticate(request, username=username, password=password)
 		if user is not None:
 			login(request, user)
-			# Limpiar caché del usuario al hacer login
-			from django.core.cache import cache
-			cache.delete(f'dashboard_mediciones_{user.id}')
 			return redirect('dashboard')
 		else:
 			messages.error(request, 'Usuario o contraseña incorrectos')
@@ -89,9 +118,6 @@ def login_view(request):
 
 def logout_view(request):
 	"""Vista para cerrar sesión"""
-	# Limpiar caché del usuario al cerrar sesión
-	from django.core.cache import cache
-	cache.delete(f'dashboard_mediciones_{request.user.id}')
 	logout(request)
 	messages.success(request, 'Sesión cerrada correctamente')
 	return redirect('login')
@@ -100,15 +126,16 @@ def logout_view(request):
 @login_required
 def dashboard(request):
 	"""Dashboard del operario con sus últimas mediciones"""
-	if request.user.is_staff:
-		# Si es staff, mostrar últimas mediciones de todas las empresas
-		mediciones = Medicion.objects.select_related('user').all().order_by('-timestamp')[:10]
-	else:
-		# Si es operario, mostrar solo sus mediciones
-		mediciones = Medicion.objects.filter(user=request.user).order_by('-timestamp')[:5]
-	
+	# Staff ve las últimas de todas las empresas; el operario, solo las suyas (cacheadas, ver web/dashboard.py)
+	try:
+		mediciones, stale_as_of = recent_mediciones(request.user)
+		db_unavailable = False
+	except degraded.Unavailable:
+		mediciones, stale_as_of, db_unavailable = [], None, True
 	context = {
 		'mediciones': mediciones,
+		'stale_as_of': stale_as_of,
+		'db_unavailable': db_unavailable,
 	}
 	return render(request, "web/dashboard.html", context)
 
@@ -218,14 +245,26 @@ def cargar_medicion(request):
 								save=False
 							)
 
-							# Guardar timestamp EXIF si existe (coordenadas fijas por empresa)
+							# Guardar timestamp EXIF si existe
 							if metadata.get('timestamp') is not None:
 								medicion.captured_at = metadata['timestamp']
 
-							medicion.save(update_fields=[
-								"photo",
-								"captured_at"
-							])
+							update_fields = ["photo", "captured_at"]
+
+							# Posición real desde el GPS del EXIF y pozo más cercano
+							gps_lat = metadata.get('latitude')
+							gps_lon = metadata.get('longitude')
+							if gps_lat is not None and gps_lon is not None and (gps_lat, gps_lon) != (0, 0):
+								medicion.captured_latitude = gps_lat
+								medicion.captured_longitude = gps_lon
+								update_fields += ["captured_latitude", "captured_longitude"]
+
+								match = nearest_well(gps_lat, gps_lon)
+								if match is not None:
+									medicion.matched_perfil_id, _, medicion.matched_distance_m = match
+									update_fields += ["matched_perfil", "matched_distance_m"]
+
+							medicion.save(update_fields=update_fields)
 						except Exception:
 							logger.exception("Error finalizando carga de foto", extra={"user_id": request.user.id})
 							# Si falla el guardado del archivo, eliminar el registro
@@ -239,6 +278,9 @@ def cargar_medicion(request):
 								pass
 
 					transaction.on_commit(finalize_photo_upload)
+
+				# Auditoría de geocerca tras la ingesta (y tras adjuntar la foto)
+				transaction.on_commit(lambda: audit_medicion_on_commit(medicion.id))
 			
 			# Para solicitudes AJAX/fetch, devolver JSON en lugar de redirigir
 			if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', ''):
@@ -251,6 +293,24 @@ def cargar_medicion(request):
 			messages.success(request, 'Medición guardada exitosamente')
 			return redirect('dashboard')
 		
+		except degraded.DB_ERRORS:
+			# Base caída o en mantenimiento: el cliente deja la medición en su cola offline y reintenta
+			logger.exception("Base de datos no disponible en cargar_medicion", extra={"user_id": request.user.id})
+			try:
+				if temp_storage and temp_name and temp_storage.exists(temp_name):
+					temp_storage.delete(temp_name)
+			except Exception:
+				pass
+			if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', ''):
+				response = JsonResponse({
+					'success': False,
+					'retry': True,
+					'message': 'Servidor en mantenimiento: la medición quedó guardada en el dispositivo y se enviará sola'
+				}, status=503)
+				response['Retry-After'] = DB_RETRY_AFTER
+				return response
+			messages.error(request, 'El servidor está en mantenimiento. Intente nuevamente en unos minutos.')
+			return redirect('cargar')
 		except ValueError as e:
 			logger.warning("Error de validación en cargar_medicion", extra={"error": str(e), "user_id": request.user.id})
 			print(f"[DEBUG] ValueError: {str(e)}")
@@ -308,94 +368,175 @@ def get_weekly_route_data(request):
 	"""
 	from django.http import JsonResponse
 	
-	# Obtener rango de fechas (default: semana actual)
-	today = timezone.now().date()
-	week_start = today - timedelta(days=today.weekday())  # Lunes
-	week_end = week_start + timedelta(days=6)  # Domingo
+	# Rango de fechas (default: semana actual); cacheado por alcance y versión (ver web/weekly.py)
+	week_start, week_end = weekly.week_range(request.GET.get('start_date'), request.GET.get('end_date'))
+	try:
+		data = weekly.route_data(request.user, week_start, week_end)
+	except degraded.Unavailable:
+		response = JsonResponse({'error': 'Base de datos no disponible'}, status=503)
+		response['Retry-After'] = DB_RETRY_AFTER
+		return response
+	response = JsonResponse(data)
+	if data['properties'].get('stale'):
+		response['X-Data-Stale'] = data['properties']['stale_as_of']
+	return response
+
+
+# Campos expuestos por /api/mediciones/ (nombre público -> campo ORM)
+API_MEDICION_FIELDS = {
+	'id': 'id',
+	'timestamp': 'timestamp',
+	'value': 'value',
+	'user': 'user_id',
+	'username': 'user__username',
+	'ubicacion': 'ubicacion_manual',
+	'observation': 'observation',
+	'is_valid': 'is_valid',
+	'photo_url': 'photo',
+	'captured_latitude': 'captured_latitude',
+	'captured_longitude': 'captured_longitude',
+	'captured_at': 'captured_at',
+	'uploaded_at': 'uploaded_at',
+	'target_latitude': 'target_latitude',
+	'target_longitude': 'target_longitude',
+	'geofence_distance_m': 'geofence_distance_m',
+	'is_out_of_range': 'is_out_of_range',
+	'delta_value': 'delta_value',
+	'delta_hours': 'delta_hours',
+	'consumption_rate': 'consumption_rate',
+}
+API_MEDICION_DEFAULT_FIELDS = ['id', 'timestamp', 'value', 'username', 'is_valid', 'ubicacion']
+API_MAX_LIMIT = 1000
+
+
+def _parse_datetime_param(value):
+	"""
+	Parsear YYYY-MM-DD o fecha ISO 8601.
+
+	Returns:
+		tuple: (datetime aware o None, es_solo_fecha)
+	"""
+	from django.utils.dateparse import parse_date, parse_datetime
 	
-	# Parámetros opcionales
-	start_date_param = request.GET.get('start_date')
-	end_date_param = request.GET.get('end_date')
+	if not value:
+		return None, False
+	# parse_datetime también acepta "YYYY-MM-DD": probar primero solo fecha
+	day = parse_date(value) if len(value) == 10 else None
+	if day is not None:
+		parsed = datetime.combine(day, datetime.min.time())
+	else:
+		parsed = parse_datetime(value)
+		if parsed is None:
+			raise ValueError(f"Fecha inválida: {value}")
+	date_only = day is not None
+	if timezone.is_naive(parsed):
+		parsed = timezone.make_aware(parsed)
+	return parsed, date_only
+
+
+def _filtered_mediciones(request):
+	"""
+	Queryset de mediciones con el alcance del usuario y los filtros comunes
+	(user, is_valid, start_date, end_date, q). Lanza ValueError si un filtro es inválido.
+	"""
+	if request.user.is_staff:
+		queryset = Medicion.objects.all()
+		user_id = request.GET.get('user')
+		if user_id:
+			queryset = queryset.filter(user_id=int(user_id))
+	else:
+		# Operarios solo ven sus propias mediciones
+		queryset = Medicion.objects.filter(user=request.user)
 	
-	if start_date_param:
-		try:
-			week_start = datetime.strptime(start_date_param, '%Y-%m-%d').date()
-		except ValueError:
-			pass
+	is_valid = request.GET.get('is_valid')
+	if is_valid:
+		if is_valid.lower() not in ('true', 'false', '1', '0'):
+			raise ValueError("is_valid debe ser true o false")
+		queryset = queryset.filter(is_valid=is_valid.lower() in ('true', '1'))
 	
-	if end_date_param:
-		try:
-			week_end = datetime.strptime(end_date_param, '%Y-%m-%d').date()
-		except ValueError:
-			pass
+	start, _ = _parse_datetime_param(request.GET.get('start_date'))
+	if start:
+		queryset = queryset.filter(timestamp__gte=start)
+	end, end_date_only = _parse_datetime_param(request.GET.get('end_date'))
+	if end and end_date_only:
+		# Solo fecha: incluir el día completo
+		queryset = queryset.filter(timestamp__lt=end + timedelta(days=1))
+	elif end:
+		queryset = queryset.filter(timestamp__lte=end)
+	# Texto libre: ubicación, observaciones y empresa (ver web/search.py)
+	return search_mediciones(queryset, request.GET.get('q'))
+
+
+@login_required
+def api_mediciones(request):
+	"""
+	API JSON de solo lectura de mediciones con paginación por cursor.
+	Parámetros: fields, user (staff), is_valid, start_date, end_date, q, limit, cursor
+	"""
+	fields_param = request.GET.get('fields')
+	fields = [f.strip() for f in fields_param.split(',') if f.strip()] if fields_param else API_MEDICION_DEFAULT_FIELDS
+	unknown = [f for f in fields if f not in API_MEDICION_FIELDS]
+	if unknown:
+		return JsonResponse({'error': f"Campos desconocidos: {', '.join(unknown)}"}, status=400)
 	
-	# Determinar si el usuario actual es staff o regular
-	from django.db.models import Q
-	coords_filter = Q(captured_latitude__isnull=False, captured_longitude__isnull=False) | Q(target_latitude__isnull=False, target_longitude__isnull=False)
+	try:
+		limit = min(max(int(request.GET.get('limit', 100)), 1), API_MAX_LIMIT)
+		queryset = _filtered_mediciones(request)
+	except ValueError as e:
+		return JsonResponse({'error': str(e)}, status=400)
 	
-	if request.user.is_staff:
-		# Staff ve todas las mediciones de la semana
-		mediciones = Medicion.objects.filter(
-			timestamp__date__gte=week_start,
-			timestamp__date__lte=week_end,
-		).filter(coords_filter).select_related('user').only(
-			'id', 'captured_latitude', 'captured_longitude',
-			'target_latitude', 'target_longitude',
-			'ubicacion_manual', 'value', 'timestamp', 'user__username'
-		).order_by('-timestamp')
-	else:
-		# Usuario regular solo ve sus propias mediciones
-		mediciones = Medicion.objects.filter(
-			user=request.user,
-			timestamp__date__gte=week_start,
-			timestamp__date__lte=week_end,
-		).filter(coords_filter).only(
-			'id', 'captured_latitude', 'captured_longitude',
-			'target_latitude', 'target_longitude',
-			'ubicacion_manual', 'value', 'timestamp'
-		).order_by('-timestamp')
-	
-	# Construir GeoJSON FeatureCollection
-	features = []
-	for medicion in mediciones:
-		lat = medicion.captured_latitude
-		lon = medicion.captured_longitude
-		if lat is None or lon is None or lat == 0 or lon == 0:
-			lat = medicion.target_latitude
-			lon = medicion.target_longitude
-		if lat is None or lon is None or lat == 0 or lon == 0:
-			continue
-		
-		feature = {
-			"type": "Feature",
-			"geometry": {
-				"type": "Point",
-				"coordinates": [lon, lat]
-			},
-			"properties": {
-				"id": medicion.id,
-				"popup_title": medicion.timestamp.strftime('%d/%m %H:%M') + "hs",
-				"operator_name": medicion.user.username,
-				"value": str(medicion.value),
-				"ubicacion": medicion.ubicacion_manual or "Sin ubicación",
-				"detail_url": f"/gestion/empresas/{medicion.user.id}/mediciones/",
-				"is_valid": medicion.is_valid
-			}
-		}
-		features.append(feature)
-	
-	# GeoJSON FeatureCollection
-	geojson_data = {
-		"type": "FeatureCollection",
-		"features": features,
-		"properties": {
-			"week_start": week_start.isoformat(),
-			"week_end": week_end.isoformat(),
-			"count": len(features)
-		}
-	}
+	# Sin instancias de modelo: solo las columnas pedidas (+ id/timestamp para el cursor)
+	orm_fields = {API_MEDICION_FIELDS[f] for f in fields} | {'id', 'timestamp'}
+	queryset = queryset.values(*orm_fields)
+	page = KeysetPaginator(queryset, limit).get_page(request.GET.get('cursor'))
+	
+	results = []
+	for row in page:
+		item = {name: row[API_MEDICION_FIELDS[name]] for name in fields}
+		if 'photo_url' in item:
+			item['photo_url'] = media_url(item['photo_url'])
+		results.append(item)
+	
+	return JsonResponse({
+		'results': results,
+		'count': len(results),
+		'next_cursor': page.next_cursor,
+		'previous_cursor': page.previous_cursor,
+	})
+
+
+# Resultados por búsqueda en /api/empresas/
+API_EMPRESAS_LIMIT = 50
+
+
+@login_required
+def api_empresas(request):
+	"""
+	Búsqueda de empresas por nombre o ubicación del pozo (solo staff), las más parecidas primero.
+	Parámetros: q (obligatorio), limit
+	"""
+	if not request.user.is_staff:
+		return JsonResponse({'error': 'No autorizado'}, status=403)
+	query = request.GET.get('q', '').strip()
+	if not query:
+		return JsonResponse({'error': 'q es obligatorio'}, status=400)
+	try:
+		limit = min(max(int(request.GET.get('limit', API_EMPRESAS_LIMIT)), 1), API_EMPRESAS_LIMIT)
+	except ValueError:
+		return JsonResponse({'error': 'limit debe ser un entero'}, status=400)
 	
-	return JsonResponse(geojson_data)
+	results = []
+	for empresa in search_empresas(company_queryset(), query)[:limit]:
+		perfil = getattr(empresa, 'empresa_perfil', None)
+		results.append({
+			'id': empresa.id,
+			'username': empresa.username,
+			'ubicacion': perfil.ubicacion if perfil else None,
+			'total_mediciones': empresa.total_mediciones,
+			'ultima_medicion': empresa.latest_measurement,
+			'similarity': empresa.search_similarity,
+		})
+	return JsonResponse({'results': results, 'count': len(results)})
 
 
 @login_required
@@ -406,6 +547,105 @@ def weekly_route(request):
 	return render(request, "web/weekly_route.html")
 
 
+# Rango por defecto y máximo de períodos por consulta de /api/consumo/
+CONSUMO_DEFAULT_SPAN = {
+	'hour': timedelta(hours=48),
+	'day': timedelta(days=90),
+	'week': timedelta(weeks=52),
+	'month': timedelta(days=3 * 365),
+}
+CONSUMO_PERIOD = {'hour': timedelta(hours=1), 'day': timedelta(days=1), 'week': timedelta(weeks=1), 'month': timedelta(days=28)}
+CONSUMO_MAX_BUCKETS = 2000
+
+
+@login_required
+def api_consumo(request):
+	"""
+	Consumo agregado por período (count, avg, min, max, primera/última lectura).
+	Parámetros: granularity (hour|day|week|month), user (staff; sin user = todas), start_date, end_date
+	"""
+	granularity = request.GET.get('granularity', 'day')
+	if granularity not in GRANULARITIES:
+		return JsonResponse({'error': f"granularity debe ser uno de: {', '.join(GRANULARITIES)}"}, status=400)
+	
+	try:
+		end, end_date_only = _parse_datetime_param(request.GET.get('end_date'))
+		if end and end_date_only:
+			end += timedelta(days=1)
+		end = end or timezone.now()
+		start, _ = _parse_datetime_param(request.GET.get('start_date'))
+		start = start or end - CONSUMO_DEFAULT_SPAN[granularity]
+		user_id = int(request.GET['user']) if request.user.is_staff and request.GET.get('user') else None
+	except ValueError as e:
+		return JsonResponse({'error': str(e)}, status=400)
+	if not request.user.is_staff:
+		# Operarios solo ven su propio consumo
+		user_id = request.user.id
+	if (end - start) / CONSUMO_PERIOD[granularity] > CONSUMO_MAX_BUCKETS:
+		return JsonResponse({'error': f"El rango supera {CONSUMO_MAX_BUCKETS} períodos; usá una granularidad mayor"}, status=400)
+	
+	buckets = [
+		{
+			'start': row['start'],
+			'count': row['count'],
+			'avg': float(row['avg']),
+			'min': float(row['minimo']),
+			'max': float(row['maximo']),
+			'first': {'at': row['first_at'], 'value': float(row['first_value'])},
+			'last': {'at': row['last_at'], 'value': float(row['last_value'])},
+			'consumo': float(row['consumo']),
+		}
+		for row in bucket_stats(granularity, user_id=user_id, start=start, end=end)
+	]
+	return JsonResponse({'granularity': granularity, 'user': user_id, 'buckets': buckets})
+
+
+def _ranking_from_request(request):
+	"""Ranking según metric, granularity, period (fecha dentro del período) y limit. Lanza ValueError."""
+	period, _ = _parse_datetime_param(request.GET.get('period'))
+	return ranking(
+		request.GET.get('metric', 'consumo'),
+		granularity=request.GET.get('granularity', 'month'),
+		start=period,
+		limit=int(request.GET.get('limit', RANKING_DEFAULT_LIMIT)),
+	)
+
+
+@login_required
+def api_rankings(request):
+	"""
+	Ranking de empresas (top-N con percentil) para un período.
+	Parámetros: metric (consumo|lecturas|atraso), granularity (day|week|month), period (YYYY-MM-DD), limit
+	"""
+	if not request.user.is_staff:
+		return JsonResponse({'error': 'No autorizado'}, status=403)
+	try:
+		return JsonResponse(_ranking_from_request(request))
+	except ValueError as e:
+		return JsonResponse({'error': str(e)}, status=400)
+
+
+@login_required
+def api_cambios(request):
+	"""
+	Feed incremental de cambios de mediciones en NDJSON.
+	Parámetros: since (último seq recibido), limit, user (staff)
+	"""
+	try:
+		since = int(request.GET.get('since', 0))
+		limit = min(max(int(request.GET.get('limit', DEFAULT_LIMIT)), 1), 100000)
+		user_id = int(request.GET['user']) if request.user.is_staff and request.GET.get('user') else None
+	except ValueError:
+		return JsonResponse({'error': 'since, limit y user deben ser enteros'}, status=400)
+	if not request.user.is_staff:
+		# Operarios solo reciben cambios de sus propias mediciones
+		user_id = request.user.id
+	
+	response = StreamingHttpResponse(ndjson(iter_changes(since, limit=limit, user_id=user_id)), content_type='application/x-ndjson')
+	response['Cache-Control'] = 'no-store'
+	return response
+
+
 @login_required
 def api_docs(request):
 	"""Vista simple de documentación de endpoints"""
@@ -428,7 +668,7 @@ def admin_usuarios_view(request):
 		return redirect('dashboard')
 	
 	usuarios = User.objects.annotate(
-		latest_measurement=Max('mediciones__timestamp')
+		latest_measurement=models.F('stats__ultima_medicion')
 	).order_by('-latest_measurement')
 	
 	return render(request, 'web/admin_usuarios.html', {'usuarios': usuarios})
@@ -516,16 +756,24 @@ def admin_empresas_view(request):
 	if not request.user.is_staff:
 		return redirect('dashboard')
 	
-	from django.db.models import Count
-	empresas = User.objects.filter(
-		is_staff=False, 
-		is_superuser=False
-	).select_related('empresa_perfil').annotate(
-		total_mediciones=Count('mediciones'),
-		latest_measurement=Max('mediciones__timestamp')
-	).order_by('-latest_measurement')
+	query = request.GET.get('q', '').strip()
+	if query:
+		# Búsqueda por nombre o pozo, con índice trigram en PostgreSQL (ver web/search.py)
+		empresas, stale_as_of, db_unavailable = search_empresas(company_queryset(), query), None, False
+	else:
+		# EmpresaStats cacheada, con última copia buena si la base no responde (ver web/stats.py)
+		try:
+			empresas, stale_as_of = company_overview()
+			db_unavailable = False
+		except degraded.Unavailable:
+			empresas, stale_as_of, db_unavailable = [], None, True
 	
-	return render(request, 'web/admin_empresas.html', {'empresas': empresas})
+	return render(request, 'web/admin_empresas.html', {
+		'empresas': empresas,
+		'query': query,
+		'stale_as_of': stale_as_of,
+		'db_unavailable': db_unavailable,
+	})
 
 
 @login_required
@@ -534,25 +782,16 @@ def admin_empresa_legajo_view(request, user_id):
 	if not request.user.is_staff:
 		return redirect('dashboard')
 	
-	from django.db.models import Count, Avg, Min, Max
-	from django.core.paginator import Paginator
-	
-	empresa = get_object_or_404(User.objects.select_related('empresa_perfil'), id=user_id, is_staff=False)
+	empresa = get_object_or_404(User.objects.select_related('empresa_perfil', 'stats'), id=user_id, is_staff=False)
 	
 	# Usar queryset base para evitar duplicación
 	mediciones_qs = Medicion.objects.filter(user=empresa).select_related('user')
 	
-	# Estadísticas avanzadas (una sola query)
-	stats = mediciones_qs.aggregate(
-		total=Count('id'),
-		validadas=Count('id', filter=models.Q(is_valid=True)),
-		pendientes=Count('id', filter=models.Q(is_valid=False)),
-		promedio=Avg('value'),
-		minimo=Min('value'),
-		maximo=Max('value'),
-		primera_medicion=Min('timestamp'),
-		ultima_medicion=Max('timestamp')
-	)
+	# Estadísticas precalculadas (EmpresaStats, mantenida por señales)
+	try:
+		stats = empresa.stats.as_dict()
+	except EmpresaStats.DoesNotExist:
+		stats = EmpresaStats(user=empresa).as_dict()
 	
 	# Calcular porcentaje de validación
 	if stats['total'] > 0:
@@ -562,24 +801,16 @@ def admin_empresa_legajo_view(request, user_id):
 		stats['porcentaje_validadas'] = 0
 		stats['umbral_pendientes'] = 0
 	
-	# Preparar datos para Chart.js - Últimas 20 mediciones (queryset optimizado sin relaciones)
-	chart_mediciones = Medicion.objects.filter(user=empresa).only('timestamp', 'value').order_by('timestamp')[:20]
-	chart_labels = [med.timestamp.strftime('%d/%m %H:%M') for med in chart_mediciones]
-	chart_data = [float(med.value) for med in chart_mediciones]
-	
-	# Paginación de mediciones (10 por página para mejorar rendimiento)
-	mediciones_list = mediciones_qs.order_by('-timestamp')
-	paginator = Paginator(mediciones_list, 10)
-	page_number = request.GET.get('page', 1)
-	mediciones = paginator.get_page(page_number)
+	# Paginación por cursor (10 por página, sin COUNT ni OFFSET)
+	paginator = KeysetPaginator(mediciones_qs, 10)
+	mediciones = paginator.get_page(request.GET.get('cursor'))
 	
 	context = {
 		'empresa': empresa,
 		'mediciones': mediciones,
 		'stats': stats,
-		'chart_labels': json.dumps(chart_labels),
-		'chart_data': json.dumps(chart_data),
-		'has_chart_data': len(chart_data) > 0,
+		# El gráfico se carga aparte desde admin_grafico_empresa (historial completo reducido con LTTB)
+		'has_chart_data': stats['total'] > 0,
 	}
 	return render(request, 'web/admin_empresa_legajo.html', context)
 
@@ -590,21 +821,68 @@ def admin_mediciones_empresa_view(request, user_id):
 	if not request.user.is_staff:
 		return redirect('dashboard')
 	
-	from django.core.paginator import Paginator
-	
 	empresa = get_object_or_404(User.objects.select_related('empresa_perfil'), id=user_id, is_staff=False)
-	mediciones_qs = Medicion.objects.filter(user=empresa).select_related('user').order_by('-timestamp')
+	mediciones_qs = Medicion.objects.filter(user=empresa).select_related('user')
 	
-	paginator = Paginator(mediciones_qs, 20)
-	page_number = request.GET.get('page', 1)
-	mediciones = paginator.get_page(page_number)
+	# Filtro "capturadas lejos del pozo" (usa el índice parcial de is_out_of_range)
+	solo_fuera_de_rango = request.GET.get('fuera_de_rango') == '1'
+	if solo_fuera_de_rango:
+		mediciones_qs = mediciones_qs.filter(is_out_of_range=True)
+	
+	# Paginación por cursor sobre (timestamp, id): páginas profundas cuestan lo mismo que la primera
+	paginator = KeysetPaginator(mediciones_qs, 20)
+	mediciones = paginator.get_page(request.GET.get('cursor'), with_total=True)
 	
 	return render(request, 'web/admin_mediciones_empresa.html', {
 		'mediciones': mediciones,
-		'empresa': empresa
+		'empresa': empresa,
+		'solo_fuera_de_rango': solo_fuera_de_rango,
 	})
 
 
+@login_required
+def admin_evidencias_empresa_view(request, user_id):
+	"""Descargar en ZIP el CSV y las fotos de una empresa (con soporte de Range para retomar)"""
+	if not request.user.is_staff:
+		return redirect('dashboard')
+	
+	empresa = get_object_or_404(User, id=user_id, is_staff=False)
+	try:
+		params = normalize_export_params(
+			user_id=empresa.id,
+			start_date=request.GET.get('desde'),
+			end_date=request.GET.get('hasta'),
+		)
+	except ValueError as e:
+		messages.error(request, str(e))
+		return redirect('admin_mediciones_empresa', user_id=empresa.id)
+	
+	bundle, etag = evidence_bundle(params)
+	
+	# Range solo aplica si el archivo no cambió desde la descarga anterior
+	byte_range = parse_range(request.headers.get('Range'), bundle.size)
+	if_range = request.headers.get('If-Range')
+	if if_range and if_range != etag:
+		byte_range = None
+	if byte_range is False:
+		response = HttpResponse(status=416)
+		response['Content-Range'] = f'bytes */{bundle.size}'
+		return response
+	
+	start, end = byte_range or (0, bundle.size)
+	response = StreamingHttpResponse(bundle.iter_bytes(start, end), content_type='application/zip', status=206 if byte_range else 200)
+	if byte_range:
+		response['Content-Range'] = f'bytes {start}-{end - 1}/{bundle.size}'
+	response['Content-Length'] = str(end - start)
+	response['Accept-Ranges'] = 'bytes'
+	response['ETag'] = etag
+	
+	periodo = '_'.join(filter(None, [params['start_date'], params['end_date']]))
+	filename = f"evidencias_{empresa.username}{'_' + periodo if periodo else ''}.zip"
+	response['Content-Disposition'] = f'attachment; filename="{filename}"'
+	return response
+
+
 @login_required
 def admin_validar_medicion_view(request, medicion_id):
 	"""Validar una medición"""
@@ -642,6 +920,212 @@ def admin_eliminar_medicion_view(request, medicion_id):
 	return redirect('admin_empresas')
 
 
+@login_required
+def admin_rankings_view(request):
+	"""Rankings entre empresas por período (consumo, lecturas, atraso)"""
+	if not request.user.is_staff:
+		return redirect('dashboard')
+	
+	try:
+		resultado = _ranking_from_request(request)
+	except ValueError as e:
+		messages.error(request, str(e))
+		resultado = ranking('consumo')
+	
+	return render(request, 'web/admin_rankings.html', {
+		'ranking': resultado,
+		'metricas': RANKING_METRICS,
+		'granularidades': RANKING_GRANULARITIES,
+		'periodo': request.GET.get('period', ''),
+	})
+
+
+ANOMALIA_ESTADOS = ('pendientes', 'revisadas', 'todas')
+
+
+@login_required
+def admin_anomalias_view(request):
+	"""Cola de revisión de anomalías detectadas por ``detectar_anomalias``"""
+	if not request.user.is_staff:
+		return redirect('dashboard')
+	
+	# Índice parcial sobre anomaly_flags > 0: la cola no recorre las mediciones normales
+	mediciones_qs = Medicion.objects.filter(anomaly_flags__gt=0).select_related('user')
+	
+	estado = request.GET.get('estado', 'pendientes')
+	if estado not in ANOMALIA_ESTADOS:
+		estado = 'pendientes'
+	if estado != 'todas':
+		mediciones_qs = mediciones_qs.filter(anomaly_reviewed=(estado == 'revisadas'))
+	
+	tipo = request.GET.get('tipo', '')
+	if tipo.isdigit() and int(tipo) in dict(Medicion.ANOMALIA_CHOICES):
+		mediciones_qs = mediciones_qs.annotate(
+			anomaly_match=models.F('anomaly_flags').bitand(int(tipo))
+		).filter(anomaly_match__gt=0)
+	else:
+		tipo = ''
+	
+	empresa = request.GET.get('empresa', '')
+	if empresa.isdigit():
+		mediciones_qs = mediciones_qs.filter(user_id=int(empresa))
+	else:
+		empresa = ''
+	
+	try:
+		puntaje_min = float(request.GET.get('puntaje_min') or 0)
+	except ValueError:
+		puntaje_min = 0
+	if puntaje_min > 0:
+		mediciones_qs = mediciones_qs.filter(anomaly_score__gte=puntaje_min)
+	
+	paginator = KeysetPaginator(mediciones_qs, 20)
+	mediciones = paginator.get_page(request.GET.get('cursor'), with_total=True)
+	
+	filtros = request.GET.copy()
+	filtros.pop('cursor', None)
+	return render(request, 'web/admin_anomalias.html', {
+		'mediciones': mediciones,
+		'tipos': Medicion.ANOMALIA_CHOICES,
+		'empresas': User.objects.filter(anomaly_scan__flagged__gt=0).order_by('username').only('id', 'username'),
+		'estados': ANOMALIA_ESTADOS,
+		'filtros': {'estado': estado, 'tipo': tipo, 'empresa': empresa, 'puntaje_min': request.GET.get('puntaje_min', '')},
+		'querystring': filtros.urlencode(),
+	})
+
+
+@login_required
+@require_POST
+def admin_revisar_anomalia_view(request, medicion_id):
+	"""Marcar una anomalía como revisada (o devolverla a la cola)"""
+	if not request.user.is_staff:
+		return redirect('dashboard')
+	
+	# update(): las banderas son internas, no pasan por full_clean ni por el feed de cambios
+	revisada = request.POST.get('revisada', '1') == '1'
+	updated = Medicion.objects.filter(id=medicion_id, anomaly_flags__gt=0).update(anomaly_reviewed=revisada)
+	if not updated:
+		return HttpResponseNotFound()
+	messages.success(request, 'Anomalía marcada como revisada' if revisada else 'Anomalía devuelta a la cola')
+	
+	next_url = request.POST.get('next', '')
+	if next_url:
+		return redirect(next_url)
+	return redirect('admin_anomalias')
+
+
+# Lecturas por página de la cola de validación (y máximo de la API)
+VALIDACION_PAGE_SIZE = 20
+VALIDACION_MAX_LIMIT = 100
+
+
+def _validation_queue(request, per_page):
+	"""
+	Página de lecturas pendientes de validar de todas las empresas, la más antigua primero.
+
+	Recorre el índice parcial ``is_valid = false`` con cursor, así que el costo depende
+	de la página y no del tamaño de la tabla. Parámetros: user (opcional), cursor.
+
+	Returns:
+		tuple: (página, total pendiente según ``EmpresaStats``, URLs de fotos de la página siguiente)
+	"""
+	user = request.GET.get('user', '')
+	if user and not user.isdigit():
+		raise ValueError('user debe ser un entero')
+	# Las lecturas sin empresa no entran en ``EmpresaStats``: se excluyen para que la cola y el total coincidan
+	queryset = Medicion.objects.filter(is_valid=False, user__isnull=False)
+	stats = EmpresaStats.objects.all()
+	if user:
+		queryset = queryset.filter(user_id=int(user))
+		stats = stats.filter(user_id=int(user))
+	
+	page = KeysetPaginator(queryset.select_related('user'), per_page, ascending=True).get_page(request.GET.get('cursor'))
+	# Sin COUNT(*) sobre mediciones: el rollup ya lleva las pendientes por empresa
+	pendientes = stats.aggregate(total=models.Sum('pendientes'))['total'] or 0
+	
+	# Fotos del lote siguiente, para que el navegador las precargue mientras se revisa este
+	next_photos = []
+	if page.next_cursor:
+		upcoming = KeysetPaginator(queryset.values('id', 'timestamp', 'photo'), per_page, ascending=True).get_page(page.next_cursor)
+		next_photos = [media_url(row['photo']) for row in upcoming if row['photo']]
+	return page, pendientes, next_photos
+
+
+@login_required
+def admin_validacion_view(request):
+	"""Cola de validación: pendientes de todas las empresas, la más antigua primero"""
+	if not request.user.is_staff:
+		return redirect('dashboard')
+	
+	try:
+		mediciones, pendientes, next_photos = _validation_queue(request, VALIDACION_PAGE_SIZE)
+	except ValueError as e:
+		messages.error(request, str(e))
+		return redirect('admin_validacion')
+	
+	filtros = request.GET.copy()
+	filtros.pop('cursor', None)
+	return render(request, 'web/admin_validacion.html', {
+		'mediciones': mediciones,
+		'pendientes': pendientes,
+		'next_photos': next_photos,
+		'empresas': User.objects.filter(stats__pendientes__gt=0).order_by('username').only('id', 'username'),
+		'empresa': request.GET.get('user', ''),
+		'querystring': filtros.urlencode(),
+	})
+
+
+@login_required
+def api_validacion(request):
+	"""
+	Cola de validación en JSON (solo staff), la más antigua primero.
+	Parámetros: user, limit, cursor. ``next_photos`` trae las fotos de la página siguiente para precargar.
+	"""
+	if not request.user.is_staff:
+		return JsonResponse({'error': 'No autorizado'}, status=403)
+	try:
+		limit = min(max(int(request.GET.get('limit', VALIDACION_PAGE_SIZE)), 1), VALIDACION_MAX_LIMIT)
+		page, pendientes, next_photos = _validation_queue(request, limit)
+	except ValueError as e:
+		return JsonResponse({'error': str(e)}, status=400)
+	
+	return JsonResponse({
+		'results': [
+			{
+				'id': medicion.id,
+				'timestamp': medicion.timestamp,
+				'user': medicion.user_id,
+				'username': medicion.user.username,
+				'value': medicion.value,
+				'ubicacion_manual': medicion.ubicacion_manual,
+				'photo_url': media_url(medicion.photo.name),
+				'is_out_of_range': medicion.is_out_of_range,
+				'anomaly_flags': medicion.anomaly_flags,
+			}
+			for medicion in page
+		],
+		'count': len(page),
+		'pendientes': pendientes,
+		'next_cursor': page.next_cursor,
+		'previous_cursor': page.previous_cursor,
+		'next_photos': next_photos,
+	})
+
+
+@login_required
+def admin_grafico_empresa_view(request, user_id):
+	"""Serie completa de consumo de una empresa reducida con LTTB (JSON para Chart.js)"""
+	if not request.user.is_staff:
+		return JsonResponse({'error': 'No autorizado'}, status=403)
+	
+	empresa = get_object_or_404(User, id=user_id, is_staff=False)
+	try:
+		points = int(request.GET.get('points', DEFAULT_CHART_POINTS))
+	except ValueError:
+		return JsonResponse({'error': 'points debe ser un entero'}, status=400)
+	return JsonResponse(downsampled_series(empresa.id, points))
+
+
 @login_required
 def admin_editar_perfil_empresa_view(request, user_id):
 	"""Editar perfil de empresa (username, email, ubicación y descripción) - solo superusuario"""
@@ -681,19 +1165,15 @@ def admin_editar_perfil_empresa_view(request, user_id):
 		latitude_str = request.POST.get('latitude', '').strip()
 		longitude_str = request.POST.get('longitude', '').strip()
 		
+		geocodificar = False
 		if latitude_str and longitude_str:
 			try:
-				perfil.latitude = float(latitude_str)
-				perfil.longitude = float(longitude_str)
-				perfil.save()
-				
-				# Geocodificación inversa automática
-				location_name = perfil.update_location_from_coordinates()
-				if location_name:
-					messages.success(request, f'Coordenadas actualizadas. Ubicación: {location_name}')
-				else:
-					messages.warning(request, 'Coordenadas guardadas pero no se pudo obtener el nombre de ubicación')
-			except ValueError:
+				nueva_lat = round(Decimal(latitude_str), 6)
+				nueva_lon = round(Decimal(longitude_str), 6)
+				geocodificar = (nueva_lat, nueva_lon) != (perfil.latitude, perfil.longitude) or not perfil.ubicacion
+				perfil.latitude = nueva_lat
+				perfil.longitude = nueva_lon
+			except (InvalidOperation, ValueError):
 				messages.error(request, 'Coordenadas inválidas. Usa formato decimal (ej: -35.4695, -69.5797)')
 		else:
 			# Si no hay coordenadas, permitir ubicación manual
@@ -706,6 +1186,11 @@ def admin_editar_perfil_empresa_view(request, user_id):
 		
 		perfil.save()
 		
+		# Geocodificación inversa en segundo plano (no bloquea el worker)
+		if geocodificar:
+			perfil.schedule_location_update()
+			messages.info(request, 'Coordenadas actualizadas. La ubicación se completará en unos segundos.')
+		
 		messages.success(request, f'Información de {empresa.username} actualizada correctamente')
 		return redirect('admin_empresa_legajo', user_id=empresa.id)
 	
@@ -742,40 +1227,83 @@ def exportar_csv(request):
 			mediciones = Medicion.objects.filter(user=request.user).order_by('-timestamp')
 			filename_suffix = f"_{request.user.username}"
 		
-		# Crear respuesta CSV con encoding utf-8-sig (para soporte de caracteres españoles en Excel)
-		response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-		
 		# Generar nombre de archivo con fecha actual
 		fecha_actual = datetime.now().strftime('%d%m%Y_%H%M%S')
 		filename = f'mediciones{filename_suffix}_{fecha_actual}.csv'
-		response['Content-Disposition'] = f'attachment; filename="{filename}"'
-		
-		# Escribir BOM para UTF-8 (para Excel)
-		response.write('\ufeff')
 		
-		# Crear escritor CSV
-		writer = csv.writer(response)
-		
-		# Escribir encabezados
-		writer.writerow(['Timestamp', 'Usuario (Empresa)', 'Ubicación Manual', 'Valor (m³/h)', 'Foto URL', 'Estado', 'Ubicación GPS', 'Observaciones'])
+		# Respuesta en streaming: las filas se generan a medida que se envían
+		# (BOM UTF-8 incluido para soporte de caracteres españoles en Excel)
+		response = StreamingHttpResponse(stream_medicion_csv(mediciones), content_type='text/csv; charset=utf-8')
+		response['Content-Disposition'] = f'attachment; filename="{filename}"'
 		
-		# Escribir datos de mediciones
-		for medicion in mediciones:
-			writer.writerow([
-				medicion.timestamp.strftime('%d/%m/%Y %H:%M:%S'),
-				medicion.user.username,
-				medicion.ubicacion_manual or '-',
-				medicion.value,
-				medicion.photo.url if medicion.photo else '-',
-				'Validado' if medicion.is_valid else 'Pendiente',
-				f"{medicion.captured_latitude or '-'}, {medicion.captured_longitude or '-'}",
-				medicion.observation or '-'
-			])
-
 		return response
 	except Exception:
 		logger.exception("Error exportando CSV", extra={"user_id": request.user.id})
 		messages.error(request, 'Error al exportar CSV. Inténtalo nuevamente.')
 		return redirect('dashboard')
+
+
+def _can_access_export(user, job):
+	return user.is_staff or job.params.get('user_id') == user.id
+
+
+def _export_job_payload(job):
+	return {
+		'id': job.pk,
+		'status': job.status,
+		'status_display': job.get_status_display(),
+		'progress': job.progress,
+		'processed_rows': job.processed_rows,
+		'total_rows': job.total_rows,
+		'error': job.error or None,
+		'download_url': reverse('descargar_exportacion', args=[job.pk]) if job.status == ExportJob.STATUS_DONE else None,
+	}
+
+
+@login_required
+@require_POST
+def crear_exportacion(request):
+	"""Solicitar una exportación en segundo plano (se deduplica por parámetros)"""
+	# Operarios solo pueden exportar sus propias mediciones
+	user_id = request.POST.get('user_id') if request.user.is_staff else request.user.id
+	try:
+		params = normalize_export_params(
+			user_id=user_id,
+			start_date=request.POST.get('start_date'),
+			end_date=request.POST.get('end_date'),
+			columns=[c.strip() for c in request.POST.get('columns', '').split(',') if c.strip()],
+		)
+		job, created = request_export(params, user=request.user, export_format=request.POST.get('format', 'csv'))
+	except ValueError as e:
+		if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+			return JsonResponse({'error': str(e)}, status=400)
+		messages.error(request, str(e))
+		return redirect('dashboard')
 	
-	return response
+	logger.info("Exportación solicitada", extra={"job_id": job.pk, "job_created": created, "user_id": request.user.id})
+	if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+		return JsonResponse(_export_job_payload(job), status=202)
+	return redirect('estado_exportacion', job_id=job.pk)
+
+
+@login_required
+def estado_exportacion(request, job_id):
+	"""Progreso de una exportación: JSON para polling o página de seguimiento"""
+	job = get_object_or_404(ExportJob, pk=job_id)
+	if not _can_access_export(request.user, job):
+		return HttpResponseNotFound()
+	if job.status in ExportJob.ACTIVE_STATUSES and expire_stale_jobs(job.params_hash):
+		# El worker que lo ejecutaba se detuvo: mostrarlo como fallido en lugar de esperar para siempre
+		job.refresh_from_db()
+	if request.GET.get('format') == 'json':
+		return JsonResponse(_export_job_payload(job))
+	return render(request, 'web/exportacion_estado.html', {'job': job})
+
+
+@login_required
+def descargar_exportacion(request, job_id):
+	"""Descargar el archivo de una exportación terminada"""
+	job = get_object_or_404(ExportJob, pk=job_id, status=ExportJob.STATUS_DONE)
+	if not _can_access_export(request.user, job) or not job.file:
+		return HttpResponseNotFound()
+	return FileResponse(job.file.open('rb'), as_attachment=True, filename=Path(job.file.name).name)
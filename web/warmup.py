@@ -0,0 +1,137 @@
+"""
+Precalentado de las cachés más pedidas (``manage.py warm_caches``).
+
+Después de cada deploy todas las cachés arrancan vacías y el primer
+usuario de staff paga las consultas del mapa semanal, de la lista de
+empresas y del dashboard. El comando llama a las mismas funciones que
+las vistas, así que llena exactamente las claves que después se leen.
+Lo que ya está en caché y vigente no se recalcula.
+
+Familias:
+
+- ``agregados``: materializa los períodos cerrados de ``web.buckets`` (va
+  primero: los rankings leen de ahí)
+- ``dashboard``: últimas mediciones de staff y de cada usuario activo
+- ``mapa``: ruta de la semana actual de staff y de cada usuario activo
+- ``empresas``: lista de empresas con estadísticas
+- ``rankings``: todos los rankings del período en curso
+- ``graficos``: serie reducida del legajo de cada empresa con mediciones
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import buckets, charts, dashboard, degraded, rankings, stats, weekly
+
+logger = logging.getLogger(__name__)
+
+# Usuarios que iniciaron sesión en estos días se consideran activos
+ACTIVE_DAYS = 30
+
+
+def _active_users(days):
+	return list(User.objects.filter(is_active=True, last_login__gte=timezone.now() - timedelta(days=days)).order_by('id'))
+
+
+def _staff_user():
+	return User.objects.filter(is_staff=True, is_active=True).order_by('id').first()
+
+
+def _per_scope(days, func):
+	# Staff comparte una sola entrada: alcanza con un usuario de staff
+	users = [user for user in _active_users(days) if not user.is_staff]
+	staff = _staff_user()
+	if staff is not None:
+		users.insert(0, staff)
+	return [lambda user=user: func(user) for user in users]
+
+
+def _buckets_tasks(days):
+	return [lambda granularity=granularity: buckets.materialize(granularity) for granularity in buckets.GRANULARITIES]
+
+
+def _dashboard_tasks(days):
+	return _per_scope(days, dashboard.recent_mediciones)
+
+
+def _weekly_tasks(days):
+	week_start, week_end = weekly.week_range()
+	return _per_scope(days, lambda user: weekly.route_data(user, week_start, week_end))
+
+
+def _empresas_tasks(days):
+	return [stats.company_overview]
+
+
+def _rankings_tasks(days):
+	tasks = [lambda: rankings.ranking('atraso')]
+	for metric in rankings.PERIOD_METRICS:
+		for granularity in rankings.RANKING_GRANULARITIES:
+			tasks.append(lambda metric=metric, granularity=granularity: rankings.ranking(metric, granularity))
+	return tasks
+
+
+def _graficos_tasks(days):
+	user_ids = User.objects.filter(is_staff=False, stats__total__gt=0).order_by('id').values_list('id', flat=True)
+	return [lambda user_id=user_id: charts.downsampled_series(user_id) for user_id in user_ids]
+
+
+FAMILIES = {
+	'agregados': _buckets_tasks,
+	'dashboard': _dashboard_tasks,
+	'mapa': _weekly_tasks,
+	'empresas': _empresas_tasks,
+	'rankings': _rankings_tasks,
+	'graficos': _graficos_tasks,
+}
+
+
+def _run(task):
+	try:
+		with degraded.unbounded():
+			task()
+		return True
+	except Exception:
+		logger.exception("Error precalentando caché")
+		return False
+
+
+def _run_in_thread(task):
+	# Cada hilo del pool abre su propia conexión
+	try:
+		return _run(task)
+	finally:
+		close_old_connections()
+
+
+def warm(families=None, workers=4, active_days=ACTIVE_DAYS):
+	"""
+	Precalentar ``families`` (default: todas) con ``workers`` hilos (1: en este hilo).
+
+	Returns:
+		dict: {familia: {'entries': int, 'errors': int, 'seconds': float}}
+	"""
+	executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warm-cache") if workers > 1 else None
+	results = {}
+	try:
+		for family in families or FAMILIES:
+			start = time.monotonic()
+			tasks = FAMILIES[family](active_days)
+			if executor is None:
+				outcomes = [_run(task) for task in tasks]
+			else:
+				outcomes = list(executor.map(_run_in_thread, tasks))
+			results[family] = {
+				'entries': len(outcomes),
+				'errors': outcomes.count(False),
+				'seconds': time.monotonic() - start,
+			}
+	finally:
+		if executor is not None:
+			executor.shutdown()
+	return results
@@ -0,0 +1,116 @@
+"""
+Datos del mapa de ruta semanal (GeoJSON), cacheados por alcance y semana.
+
+Usa las mismas versiones que el dashboard (``web.dashboard.data_version``):
+cualquier cambio en una medición invalida la copia de staff y la de la
+empresa. El recálculo pasa por ``web.singleflight`` y, si la base está
+lenta o caída, se sirve la última copia buena (``web.degraded``).
+"""
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from . import dashboard, degraded
+
+TIMEOUT = 60 * 10
+
+FIELDS = (
+	'id', 'timestamp', 'user_id', 'user__username', 'ubicacion_manual', 'value', 'is_valid',
+	'captured_latitude', 'captured_longitude', 'target_latitude', 'target_longitude',
+)
+
+
+def week_range(start_date=None, end_date=None):
+	"""
+	(lunes, domingo) de la semana actual, con ``start_date``/``end_date`` (YYYY-MM-DD) como reemplazo opcional.
+	Las fechas inválidas se ignoran.
+	"""
+	today = timezone.now().date()
+	week_start = today - timedelta(days=today.weekday())  # Lunes
+	week_end = week_start + timedelta(days=6)  # Domingo
+	if start_date:
+		try:
+			week_start = datetime.strptime(start_date, '%Y-%m-%d').date()
+		except ValueError:
+			pass
+	if end_date:
+		try:
+			week_end = datetime.strptime(end_date, '%Y-%m-%d').date()
+		except ValueError:
+			pass
+	return week_start, week_end
+
+
+def _usable(lat, lon):
+	return lat is not None and lon is not None and lat != 0 and lon != 0
+
+
+def build_geojson(user, week_start, week_end):
+	"""FeatureCollection con las mediciones con coordenadas del rango (todas si ``user`` es staff)."""
+	from .models import Medicion
+
+	coords_filter = Q(captured_latitude__isnull=False, captured_longitude__isnull=False) | Q(target_latitude__isnull=False, target_longitude__isnull=False)
+	mediciones = Medicion.objects.filter(
+		timestamp__date__gte=week_start,
+		timestamp__date__lte=week_end,
+	).filter(coords_filter)
+	if not user.is_staff:
+		# Usuario regular solo ve sus propias mediciones
+		mediciones = mediciones.filter(user=user)
+
+	features = []
+	for row in mediciones.order_by('-timestamp').values(*FIELDS).iterator(chunk_size=2000):
+		lat, lon = row['captured_latitude'], row['captured_longitude']
+		if not _usable(lat, lon):
+			lat, lon = row['target_latitude'], row['target_longitude']
+		if not _usable(lat, lon):
+			continue
+		features.append({
+			"type": "Feature",
+			"geometry": {
+				"type": "Point",
+				"coordinates": [lon, lat]
+			},
+			"properties": {
+				"id": row['id'],
+				"popup_title": row['timestamp'].strftime('%d/%m %H:%M') + "hs",
+				"operator_name": row['user__username'],
+				"value": str(row['value']),
+				"ubicacion": row['ubicacion_manual'] or "Sin ubicación",
+				"detail_url": f"/gestion/empresas/{row['user_id']}/mediciones/",
+				"is_valid": row['is_valid']
+			}
+		})
+
+	return {
+		"type": "FeatureCollection",
+		"features": features,
+		"properties": {
+			"week_start": week_start.isoformat(),
+			"week_end": week_end.isoformat(),
+			"count": len(features)
+		}
+	}
+
+
+def route_data(user, week_start, week_end):
+	"""
+	``build_geojson`` cacheado por alcance (staff o empresa), versión de datos y rango.
+
+	Si se sirvió la última copia buena, ``properties`` lleva ``stale: true`` y ``stale_as_of``.
+
+	Raises:
+		degraded.Unavailable: la base no respondió y no hay copia guardada
+	"""
+	scope = dashboard.scope_for(user)
+	period = f"{week_start.isoformat()}:{week_end.isoformat()}"
+	data, stale_as_of = degraded.read(
+		f"weekly:{scope}:{dashboard.data_version(scope)}:{period}",
+		lambda: build_geojson(user, week_start, week_end),
+		TIMEOUT,
+		f"weekly:{scope}:{period}",
+	)
+	if stale_as_of is not None:
+		data = {**data, "properties": {**data["properties"], "stale": True, "stale_as_of": stale_as_of.isoformat()}}
+	return data
@@ -0,0 +1,245 @@
+"""
+ZIP en streaming, sin compresión (stored), con soporte de rangos HTTP.
+
+Las fotos ya son JPEG comprimidos: guardarlas sin comprimir evita gastar
+CPU y permite conocer de antemano el tamaño exacto del archivo y el offset
+de cada entrada. Con eso cualquier rango de bytes se puede generar sin
+armar el ZIP completo, y una descarga interrumpida se retoma con
+``Range``.
+
+Los CRC32 van en descriptores de datos (bit 3) para no leer cada foto dos
+veces: se calculan mientras se envía su contenido. Si un rango empieza
+después de una foto, su CRC se calcula leyendo el archivo en bloques, sin
+cargarlo entero en memoria. Los CRC ya conocidos se pasan a ``ZipEntry``
+y cada uno que se calcula se informa a ``on_crc`` apenas se conoce, aunque
+la descarga se corte después. El resultado
+es byte a byte idéntico entre pedidos mientras las entradas no cambien.
+"""
+import struct
+import zlib
+
+READ_SIZE = 64 * 1024
+
+ZIP64_LIMIT = 0xFFFFFFFF
+FLAGS = 0x0008 | 0x0800  # descriptor de datos + nombres UTF-8
+VERSION = 20
+VERSION_ZIP64 = 45
+
+
+def dos_datetime(dt):
+	"""(hora, fecha) en formato MS-DOS; fechas anteriores a 1980 se acotan."""
+	if dt.year < 1980:
+		return 0, (0 << 9) | (1 << 5) | 1
+	return (
+		(dt.hour << 11) | (dt.minute << 5) | (dt.second // 2),
+		((dt.year - 1980) << 9) | (dt.month << 5) | dt.day,
+	)
+
+
+class ZipEntry:
+	"""
+	Entrada del ZIP.
+
+	Args:
+		name: ruta dentro del archivo
+		size: tamaño exacto en bytes
+		modified: datetime para la fecha de la entrada
+		data: contenido en memoria (bytes), o
+		opener: callable que devuelve un archivo binario con ``seek``/``read``
+		crc: CRC32 del contenido si ya se conoce
+	"""
+
+	def __init__(self, name, size, modified, data=None, opener=None, crc=None):
+		self.name = name
+		self.encoded_name = name.encode('utf-8')
+		self.size = size
+		self.dos_time, self.dos_date = dos_datetime(modified)
+		self.data = data
+		self.opener = opener
+		self.crc = zlib.crc32(data) if data is not None else crc
+		self.offset = None
+
+	def read(self, start=0, end=None):
+		"""Bloques del contenido entre ``start`` y ``end`` (exclusivo)."""
+		end = self.size if end is None else end
+		if self.data is not None:
+			yield self.data[start:end]
+			return
+		with self.opener() as f:
+			f.seek(start)
+			remaining = end - start
+			while remaining > 0:
+				chunk = f.read(min(READ_SIZE, remaining))
+				if not chunk:
+					raise IOError(f"{self.name}: el archivo es más corto que {self.size} bytes")
+				remaining -= len(chunk)
+				yield chunk
+
+	def compute_crc(self):
+		if self.crc is None:
+			crc = 0
+			for chunk in self.read():
+				crc = zlib.crc32(chunk, crc)
+			self.crc = crc
+		return self.crc
+
+
+class ZipStream:
+	"""
+	ZIP stored de tamaño conocido, generable por rangos.
+
+	``on_crc`` recibe ``{nombre: crc}`` con cada CRC calculado: al terminar de enviar
+	la entrada o, si se calculó para un descriptor o el directorio central, al
+	terminar o cortarse el rango.
+	"""
+
+	def __init__(self, entries, on_crc=None):
+		self.entries = list(entries)
+		self.on_crc = on_crc
+		self._known_crcs = {entry.name for entry in self.entries if entry.crc is not None}
+		self.segments = []
+		offset = 0
+		for entry in self.entries:
+			if entry.size > ZIP64_LIMIT:
+				raise ValueError(f"{entry.name}: entradas de más de 4 GB no soportadas")
+			entry.offset = offset
+			for segment in (
+				('local', entry, 30 + len(entry.encoded_name)),
+				('data', entry, entry.size),
+				('descriptor', entry, 16),
+			):
+				self.segments.append(segment)
+				offset += segment[2]
+		self.central_offset = offset
+		self.central_size = sum(self._central_record_size(entry) for entry in self.entries)
+		self.needs_zip64 = len(self.entries) > 0xFFFF or self.central_offset + self.central_size > ZIP64_LIMIT
+		trailer_size = 22 + (56 + 20 if self.needs_zip64 else 0)
+		self.segments.append(('central', None, self.central_size))
+		self.segments.append(('trailer', None, trailer_size))
+		self.size = offset + self.central_size + trailer_size
+
+	@staticmethod
+	def _central_record_size(entry):
+		extra = 12 if entry.offset > ZIP64_LIMIT else 0
+		return 46 + len(entry.encoded_name) + extra
+
+	def _local_header(self, entry):
+		return struct.pack(
+			'<IHHHHHIIIHH',
+			0x04034b50, VERSION, FLAGS, 0, entry.dos_time, entry.dos_date,
+			0, entry.size, entry.size, len(entry.encoded_name), 0,
+		) + entry.encoded_name
+
+	def _descriptor(self, entry):
+		return struct.pack('<IIII', 0x08074b50, entry.compute_crc(), entry.size, entry.size)
+
+	def _central_record(self, entry):
+		zip64 = entry.offset > ZIP64_LIMIT
+		extra = struct.pack('<HHQ', 0x0001, 8, entry.offset) if zip64 else b''
+		version = VERSION_ZIP64 if zip64 else VERSION
+		return struct.pack(
+			'<IHHHHHHIIIHHHHHII',
+			0x02014b50, version, version, FLAGS, 0, entry.dos_time, entry.dos_date,
+			entry.compute_crc(), entry.size, entry.size, len(entry.encoded_name), len(extra), 0, 0, 0, 0,
+			ZIP64_LIMIT if zip64 else entry.offset,
+		) + entry.encoded_name + extra
+
+	def _trailer(self):
+		count = len(self.entries)
+		parts = []
+		if self.needs_zip64:
+			zip64_offset = self.central_offset + self.central_size
+			parts.append(struct.pack(
+				'<IQHHIIQQQQ',
+				0x06064b50, 44, VERSION_ZIP64, VERSION_ZIP64, 0, 0,
+				count, count, self.central_size, self.central_offset,
+			))
+			parts.append(struct.pack('<IIQI', 0x07064b50, 0, zip64_offset, 1))
+		parts.append(struct.pack(
+			'<IHHHHIIH',
+			0x06054b50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+			min(self.central_size, ZIP64_LIMIT), min(self.central_offset, ZIP64_LIMIT), 0,
+		))
+		return b''.join(parts)
+
+	def _segment_bytes(self, kind, entry, start, end):
+		if kind == 'data':
+			if start == 0 and end == entry.size and entry.crc is None:
+				# Descarga completa de la entrada: calcular el CRC al pasar
+				crc = 0
+				for chunk in entry.read():
+					crc = zlib.crc32(chunk, crc)
+					yield chunk
+				entry.crc = crc
+				self._report_crcs([entry])
+			else:
+				yield from entry.read(start, end)
+			return
+		if kind == 'local':
+			data = self._local_header(entry)
+		elif kind == 'descriptor':
+			data = self._descriptor(entry)
+		elif kind == 'central':
+			data = b''.join(self._central_record(e) for e in self.entries)
+		else:
+			data = self._trailer()
+		yield data[start:end]
+
+	def iter_bytes(self, start=0, end=None):
+		"""Bytes del ZIP entre ``start`` y ``end`` (exclusivo)."""
+		end = self.size if end is None else min(end, self.size)
+		position = 0
+		try:
+			for kind, entry, length in self.segments:
+				segment_start, segment_end = position, position + length
+				position = segment_end
+				if segment_end <= start or length == 0:
+					continue
+				if segment_start >= end:
+					break
+				yield from self._segment_bytes(
+					kind, entry,
+					max(start - segment_start, 0),
+					min(end, segment_end) - segment_start,
+				)
+		finally:
+			# También si el cliente cortó: el generador se cierra en un yield
+			self._report_crcs()
+
+	def _report_crcs(self, entries=None):
+		if self.on_crc is None:
+			return
+		computed = {e.name: e.crc for e in (entries or self.entries) if e.crc is not None and e.name not in self._known_crcs}
+		if computed:
+			self._known_crcs.update(computed)
+			self.on_crc(computed)
+
+	def __iter__(self):
+		return self.iter_bytes()
+
+
+def parse_range(header, size):
+	"""
+	Interpretar un encabezado ``Range`` de un solo rango.
+
+	Returns:
+		tuple: (inicio, fin exclusivo), None si no hay rango válido/soportado,
+		o False si el rango es insatisfacible.
+	"""
+	if not header or not header.startswith('bytes=') or ',' in header:
+		return None
+	first, _, last = header[6:].strip().partition('-')
+	try:
+		if first == '':
+			# Sufijo: últimos N bytes
+			length = int(last)
+			if length <= 0:
+				return False
+			return max(size - length, 0), size
+		start = int(first)
+		stop = int(last) + 1 if last else size
+	except ValueError:
+		return None
+	if start >= size or stop <= start:
+		return False
+	return start, min(stop, size)